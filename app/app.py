@@ -2,94 +2,148 @@
 """
 Whisperer - Audio transcription tool
 Main application entry point
+
+Only lightweight modules are imported here so the menu appears instantly;
+download, transcription and playback modules are imported when first used.
 """
 
-import os
-import sys
-from .config import MEDIA_DIR, load_language
-from .setup import ensure_venv_and_dependencies
-from .download import download_from_url
-from .transcribe import transcribe
-from .ui import list_audio_files, print_menu, get_choice, get_url_input, change_language
-from .utils import clean_transcript
-from .vlc_player import play_audio_with_vlc
-
-def main():
+import argparse
+from .config import (
+    DEFAULT_BATCH_WORKERS, DEFAULT_DOWNLOAD_WORKERS, DEFAULT_MAX_PENDING, DEFAULT_DRAFT_MODEL, SUPPORTED_MODELS,
+    ensure_directories, load_language, load_model_name, load_draft_model
+)
+from .ui import list_audio_files, pick_choice, choice_file, get_url_input, change_language
+from . import catalog
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(prog="whisperer", description="Manage audio transcriptions in your terminal")
+    parser.add_argument("--batch", action="store_true", help="transcribe every untranscribed file in media/ without prompting")
+    parser.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS, help=f"number of worker processes for --batch (default: {DEFAULT_BATCH_WORKERS})")
+    parser.add_argument("--urls", nargs="+", metavar="URL_OR_FILE", help="download these URLs (or every URL listed in these files) concurrently and transcribe them")
+    parser.add_argument("--download-workers", type=int, default=DEFAULT_DOWNLOAD_WORKERS, help=f"maximum concurrent downloads for --urls (default: {DEFAULT_DOWNLOAD_WORKERS})")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING, help=f"files --urls may be downloading or have waiting for transcription at once (default: {DEFAULT_MAX_PENDING})")
+    parser.add_argument("--model", choices=SUPPORTED_MODELS, help="Whisper model for this run (default: the 'model' setting, or turbo)")
+    parser.add_argument("--draft", nargs="?", const=DEFAULT_DRAFT_MODEL, metavar="MODEL", choices=SUPPORTED_MODELS,
+                        help="show a quick draft from MODEL (default: tiny) and refine it with --model in the background")
+    parser.add_argument("--search", nargs="+", metavar="WORD", help="find transcripts containing all these words, with the offset of each match")
+    parser.add_argument("--export", choices=["srt", "vtt", "tsv"], help="write subtitles or a timing table for every transcribed file, without decoding again")
+    parser.add_argument("--tune", action="store_true", help="time this machine again and save the best CPU thread settings")
+    return parser.parse_args(argv)
+
+def show_transcript(selected_file, transcript_path):
+    """Print an existing transcript and play the audio"""
+    from .draft import refining_model
+    from .vlc_player import play_audio_with_vlc
+
+    refine_model = refining_model(selected_file)
+    if refine_model:
+        print(f"\nDraft transcription for '{selected_file}' (being refined with '{refine_model}' in the background):\n")
+    elif transcript_path.endswith(".noformat.txt"):
+        print(f"\nUnformatted transcription exists for '{selected_file}':\n")
+    else:
+        print(f"\nTranscription exists for '{selected_file}':\n")
+    with open(transcript_path, "r", encoding="utf-8") as f:
+        raw_text = f.read()
+        print(raw_text)  # No formatting applied
+    # Play audio after showing existing transcript
+    play_audio_with_vlc(selected_file)
+
+def main(argv=None):
     """Main application function"""
+    args = parse_args(argv)
+    ensure_directories()
+    model = args.model or load_model_name()
+
+    if args.search:
+        # Only transcripts added or changed since the last search are reindexed
+        from .search import run_search
+        run_search(" ".join(args.search))
+        return
+
+    if args.export:
+        # Reads the saved segment files only, so no dependencies are needed
+        from .export import export_all
+        export_all(list_audio_files(), args.export)
+        return
+
     # Ensure dependencies are installed
+    from .setup import ensure_venv_and_dependencies
     ensure_venv_and_dependencies()
 
-    # Get list of audio files
-    files = list_audio_files()
-    
-    # Show menu and get user choice
-    print_menu(files)
-    choice = get_choice(files)
+    from .tuning import autotune, ensure_tuned
+    if args.tune:
+        autotune(model)
+        return
+
+    if args.batch:
+        ensure_tuned(model)
+        from .batch import run_batch
+        run_batch(list_audio_files(), language=load_language(), workers=args.workers, model=model)
+        return
+
+    if args.urls:
+        from .download import expand_url_args
+        from .pipeline import run_pipeline
+        ensure_tuned(model)
+        run_pipeline(expand_url_args(args.urls), language=load_language(), workers=args.workers,
+                     download_workers=args.download_workers, max_pending=args.max_pending, model=model)
+        return
+
+    # Show one page of files at a time and get the user's choice
+    choice = pick_choice()
 
     if choice == 0:
         print("Goodbye!")
         return
-    
+
     if choice == 1:
         # Download from URL option
+        from .download import download_from_url
         url = get_url_input()
         downloaded_file = download_from_url(url)
-        
-        if downloaded_file:
-            # Refresh the file list
-            files = list_audio_files()
-            # Find the downloaded file in the new list
-            try:
-                file_index = files.index(downloaded_file) + 3  # +3 because choice 1 is URL download, 2 is language change
-                choice = file_index
-            except ValueError:
-                print("Error: Downloaded file not found in media directory")
-                return
-        else:
+
+        if not downloaded_file:
             print("Failed to download audio from URL")
             return
-    
-    if choice == 2:
+        if catalog.file_id(downloaded_file) is None:
+            print("Error: Downloaded file not found in media directory")
+            return
+        selected_file = downloaded_file
+    elif choice == 2:
         # Change language option
         change_language()
         return
+    else:
+        # Process the selected file (choice >= 3); numbers stay the same as files are added
+        selected_file = choice_file(choice)
 
-    # Process the selected file (choice >= 3)
-    selected_file = files[choice - 3]  # -3 because choice 1 is URL download, 2 is language change
-    
     print(f"\nSelected file: {selected_file}")
-    
-    # Get current language setting
-    current_language = load_language()
-    
-    # Continue with transcription (speaker detection is now automatic)
-    base_name = os.path.splitext(selected_file)[0]
-    txt_path = os.path.join(MEDIA_DIR, base_name + ".txt")
-    noformat_path = os.path.join(MEDIA_DIR, base_name + ".noformat.txt")
 
     # Check for existing transcriptions
-    if os.path.exists(noformat_path):
-        print(f"\nUnformatted transcription exists for '{selected_file}':\n")
-        with open(noformat_path, "r", encoding="utf-8") as f:
-            raw_text = f.read()
-            print(raw_text)  # No formatting applied
-        # Play audio after showing existing transcript
-        play_audio_with_vlc(selected_file)
-    elif os.path.exists(txt_path):
-        print(f"\nTranscription exists for '{selected_file}':\n")
-        with open(txt_path, "r", encoding="utf-8") as f:
-            raw_text = f.read()
-            print(raw_text)  # Speaker-separated format (no formatting applied)
-        # Play audio after showing existing transcript
-        play_audio_with_vlc(selected_file)
+    existing_path = catalog.transcript_path(selected_file)
+    if existing_path:
+        show_transcript(selected_file, existing_path)
+        return
+
+    # Transcribe first, then play audio; segments are shown as they are decoded
+    # (speaker detection is automatic)
+    from .batch import threads_per_worker
+    from .tuning import apply_threads
+    from .vlc_player import play_audio_with_vlc
+    ensure_tuned(model)
+    apply_threads(threads_per_worker(1))
+    draft_model = args.draft or load_draft_model()
+    if draft_model and draft_model != model:
+        # Usable text right away, the better transcript replaces it later
+        from .draft import transcribe_with_refine
+        transcribe_with_refine(selected_file, language=load_language(), detect_speakers=True, stream=True,
+                               model=model, draft_model=draft_model)
     else:
-        # Transcribe first, then play audio
-        transcribe(selected_file, language=current_language, detect_speakers=True)  # Use selected language
-        with open(txt_path, "r", encoding="utf-8") as f:
-            raw_text = f.read()
-            print(raw_text)  # Speaker-separated format
-        # Play audio after transcription is complete
-        play_audio_with_vlc(selected_file)
+        from .transcribe import transcribe
+        transcribe(selected_file, language=load_language(), detect_speakers=True, stream=True, model=model)
+    # Play audio after transcription is complete
+    play_audio_with_vlc(selected_file)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
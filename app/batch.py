@@ -0,0 +1,96 @@
+"""
+Non-interactive batch transcription of the media directory
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .config import MEDIA_DIR, DEFAULT_BATCH_WORKERS, DEFAULT_LANGUAGE, DEFAULT_MODEL, CLIP_BATCH_SIZE, load_thread_settings
+from .tuning import core_slots
+from . import catalog
+from .utils import log, log_to_queue, worker_log_queue, find_existing_transcript
+
+def find_untranscribed(files):
+    """Return the audio files that have neither a .txt nor a .noformat.txt transcript
+
+    Transcript status comes from the media catalog, so no file is checked one by one.
+    """
+    pending = set(catalog.untranscribed(MEDIA_DIR))
+    return [f for f in files if f in pending]
+
+def threads_per_worker(workers):
+    """Split the available CPU cores evenly between workers, capped by the intra_op_threads setting"""
+    threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+    intra_op, _, _ = load_thread_settings()
+    return min(threads, intra_op) if intra_op else threads
+
+def init_worker(threads, core_slots=None, log_queue=None):
+    """Limit torch/OpenMP threads in a worker so workers don't oversubscribe cores
+
+    With core_slots (see tuning.core_slots) the worker is also pinned to its
+    own set of cores. With log_queue (see utils.worker_log_queue) its log
+    records are written by the parent process.
+    """
+    from .tuning import apply_threads, take_cores
+    if log_queue is not None:
+        log_to_queue(log_queue)
+    apply_threads(threads, take_cores(core_slots))
+
+def transcribe_worker(file_name, language, model=DEFAULT_MODEL):
+    """Transcribe one file inside a worker process, reporting success"""
+    from .transcribe import transcribe
+    try:
+        transcribe(file_name, language=language, detect_speakers=True, model=model)
+        return find_existing_transcript(file_name) is not None
+    except SystemExit:
+        # transcribe() exits on failure; keep the worker alive for other files
+        return False
+    except Exception as e:
+        log(f"Batch transcription failed for {file_name}: {e}")
+        return False
+
+def transcribe_clips_worker(file_names, language, model=DEFAULT_MODEL):
+    """Transcribe a batch of short clips inside a worker process, returning the ones done"""
+    from .clips import transcribe_clips
+    try:
+        return transcribe_clips(file_names, language=language, detect_speakers=True, model=model)
+    except Exception as e:
+        log(f"Batch transcription failed for {len(file_names)} short clip(s): {e}")
+        return [f for f in file_names if find_existing_transcript(f) is not None]
+
+def run_batch(files, language=DEFAULT_LANGUAGE, workers=DEFAULT_BATCH_WORKERS, model=DEFAULT_MODEL):
+    """Transcribe every untranscribed file on a pool of worker processes"""
+    pending = find_untranscribed(files)
+    if not pending:
+        print("Nothing to transcribe: all files already have a transcript.")
+        return [], []
+
+    workers = max(1, min(workers, len(pending)))
+    threads = threads_per_worker(workers)
+    print(f"Transcribing {len(pending)} file(s) with '{model}' on {workers} worker(s), {threads} thread(s) each...")
+    log(f"Batch transcription of {len(pending)} file(s) with '{model}' on {workers} worker(s), {threads} thread(s) each")
+
+    # Clips that fit in one Whisper window are decoded many at a time
+    from .clips import split_short_clips, clip_batches
+    short, other = split_short_clips(pending)
+    if short:
+        print(f"Decoding {len(short)} short clip(s) together, up to {CLIP_BATCH_SIZE} per forward pass")
+
+    done, failed = [], []
+    # Each worker process holds its own loaded model for its whole lifetime
+    initargs = (threads, core_slots(workers, threads), worker_log_queue())
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as pool:
+        futures = {pool.submit(transcribe_clips_worker, batch, language, model): batch for batch in clip_batches(short)}
+        futures.update({pool.submit(transcribe_worker, f, language, model): [f] for f in other})
+        for future in as_completed(futures):
+            result = future.result()
+            succeeded = result if isinstance(result, list) else (futures[future] if result else [])
+            for file_name in futures[future]:
+                if file_name in succeeded:
+                    done.append(file_name)
+                    print(f"[{len(done) + len(failed)}/{len(pending)}] Done: {file_name}")
+                else:
+                    failed.append(file_name)
+                    print(f"[{len(done) + len(failed)}/{len(pending)}] Failed: {file_name}")
+
+    print(f"\nBatch complete: {len(done)} transcribed, {len(failed)} failed.")
+    log(f"Batch complete: {len(done)} transcribed, {len(failed)} failed")
+    return done, failed
@@ -0,0 +1,226 @@
+"""
+Content-addressed transcript, decoded-audio and mel spectrogram caches for Whisperer,
+plus the quantized model weights
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from .config import (
+    TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_BYTES, AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES,
+    MEL_CACHE_DIR, MEL_CACHE_MAX_BYTES, MEL_CACHE_DTYPE, LANGUAGE_CACHE_DIR, MODEL_CACHE_DIR
+)
+from .utils import log
+from . import catalog
+
+HASH_CHUNK_SIZE = 1024 * 1024
+TEMP_SUFFIX = ".tmp"
+STALE_TEMP_SECONDS = 3600  # Temp files older than this were left by a crashed writer
+
+# File hashes computed in this process, keyed by (path, size, mtime)
+_hashes = {}
+
+def file_hash(path):
+    """Return the SHA-256 of a file's content, memoized on its size and mtime
+
+    Hashes of catalogued media files persist in the catalog, so a file is
+    read in full once rather than once per run.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _hashes:
+        recorded = catalog.recorded(path, "hash")
+        if recorded is None:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            recorded = digest.hexdigest()
+            catalog.record(path, hash=recorded)
+        _hashes[memo_key] = recorded
+    return _hashes[memo_key]
+
+def cache_key(audio_path, model, language, options=None):
+    """Build a cache key from the audio content and the transcription settings"""
+    if not os.path.exists(audio_path):
+        return None
+    fields = {
+        "audio": file_hash(audio_path),
+        "model": model,
+        "language": language,
+        "options": options or {},
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+def write_entry(entry_path, write):
+    """Write a cache entry with write(file) to a private temp file, then rename it into place
+
+    Batch, pipeline and chunk workers share the cache, so each writer gets
+    its own temp file; readers never see a partial entry, and a mapped
+    entry that gets replaced stays valid for whoever mapped it.
+    """
+    directory = os.path.dirname(entry_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=TEMP_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, entry_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _entry_path(key, suffix=".txt"):
+    """Path of the cached transcript for a key"""
+    return os.path.join(TRANSCRIPT_CACHE_DIR, key + suffix)
+
+def restore(key, dest_path, suffix=".txt"):
+    """Copy a cached transcript to dest_path, returning True on a cache hit
+
+    suffix selects another output of the same transcription, such as its segment file.
+    """
+    if key is None:
+        return False
+    entry = _entry_path(key, suffix)
+    if not os.path.exists(entry):
+        return False
+    shutil.copyfile(entry, dest_path)
+    # Mark as recently used so eviction keeps it
+    os.utime(entry)
+    return True
+
+def store(key, src_path, suffix=".txt"):
+    """Add a transcript to the cache and evict old entries beyond the size limit"""
+    if key is None:
+        return False
+    try:
+        with open(src_path, "rb") as src:
+            write_entry(_entry_path(key, suffix), lambda f: shutil.copyfileobj(src, f))
+    except FileNotFoundError:
+        # No transcript to cache, or another worker moved it away first
+        return False
+    evict(TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_BYTES)
+    return True
+
+def audio_entry_path(audio_path):
+    """Path of the decoded audio cached for an audio file's content"""
+    return os.path.join(AUDIO_CACHE_DIR, file_hash(audio_path) + ".npy")
+
+def open_audio(entry_path):
+    """Memory-map a cached decoded audio array, or return None on a miss
+
+    The copy-on-write mapping reads pages from disk only when a window is
+    used, and never writes back to the cache.
+    """
+    if not os.path.exists(entry_path):
+        return None
+    import numpy as np
+    audio = np.load(entry_path, mmap_mode="c")
+    # Mark as recently used so eviction keeps it
+    os.utime(entry_path)
+    return audio
+
+def store_audio(entry_path, audio):
+    """Save decoded audio as a float32 .npy entry and evict old entries beyond the size limit
+
+    The entry is addressed by content, so an entry another worker stored first is kept as is.
+    """
+    import numpy as np
+    if os.path.exists(entry_path):
+        return
+    write_entry(entry_path, lambda f: np.save(f, np.asarray(audio, dtype=np.float32)))
+    evict(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES)
+
+def mel_entry_path(mel_id, n_mels, padding):
+    """Path of the cached log-mel spectrogram of an audio window
+
+    mel_id identifies the audio content and window; Whisper normalizes the
+    spectrogram over the whole window, so each window gets its own entry.
+    """
+    return os.path.join(MEL_CACHE_DIR, f"{mel_id}-{n_mels}-{padding}.npy")
+
+def open_mel(entry_path):
+    """Memory-map a cached mel spectrogram as float32, or return None on a miss"""
+    if not os.path.exists(entry_path):
+        return None
+    import numpy as np
+    mel = np.load(entry_path, mmap_mode="c")
+    os.utime(entry_path)
+    return mel if mel.dtype == np.float32 else mel.astype(np.float32)
+
+def store_mel(entry_path, mel):
+    """Save a mel spectrogram in the configured dtype and evict old entries"""
+    import numpy as np
+    if os.path.exists(entry_path):
+        return
+    write_entry(entry_path, lambda f: np.save(f, np.asarray(mel, dtype=MEL_CACHE_DTYPE)))
+    evict(MEL_CACHE_DIR, MEL_CACHE_MAX_BYTES)
+
+def detected_language(audio_path):
+    """Return the language detected earlier for an audio file's content, or None"""
+    entry = os.path.join(LANGUAGE_CACHE_DIR, file_hash(audio_path))
+    if not os.path.exists(entry):
+        return None
+    with open(entry, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+def store_detected_language(audio_path, language):
+    """Remember the language detected for an audio file's content"""
+    entry = os.path.join(LANGUAGE_CACHE_DIR, file_hash(audio_path))
+    write_entry(entry, lambda f: f.write(language.encode("utf-8")))
+
+def model_entry_path(model_name, precision):
+    """Path of a model's converted weights for the installed torch version"""
+    import torch
+    return os.path.join(MODEL_CACHE_DIR, f"{model_name}-{precision}-torch{torch.__version__}.pt")
+
+def open_model(entry_path):
+    """Load converted model weights saved by store_model, or return None on a miss"""
+    if not os.path.exists(entry_path):
+        return None
+    import torch
+    try:
+        return torch.load(entry_path, map_location="cpu", weights_only=True)
+    except Exception as e:
+        log(f"Could not load cached model {os.path.basename(entry_path)}: {e}")
+        return None
+
+def store_model(entry_path, checkpoint):
+    """Save converted model weights for later sessions"""
+    import torch
+    write_entry(entry_path, lambda f: torch.save(checkpoint, f))
+
+def evict(directory, max_bytes):
+    """Remove least recently used files until the directory fits in max_bytes
+
+    Temp files of writers still at work are left alone.
+    """
+    entries = []
+    now = time.time()
+    for entry in os.scandir(directory):
+        try:
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+        except OSError:
+            # Removed by another worker's eviction
+            continue
+        if entry.name.endswith(TEMP_SUFFIX) and now - stat.st_mtime < STALE_TEMP_SECONDS:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            log(f"Evicted cache entry: {os.path.basename(path)}")
+        except OSError:
+            pass
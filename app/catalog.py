@@ -0,0 +1,242 @@
+"""
+Persistent catalog of the audio files in media/ and their transcript status
+"""
+import os
+import sqlite3
+import time
+from .config import MEDIA_DIR, CATALOG_FILE, AUDIO_EXTENSIONS
+from .utils import log, pick_transcripts
+# A directory changed this recently may change again within the same mtime tick
+MTIME_GRACE_SECONDS = 2
+RECORDED_FIELDS = ("hash", "duration", "language")
+STATUSES = ("transcribed", "untranscribed")
+
+SCHEMA_VERSION = 1  # Catalogs of an older version are rebuilt from the directory
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT,
+    duration REAL,
+    language TEXT,
+    transcript TEXT,
+    UNIQUE (directory, name)
+);
+CREATE TABLE IF NOT EXISTS scans (
+    directory TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    scanned_at REAL NOT NULL
+);
+"""
+
+def connect():
+    """Open the catalog, creating it if needed"""
+    os.makedirs(os.path.dirname(CATALOG_FILE), exist_ok=True)
+    # Batch workers record durations and languages concurrently
+    connection = sqlite3.connect(CATALOG_FILE, timeout=10)
+    connection.execute("PRAGMA journal_mode=WAL")
+    if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        connection.executescript(f"""
+            DROP TABLE IF EXISTS media;
+            DROP TABLE IF EXISTS scans;
+            {SCHEMA}
+            PRAGMA user_version = {SCHEMA_VERSION};
+        """)
+    return connection
+
+def is_current(connection, directory, stat):
+    """Check whether the last scan of a directory still describes it"""
+    row = connection.execute("SELECT mtime_ns, scanned_at FROM scans WHERE directory = ?", (directory,)).fetchone()
+    if row is None or row[0] != stat.st_mtime_ns:
+        return False
+    return stat.st_mtime_ns / 1e9 < row[1] - MTIME_GRACE_SECONDS
+
+def scan(directory):
+    """Read a directory once: {audio name: (size, mtime_ns)} and {base name: transcript suffix}"""
+    audio, others = {}, []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            name = entry.name
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                stat = entry.stat()
+                audio[name] = (stat.st_size, stat.st_mtime_ns)
+            else:
+                others.append(name)
+    transcripts = {base: name[len(base):] for base, name in pick_transcripts(others).items()}
+    return audio, transcripts
+
+def refresh(connection, media_dir=None):
+    """Bring the catalog of a media directory up to date
+
+    Adding, removing or renaming a file changes the directory's mtime, so an
+    unchanged directory is not scanned at all. Otherwise one scandir pass
+    updates every entry; recorded hashes, durations and languages are kept
+    for audio files whose size and mtime did not change. A file keeps its
+    ID for as long as it stays in the directory.
+    """
+    directory = os.path.abspath(media_dir or MEDIA_DIR)
+    started = time.time()
+    stat = os.stat(directory)
+    if is_current(connection, directory, stat):
+        return False
+
+    audio, transcripts = scan(directory)
+    known = {
+        name: (size, mtime_ns)
+        for name, size, mtime_ns in connection.execute(
+            "SELECT name, size, mtime_ns FROM media WHERE directory = ?", (directory,))
+    }
+    with connection:
+        for name, (size, mtime_ns) in sorted(audio.items()):
+            transcript = transcripts.get(os.path.splitext(name)[0])
+            if known.get(name) == (size, mtime_ns):
+                connection.execute("UPDATE media SET transcript = ? WHERE directory = ? AND name = ?",
+                                   (transcript, directory, name))
+            elif name in known:
+                connection.execute(
+                    "UPDATE media SET size = ?, mtime_ns = ?, hash = NULL, duration = NULL, language = NULL, "
+                    "transcript = ? WHERE directory = ? AND name = ?",
+                    (size, mtime_ns, transcript, directory, name)
+                )
+            else:
+                connection.execute(
+                    "INSERT INTO media (directory, name, size, mtime_ns, transcript) VALUES (?, ?, ?, ?, ?)",
+                    (directory, name, size, mtime_ns, transcript)
+                )
+        connection.executemany("DELETE FROM media WHERE directory = ? AND name = ?",
+                               [(directory, name) for name in known if name not in audio])
+        connection.execute("INSERT OR REPLACE INTO scans (directory, mtime_ns, scanned_at) VALUES (?, ?, ?)",
+                           (directory, stat.st_mtime_ns, started))
+    return True
+
+def query(sql, params=(), media_dir=None):
+    """Refresh the catalog of a media directory and run a query scoped to it"""
+    directory = os.path.abspath(media_dir or MEDIA_DIR)
+    connection = connect()
+    try:
+        refresh(connection, directory)
+        return connection.execute(sql, (directory,) + tuple(params)).fetchall()
+    finally:
+        connection.close()
+
+def audio_files(media_dir=None):
+    """Return the audio files in the media directory, sorted by name"""
+    return [name for name, in query("SELECT name FROM media WHERE directory = ? ORDER BY name", media_dir=media_dir)]
+
+def untranscribed(media_dir=None):
+    """Return the audio files that have neither a .txt nor a .noformat.txt transcript"""
+    return [name for name, in query(
+        "SELECT name FROM media WHERE directory = ? AND transcript IS NULL ORDER BY name", media_dir=media_dir)]
+
+def transcript_path(file_name, media_dir=None):
+    """Return the path of an audio file's transcript according to the catalog, or None"""
+    rows = query("SELECT transcript FROM media WHERE directory = ? AND name = ?", (file_name,), media_dir)
+    if not rows or rows[0][0] is None:
+        return None
+    directory = os.path.abspath(media_dir or MEDIA_DIR)
+    return os.path.join(directory, os.path.splitext(file_name)[0] + rows[0][0])
+
+def page(media_dir=None, text=None, status=None, since=None, until=None, offset=0, limit=20):
+    """Return (matching file count, [(id, name, transcribed, mtime_ns)]) for one page of the sorted listing
+
+    text keeps names containing it (ASCII case is ignored), status is
+    "transcribed" or "untranscribed", and since and until are modification
+    times in nanoseconds. Only the rows of the page are read.
+    """
+    conditions, params = [], []
+    if text:
+        escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append("name LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    if status is not None:
+        if status not in STATUSES:
+            raise ValueError(f"Unknown transcript status: {status}")
+        conditions.append("transcript IS NOT NULL" if status == "transcribed" else "transcript IS NULL")
+    if since is not None:
+        conditions.append("mtime_ns >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("mtime_ns < ?")
+        params.append(until)
+    where = "".join(f" AND {condition}" for condition in conditions)
+
+    directory = os.path.abspath(media_dir or MEDIA_DIR)
+    connection = connect()
+    try:
+        refresh(connection, directory)
+        total = connection.execute(f"SELECT COUNT(*) FROM media WHERE directory = ?{where}",
+                                   [directory] + params).fetchone()[0]
+        rows = connection.execute(
+            f"SELECT id, name, transcript IS NOT NULL, mtime_ns FROM media WHERE directory = ?{where} "
+            "ORDER BY name LIMIT ? OFFSET ?",
+            [directory] + params + [limit, offset]
+        ).fetchall()
+    finally:
+        connection.close()
+    return total, [(file_id, name, bool(transcribed), mtime_ns) for file_id, name, transcribed, mtime_ns in rows]
+
+def file_name(file_id, media_dir=None):
+    """Return the name of the audio file with this catalog ID, or None"""
+    rows = query("SELECT name FROM media WHERE directory = ? AND id = ?", (file_id,), media_dir)
+    return rows[0][0] if rows else None
+
+def file_id(name, media_dir=None):
+    """Return the catalog ID of an audio file, or None if it is not in the media directory"""
+    rows = query("SELECT id FROM media WHERE directory = ? AND name = ?", (name,), media_dir)
+    return rows[0][0] if rows else None
+
+def matching_row(audio_path):
+    """WHERE arguments selecting an audio file's entry only if it still has the size and mtime on disk"""
+    stat = os.stat(audio_path)
+    directory, name = os.path.split(os.path.abspath(audio_path))
+    return (directory, name, stat.st_size, stat.st_mtime_ns)
+
+def recorded(audio_path, field):
+    """Return a hash, duration or language recorded for an audio file, or None
+
+    Values recorded before the file last changed are ignored.
+    """
+    if field not in RECORDED_FIELDS:
+        raise ValueError(f"Unknown catalog field: {field}")
+    try:
+        connection = connect()
+        try:
+            row = connection.execute(
+                f"SELECT {field} FROM media WHERE directory = ? AND name = ? AND size = ? AND mtime_ns = ?",
+                matching_row(audio_path)
+            ).fetchone()
+        finally:
+            connection.close()
+    except (sqlite3.Error, OSError) as e:
+        log(f"Could not read the catalog for {audio_path}: {e}")
+        return None
+    return row[0] if row else None
+
+def record(audio_path, **fields):
+    """Remember facts learned about an audio file: its hash, duration or language
+
+    Only a catalogued file that has not changed since it was scanned is
+    updated. Recording is best effort; the catalog only saves work, it is
+    never the only copy of anything.
+    """
+    unknown = set(fields) - set(RECORDED_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown catalog fields: {', '.join(sorted(unknown))}")
+    assignments = ", ".join(f"{field} = ?" for field in fields)
+    try:
+        connection = connect()
+        try:
+            with connection:
+                connection.execute(
+                    f"UPDATE media SET {assignments} WHERE directory = ? AND name = ? AND size = ? AND mtime_ns = ?",
+                    tuple(fields.values()) + matching_row(audio_path)
+                )
+        finally:
+            connection.close()
+    except (sqlite3.Error, OSError) as e:
+        log(f"Could not update the catalog for {audio_path}: {e}")
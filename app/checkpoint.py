@@ -0,0 +1,87 @@
+"""
+Per-segment checkpoints so interrupted transcriptions can resume
+"""
+import json
+import os
+from .utils import log
+
+CHECKPOINT_SUFFIX = ".checkpoint.jsonl"
+
+def checkpoint_path(audio_path):
+    """Path of the checkpoint sidecar stored next to an audio file"""
+    return os.path.splitext(audio_path)[0] + CHECKPOINT_SUFFIX
+
+def load(audio_path, key):
+    """Return the segments checkpointed for an audio file, oldest first
+
+    The first line records the transcript key (see transcribe.transcript_key)
+    of the run that wrote it; a checkpoint left by other audio content or
+    other settings is ignored rather than resumed.
+    """
+    path = checkpoint_path(audio_path)
+    if not os.path.exists(path):
+        return []
+
+    segments = []
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            header = json.loads(f.readline())
+        except json.JSONDecodeError:
+            header = None
+        if not isinstance(header, dict) or "start" in header or header.get("key") != key:
+            log(f"Ignoring {os.path.basename(path)}: it was written for other audio or settings")
+            return []
+        for line in f:
+            try:
+                segments.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A crash can leave the last line half-written
+                break
+    return segments
+
+def resume_offset(segments):
+    """Offset in seconds where decoding should continue"""
+    return segments[-1]["end"] if segments else 0.0
+
+def remove(audio_path):
+    """Delete the checkpoint once the transcript is complete"""
+    path = checkpoint_path(audio_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+def write_transcript(audio_path, segments):
+    """Write a .txt transcript from checkpointed segments, like Whisper's txt writer"""
+    txt_path = os.path.splitext(audio_path)[0] + ".txt"
+    with open(txt_path, "w", encoding="utf-8") as f:
+        for segment in segments:
+            f.write(segment["text"].strip() + "\n")
+
+class CheckpointWriter:
+    """Append decoded segments to the checkpoint sidecar as they arrive, after a header line with key"""
+
+    def __init__(self, audio_path, key, segments=()):
+        self.path = checkpoint_path(audio_path)
+        self.key = key
+        self._file = None
+        if segments:
+            # Rewrite the segments being resumed from, dropping any half-written line
+            self._open()
+            for segment in segments:
+                self._file.write(json.dumps(segment, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def _open(self):
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(json.dumps({"key": self.key}) + "\n")
+
+    def add_segment(self, start, end, text):
+        """Persist one segment before decoding continues"""
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps({"start": start, "end": end, "text": text}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,135 @@
+"""
+Silence-based chunking of long recordings for parallel decoding
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from .batch import init_worker, threads_per_worker
+from .config import CHUNK_MIN_SECONDS, DEFAULT_MODEL
+from .engine import SAMPLE_RATE, decode, offset_segments, window_id
+from .tuning import core_slots
+from .utils import worker_log_queue
+
+FRAME_SECONDS = 0.03  # Energy is measured on 30 ms frames
+SILENCE_SECONDS = 0.5  # Length of the quiet stretch a split is centred on
+SEARCH_SECONDS = 30  # How far a split may move from its ideal position
+FIRST_CHUNK_SECONDS = 60  # A short first chunk gets the first text on screen quickly
+
+def frame_energy_db(audio, frame_len):
+    """Return the energy in dB of each consecutive frame of the audio"""
+    n_frames = len(audio) // frame_len
+    frames = np.asarray(audio[:n_frames * frame_len], dtype=np.float32).reshape(n_frames, frame_len)
+    # einsum avoids materialising a squared copy of the whole recording
+    power = np.einsum("ij,ij->i", frames, frames) / frame_len
+    return 10 * np.log10(power + 1e-10)
+
+def find_split_points(audio, target_seconds, sample_rate=SAMPLE_RATE, first_target_seconds=None):
+    """Return sample offsets splitting the audio roughly every target_seconds at the quietest moment
+
+    If first_target_seconds is given, the first chunk aims for that length instead.
+    """
+    frame_len = int(FRAME_SECONDS * sample_rate)
+    energy = frame_energy_db(audio, frame_len)
+    if len(energy) == 0:
+        return []
+
+    # Smooth the energy so a split lands in a silence, not in a gap between two syllables
+    window = max(1, int(SILENCE_SECONDS / FRAME_SECONDS))
+    smoothed = np.convolve(energy, np.ones(window) / window, mode="same")
+
+    target = max(1, int(target_seconds / FRAME_SECONDS))
+    first_target = max(1, int((first_target_seconds or target_seconds) / FRAME_SECONDS))
+
+    points = []
+    position = 0
+    length = first_target
+    while True:
+        search = min(int(SEARCH_SECONDS / FRAME_SECONDS), length // 2)
+        if position + length + search >= len(smoothed):
+            break
+        low = position + length - search
+        high = position + length + search + 1
+        split = low + int(np.argmin(smoothed[low:high]))
+        points.append(split * frame_len)
+        position = split
+        length = target
+    return points
+
+def chunk_bounds(n_samples, split_points):
+    """Turn split points into (start, end) sample ranges covering the whole audio"""
+    edges = [0] + list(split_points) + [n_samples]
+    return [(start, end) for start, end in zip(edges, edges[1:]) if end > start]
+
+def stitch(results, offsets, language=None):
+    """Merge per-chunk Whisper results into one result for the whole file"""
+    segments = []
+    for result, offset in zip(results, offsets):
+        segments.extend(offset_segments(result["segments"], offset))
+    for i, segment in enumerate(segments):
+        segment["id"] = i
+
+    if language is None and results:
+        language = results[0].get("language")
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": language,
+    }
+
+def read_window(path, start, end):
+    """Map samples start:end of a cached .npy audio file without reading the rest"""
+    return np.load(path, mmap_mode="c")[start:end]
+
+def decode_chunk(audio, language, word_timestamps, model_name):
+    """Decode one chunk inside a worker process
+
+    audio is either an array or a (cache path, start, end) window to map.
+    """
+    mel_id = None
+    if isinstance(audio, tuple):
+        mel_id = window_id(*audio)
+        audio = read_window(*audio)
+    return decode(audio, language, word_timestamps, model_name, verbose=None, mel_id=mel_id)
+
+def transcribe_chunked(audio, language, word_timestamps=False, model_name=DEFAULT_MODEL, workers=2, on_segment=None, source=None):
+    """Split a long recording at silences and decode the chunks concurrently
+
+    If on_segment is given, segments are reported in file order as soon as
+    every chunk before them has been decoded. source is an optional
+    (cache path, first sample) pair locating the audio in the decoded-audio
+    cache, so workers map their chunk rather than receive a pickled copy.
+    """
+    duration = len(audio) / SAMPLE_RATE
+    target_seconds = max(CHUNK_MIN_SECONDS, duration / workers)
+    bounds = chunk_bounds(len(audio), find_split_points(audio, target_seconds, first_target_seconds=FIRST_CHUNK_SECONDS))
+    offsets = [start / SAMPLE_RATE for start, _ in bounds]
+
+    workers = max(1, min(workers, len(bounds)))
+    threads = threads_per_worker(workers)
+    print(f"  Decoding {len(bounds)} chunks on {workers} processes...")
+
+    results = [None] * len(bounds)
+    reported = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(threads, core_slots(workers, threads), worker_log_queue())) as pool:
+        if source:
+            path, first = source
+            chunks = [(path, first + start, first + end) for start, end in bounds]
+        else:
+            chunks = [audio[start:end] for start, end in bounds]
+        futures = {
+            pool.submit(decode_chunk, chunk, language, word_timestamps, model_name): i
+            for i, chunk in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if on_segment is None:
+                print(".", end="", flush=True)  # Show dot for each completed chunk
+                continue
+            # Report every chunk whose predecessors are all decoded
+            while reported < len(results) and results[reported] is not None:
+                for segment in offset_segments(results[reported]["segments"], offsets[reported]):
+                    on_segment(segment["start"], segment["end"], segment["text"])
+                reported += 1
+    if on_segment is None:
+        print()
+
+    return stitch(results, offsets, language)
@@ -0,0 +1,89 @@
+"""
+Batched transcription of short clips such as voice notes
+"""
+import os
+from .config import MEDIA_DIR, DEFAULT_LANGUAGE, DEFAULT_MODEL, AUTO_LANGUAGE, SHORT_CLIP_SECONDS, CLIP_BATCH_SIZE
+from .utils import log, find_existing_transcript
+from . import catalog, engine
+
+def split_short_clips(files):
+    """Split files into (short clips, other files) by duration
+
+    Durations are read from the media catalog or the container header, so
+    no file is decoded before the workers start. A file whose duration is
+    unknown takes the regular path, as does every file without the
+    in-process engine.
+    """
+    if not engine.is_available():
+        return [], list(files)
+
+    short, other = [], []
+    for file_name in files:
+        audio_path = os.path.join(MEDIA_DIR, file_name)
+        duration = catalog.recorded(audio_path, "duration")
+        if duration is None:
+            duration = engine.probe_duration(audio_path)
+            if duration is None:
+                other.append(file_name)
+                continue
+            catalog.record(audio_path, duration=duration)
+        (short if duration <= SHORT_CLIP_SECONDS else other).append(file_name)
+    return short, other
+
+def clip_batches(files, size=None):
+    """Cut a list of clips into batches of at most size, CLIP_BATCH_SIZE by default"""
+    size = size or CLIP_BATCH_SIZE
+    return [files[i:i + size] for i in range(0, len(files), size)]
+
+def transcribe_clips(files, language=DEFAULT_LANGUAGE, detect_speakers=False, model=DEFAULT_MODEL):
+    """Transcribe short clips together on the loaded model, writing one .txt per clip
+
+    Clips whose batched decoding looks unreliable are transcribed again on
+    their own, with Whisper's temperature fallback. Returns the files that
+    got a transcript.
+    """
+    from .transcribe import transcribe, transcript_key, restore_transcript, store_transcript, process_speaker_output
+
+    decode_language = None if language == AUTO_LANGUAGE else language
+    pending, keys = [], {}
+    for file_name in files:
+        audio_path = os.path.join(MEDIA_DIR, file_name)
+        # Results without timestamps are cached apart from full transcriptions
+        keys[file_name] = transcript_key(audio_path, model, decode_language, detect_speakers, batched=True)
+        full_key = transcript_key(audio_path, model, decode_language, detect_speakers)
+        if restore_transcript(full_key, audio_path) or restore_transcript(keys[file_name], audio_path):
+            log(f"Restored cached transcription for {file_name}")
+        else:
+            pending.append(file_name)
+
+    batched, clips, retry = [], [], []
+    for file_name in pending:
+        audio = engine.load_audio(os.path.join(MEDIA_DIR, file_name))
+        if len(audio) > SHORT_CLIP_SECONDS * engine.SAMPLE_RATE:
+            # The container header understated its length; one window would cut it short
+            log(f"{file_name} is longer than {SHORT_CLIP_SECONDS} s once decoded, transcribing it on its own")
+            retry.append(file_name)
+        else:
+            batched.append(file_name)
+            clips.append(audio)
+
+    if batched:
+        log(f"Decoding {len(batched)} short clip(s) in one batch with '{model}'")
+        for file_name, result in zip(batched, engine.decode_clips(clips, decode_language, model)):
+            if result is None:
+                log(f"Batched decoding of {file_name} was unreliable, transcribing it on its own")
+                retry.append(file_name)
+                continue
+            audio_path = os.path.join(MEDIA_DIR, file_name)
+            engine.write_txt(result, audio_path)
+            if detect_speakers:
+                process_speaker_output(file_name)
+            store_transcript(keys[file_name], audio_path)
+
+    for file_name in retry:
+        try:
+            transcribe(file_name, language, detect_speakers, model=model)
+        except SystemExit:
+            pass
+
+    return [file_name for file_name in files if find_existing_transcript(file_name) is not None]
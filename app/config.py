@@ -8,10 +8,54 @@ MEDIA_DIR = os.path.join(BASE_DIR, "media")
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 LOG_FILE = os.path.join(LOG_DIR, "whisperer.log")
 SETTINGS_FILE = os.path.join(BASE_DIR, "settings.json")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+TRANSCRIPT_CACHE_DIR = os.path.join(CACHE_DIR, "transcripts")
+AUDIO_CACHE_DIR = os.path.join(CACHE_DIR, "audio")
+MEL_CACHE_DIR = os.path.join(CACHE_DIR, "mel")
+LANGUAGE_CACHE_DIR = os.path.join(CACHE_DIR, "languages")
+MODEL_CACHE_DIR = os.path.join(CACHE_DIR, "models")
+SEARCH_INDEX_FILE = os.path.join(CACHE_DIR, "search.sqlite3")
+CATALOG_FILE = os.path.join(CACHE_DIR, "catalog.sqlite3")
 
 # Default settings
 DEFAULT_LANGUAGE = "fr"
 SUPPORTED_LANGUAGES = ["fr", "en", "it", "de"]
+AUTO_LANGUAGE = "auto"  # Detect the language of each file before decoding it
+LANGUAGE_OPTIONS = SUPPORTED_LANGUAGES + [AUTO_LANGUAGE]
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".flac", ".opus", ".ogg", ".webm")
+# How downloads are stored: "mp3" re-encodes, "native" keeps the original audio
+# stream, "pcm" also writes a 16 kHz PCM sidecar the engine reads without ffmpeg
+INGEST_MODES = ["mp3", "native", "pcm"]
+DEFAULT_INGEST_MODE = "native"
+DEFAULT_MODEL = "turbo"  # Same default as the whisper command line tool
+SUPPORTED_MODELS = ["tiny", "tiny.en", "base", "base.en", "small", "small.en", "medium", "medium.en", "large", "turbo"]
+DEFAULT_DRAFT_MODEL = "tiny"  # Quick first pass of the draft mode
+DETECTION_MODEL = "tiny"  # Smallest model, enough to identify the language
+PRECISIONS = ["fp32", "int8"]  # int8 runs the linear layers with dynamically quantized weights
+DEFAULT_PRECISION = "fp32"
+DEFAULT_BATCH_WORKERS = 2
+DEFAULT_DOWNLOAD_WORKERS = 4
+DEFAULT_MAX_PENDING = 4  # Files downloading or waiting for a decoder before downloads pause
+DEFAULT_CHUNK_WORKERS = max(1, min(8, (os.cpu_count() or 1) // 2))  # Also capped by memory, see MODEL_MEMORY_BYTES
+# Rough memory of one fp32 model while decoding; every chunk worker loads its own copy
+MODEL_MEMORY_BYTES = {
+    "tiny": 512 * 1024 ** 2, "tiny.en": 512 * 1024 ** 2,
+    "base": 768 * 1024 ** 2, "base.en": 768 * 1024 ** 2,
+    "small": 1536 * 1024 ** 2, "small.en": 1536 * 1024 ** 2,
+    "medium": 4 * 1024 ** 3, "medium.en": 4 * 1024 ** 3,
+    "large": 7 * 1024 ** 3, "turbo": 4 * 1024 ** 3,
+}
+CHUNKING_MIN_SECONDS = 10 * 60  # Recordings at least this long are decoded in parallel chunks
+CHUNK_MIN_SECONDS = 120  # Chunks shorter than this lose too much context
+SHORT_CLIP_SECONDS = 30  # Clips that fit in one Whisper window are decoded together
+CLIP_BATCH_SIZE = 8  # Short clips decoded in one forward pass, each with a beam of 5
+TRANSCRIPT_CACHE_MAX_BYTES = 200 * 1024 * 1024  # Oldest entries are evicted beyond this size
+AUDIO_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # About 9 hours of decoded audio
+MEL_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # About 11 hours of 128-band float32 mel frames
+LOG_MAX_BYTES = 10 * 1024 * 1024  # whisperer.log is rotated to whisperer.log.1 beyond this size
+LOG_BACKUP_COUNT = 3
+# float16 halves the mel cache but slightly changes the transcript compared to the whisper CLI
+MEL_CACHE_DTYPE = "float32"
 
 def load_language():
     """Load language from settings file, fallback to default"""
@@ -21,7 +65,7 @@ def load_language():
                 settings = json.load(f)
                 language = settings.get('language', DEFAULT_LANGUAGE)
                 # Validate language is supported
-                if language in SUPPORTED_LANGUAGES:
+                if language in LANGUAGE_OPTIONS:
                     return language
     except Exception:
         pass
@@ -29,13 +73,17 @@ def load_language():
 
 def save_language(language):
     """Save language to settings file"""
+    return save_settings(language=language)
+
+def save_settings(**values):
+    """Update settings in the settings file, keeping the other ones"""
     try:
         settings = {}
         if os.path.exists(SETTINGS_FILE):
             with open(SETTINGS_FILE, 'r') as f:
                 settings = json.load(f)
         
-        settings['language'] = language
+        settings.update(values)
         
         with open(SETTINGS_FILE, 'w') as f:
             json.dump(settings, f, indent=2)
@@ -43,6 +91,52 @@ def save_language(language):
     except Exception:
         return False
 
-# Create necessary directories
-os.makedirs(LOG_DIR, exist_ok=True)
-os.makedirs(MEDIA_DIR, exist_ok=True) 
\ No newline at end of file
+def load_setting(name, default, allowed=None):
+    """Load one setting from the settings file, fallback to default"""
+    try:
+        if os.path.exists(SETTINGS_FILE):
+            with open(SETTINGS_FILE, 'r') as f:
+                value = json.load(f).get(name, default)
+                if allowed is None or value in allowed:
+                    return value
+    except Exception:
+        pass
+    return default
+
+def load_ingest_mode():
+    """Load the download ingest mode from settings file, fallback to default"""
+    return load_setting('ingest_mode', DEFAULT_INGEST_MODE, INGEST_MODES)
+
+def load_model_name():
+    """Load the Whisper model from settings file, fallback to default"""
+    return load_setting('model', DEFAULT_MODEL, SUPPORTED_MODELS)
+
+def load_draft_model():
+    """Load the draft model from settings file, or None when draft mode is off"""
+    return load_setting('draft_model', None, SUPPORTED_MODELS)
+
+def load_precision():
+    """Load the CPU inference precision from settings file, fallback to default"""
+    return load_setting('precision', DEFAULT_PRECISION, PRECISIONS)
+
+def load_chunk_workers():
+    """Load the number of processes decoding a long recording, fallback to default"""
+    value = load_setting('chunk_workers', DEFAULT_CHUNK_WORKERS)
+    return value if isinstance(value, int) and not isinstance(value, bool) and value > 0 else DEFAULT_CHUNK_WORKERS
+
+def load_thread_settings():
+    """Load the CPU thread settings from settings file
+
+    Returns (intra_op_threads, inter_op_threads, cpu_affinity); a thread
+    count is None when unset or invalid, leaving the choice to the app.
+    """
+    def count(name):
+        value = load_setting(name, None)
+        return value if isinstance(value, int) and not isinstance(value, bool) and value > 0 else None
+    return count('intra_op_threads'), count('inter_op_threads'), load_setting('cpu_affinity', False) is True
+
+def ensure_directories():
+    """Create the log and media directories if they don't exist yet"""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+ 
\ No newline at end of file
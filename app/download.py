@@ -1,14 +1,33 @@
+import http.client
+import json
 import os
-import subprocess
+import threading
 import urllib.parse
-import urllib.request
 from datetime import datetime
 import re
-from .config import VENV_DIR, MEDIA_DIR, LOG_FILE
+from .config import MEDIA_DIR, DEFAULT_INGEST_MODE, load_ingest_mode
 from .utils import log
-# yt-dlp is now installed via requirements.txt, so no need to ensure it separately
 from .vlc_player import play_audio_with_vlc
 
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 30  # Seconds without data before a transfer counts as interrupted
+MAX_REDIRECTS = 5
+
+# Custom info field holding the file name chosen for a YouTube download
+YOUTUBE_FILENAME_FIELD = "whisperer_filename"
+
+# YoutubeDL instance and last output path of each download thread
+_youtube = threading.local()
+
+# Idle keep-alive connections, keyed by (scheme, host, port), shared by download threads
+_connection_pool = {}
+_pool_lock = threading.Lock()
+
+# Media file names claimed by direct downloads still in progress
+_reserved_names = set()
+_names_lock = threading.Lock()
+
 def is_youtube_url(url):
     """Check if URL is a YouTube URL"""
     youtube_domains = ['youtube.com', 'youtu.be', 'm.youtube.com']
@@ -18,108 +37,342 @@ def is_youtube_url(url):
 def download_from_url(url):
     """Download audio from URL (YouTube or direct link)"""
     if is_youtube_url(url):
-        return download_youtube_audio(url)
+        filename = download_youtube_audio(url)
     else:
-        return download_direct_audio(url)
+        filename = download_direct_audio(url)
+
+    if filename and load_ingest_mode() == "pcm":
+        # Decode once now so transcription can skip ffmpeg entirely
+        from .engine import write_pcm
+        write_pcm(os.path.join(MEDIA_DIR, filename))
+    return filename
+
+class YoutubeLogger:
+    """Route yt-dlp messages to the Whisperer log instead of the terminal"""
+
+    def debug(self, msg):
+        log(f"yt-dlp: {msg}")
+
+    def info(self, msg):
+        log(f"yt-dlp: {msg}")
+
+    def warning(self, msg):
+        log(f"yt-dlp warning: {msg}")
+
+    def error(self, msg):
+        log(f"yt-dlp error: {msg}")
+
+def youtube_filename(title):
+    """Build a media file name (without extension) from a video title"""
+    if title:
+        # Remove invalid filename characters
+        title = re.sub(r'[<>:"/\\|?*]', '', title.strip())
+        # Replace spaces with underscores, truncate to 30 characters
+        filename = title.replace(' ', '_')[:30].rstrip('_')
+        if filename:
+            return filename
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"youtube_{timestamp}"
+
+def _record_output_path(status):
+    """yt-dlp post-processor hook remembering the final path of the audio file"""
+    if status["status"] == "finished" and status["info_dict"].get("filepath"):
+        _youtube.output_path = status["info_dict"]["filepath"]
+
+def youtube_postprocessors(ingest_mode):
+    """yt-dlp post-processors for an ingest mode"""
+    if ingest_mode == "mp3":
+        return [{"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "0"}]
+    # Keep the native audio stream (opus, m4a, ...): ffmpeg only copies it out
+    # of the container instead of re-encoding
+    return [{"key": "FFmpegExtractAudio", "preferredcodec": "best"}]
+
+def create_youtube_dl(ingest_mode=DEFAULT_INGEST_MODE):
+    """Create a YoutubeDL instance that extracts audio into the media directory"""
+    import yt_dlp
+    return yt_dlp.YoutubeDL({
+        "format": "bestaudio/best",
+        "noplaylist": True,
+        # The file name is chosen from the title after metadata extraction
+        "outtmpl": os.path.join(MEDIA_DIR, f"%({YOUTUBE_FILENAME_FIELD})s.%(ext)s"),
+        "postprocessors": youtube_postprocessors(ingest_mode),
+        "postprocessor_hooks": [_record_output_path],
+        "logger": YoutubeLogger(),
+        "quiet": True,
+        "noprogress": True,
+    })
+
+def youtube_dl(ingest_mode=DEFAULT_INGEST_MODE):
+    """YoutubeDL instance of the current thread, reused across downloads"""
+    if getattr(_youtube, "ydl", None) is None or _youtube.ingest_mode != ingest_mode:
+        _youtube.ydl = create_youtube_dl(ingest_mode)
+        _youtube.ingest_mode = ingest_mode
+    return _youtube.ydl
 
 def download_youtube_audio(url):
-    """Download audio from YouTube URL using yt-dlp"""
-    # yt-dlp is now installed via requirements.txt
-    
-    yt_dlp_bin = os.path.join(VENV_DIR, "bin", "yt-dlp")
-    
-    # First, get the video title
+    """Download audio from YouTube URL using the yt-dlp API"""
     print("Getting video information...")
     log("Getting video information...")
-    
-    # Get video title
-    title_result = subprocess.run([
-        yt_dlp_bin,
-        "--get-title",
-        "--no-playlist",
-        url
-    ], capture_output=True, text=True)
-    
-    # Log the title extraction attempt
-    with open(LOG_FILE, "a", encoding="utf-8") as logf:
-        logf.write(f"Title extraction stdout: {title_result.stdout}\n")
-        logf.write(f"Title extraction stderr: {title_result.stderr}\n")
-    
-    if title_result.returncode != 0:
-        print("Error getting video title. Using timestamp filename.")
-        log("Error getting video title, using timestamp filename")
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"youtube_{timestamp}"
-    else:
-        # Clean and truncate title to 30 characters
-        title = title_result.stdout.strip()
-        # Remove invalid filename characters
-        title = re.sub(r'[<>:"/\\|?*]', '', title)
-        # Replace spaces with underscores
-        title = title.replace(' ', '_')
-        # Truncate to 30 characters
-        filename = title[:30]
-        # Remove trailing underscores
-        filename = filename.rstrip('_')
-        
-        if not filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"youtube_{timestamp}"
-    
-    output_template = os.path.join(MEDIA_DIR, f"{filename}.%(ext)s")
-    
-    print(f"Downloading audio from YouTube: {filename}")
-    log(f"Downloading audio from YouTube: {filename}")
-    
-    with open(LOG_FILE, "a", encoding="utf-8") as logf:
-        result = subprocess.run([
-            yt_dlp_bin,
-            "--extract-audio",
-            "--audio-format", "mp3",
-            "--audio-quality", "0",
-            "--output", output_template,
-            url
-        ], stdout=logf, stderr=logf)
-    
-    if result.returncode != 0:
+
+    try:
+        ydl = youtube_dl(load_ingest_mode())
+        _youtube.output_path = None
+        # Fetch metadata once, then download from the same extraction
+        info = ydl.extract_info(url, download=False)
+        filename = youtube_filename(info.get("title"))
+        info[YOUTUBE_FILENAME_FIELD] = filename
+
+        print(f"Downloading audio from YouTube: {filename}")
+        log(f"Downloading audio from YouTube: {filename}")
+        ydl.process_ie_result(info, download=True)
+    except Exception as e:
         print("Error downloading from YouTube. Check logs/whisperer.log for details.")
-        log(f"YouTube download failed for {url} with exit code {result.returncode}")
+        log(f"YouTube download failed for {url}: {e}")
         return None
-    
-    # Find the downloaded file
-    downloaded_files = [f for f in os.listdir(MEDIA_DIR) if f.startswith(filename) and f.endswith('.mp3')]
-    if downloaded_files:
-        downloaded_file = downloaded_files[0]
+
+    output_path = _youtube.output_path
+    if output_path and os.path.exists(output_path):
         # Don't play audio here - let the main function handle it
-        return downloaded_file
+        return os.path.basename(output_path)
+    log(f"YouTube download for {url} produced no audio file")
     return None
 
-def download_direct_audio(url):
-    """Download audio from direct URL"""
+def partial_download_path(filepath):
+    """Hidden temp file a download is streamed to until it is complete"""
+    directory, name = os.path.split(filepath)
+    return os.path.join(directory, f".{name}.part")
+
+def reserve_filename(filename):
+    """Claim a media file name that no existing file or download in progress uses
+
+    Clashing names are numbered: audio.mp3, audio_1.mp3, audio_2.mp3, ...
+    """
+    stem, ext = os.path.splitext(filename)
+    with _names_lock:
+        candidate, number = filename, 1
+        while candidate in _reserved_names or os.path.exists(os.path.join(MEDIA_DIR, candidate)):
+            candidate = f"{stem}_{number}{ext}"
+            number += 1
+        _reserved_names.add(candidate)
+    return candidate
+
+def release_filename(filename):
+    """Give back a name claimed with reserve_filename once its download is over"""
+    with _names_lock:
+        _reserved_names.discard(filename)
+
+def validator_path(part_path):
+    """Sidecar recording which URL and file version a .part file holds"""
+    return part_path + ".json"
+
+def read_validator(part_path):
+    """The validator saved next to a .part file, or None"""
+    try:
+        with open(validator_path(part_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_validator(part_path, url, response):
+    """Remember the URL and the ETag/Last-Modified of the response a .part file is written from"""
+    with open(validator_path(part_path), "w", encoding="utf-8") as f:
+        json.dump({
+            "url": url,
+            "etag": response.getheader("ETag"),
+            "last_modified": response.getheader("Last-Modified"),
+        }, f)
+
+def discard_partial(part_path):
+    """Remove a .part file and its validator"""
+    for path in (part_path, validator_path(part_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+def if_range(validator):
+    """If-Range value for a validator: its strong ETag, else its Last-Modified date, else None"""
+    etag = validator.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validator.get("last_modified")
+
+def content_range(response):
+    """(first byte, total size) from a Content-Range header, each None when absent or unknown"""
+    match = re.match(r"bytes (?:(\d+)-\d+|\*)/(\d+|\*)", response.getheader("Content-Range") or "")
+    if not match:
+        return None, None
+    start, total = match.groups()
+    return int(start) if start else None, int(total) if total != "*" else None
+
+def _connection_key(parsed_url):
+    """Pool key identifying the host a connection talks to"""
+    default_port = 443 if parsed_url.scheme == "https" else 80
+    return parsed_url.scheme, parsed_url.hostname, parsed_url.port or default_port
+
+def _get_connection(key):
+    """Take an idle keep-alive connection to a host from the pool, or open one"""
+    with _pool_lock:
+        idle = _connection_pool.get(key)
+        if idle:
+            return idle.pop()
+    scheme, host, port = key
+    connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+    return connection_class(host, port, timeout=DOWNLOAD_TIMEOUT)
+
+def _release_connection(key, connection, response):
+    """Return a fully read connection to the pool unless the server is closing it"""
+    if response.will_close:
+        connection.close()
+        return
+    with _pool_lock:
+        _connection_pool.setdefault(key, []).append(connection)
+
+def close_connections():
+    """Close every pooled connection"""
+    with _pool_lock:
+        for connections in _connection_pool.values():
+            for connection in connections:
+                connection.close()
+        _connection_pool.clear()
+
+def _request(key, path, headers):
+    """Send a GET on a pooled connection, reconnecting once if the server dropped it"""
+    connection = _get_connection(key)
     try:
-        # Generate filename from URL
+        connection.request("GET", path, headers=headers)
+        return connection, connection.getresponse()
+    except (http.client.HTTPException, OSError):
+        # HTTPConnection reopens the socket on the next request once closed
+        connection.close()
+    connection.request("GET", path, headers=headers)
+    return connection, connection.getresponse()
+
+def _open_response(url, offset, condition=None):
+    """GET url from byte offset onward, following redirects
+
+    condition is sent as If-Range, so the server returns the whole file
+    instead of the rest when it no longer matches.
+
+    Returns (pool key, connection, response).
+    """
+    for _ in range(MAX_REDIRECTS + 1):
         parsed_url = urllib.parse.urlparse(url)
-        filename = os.path.basename(parsed_url.path)
-        
-        if not filename or '.' not in filename:
-            # Generate filename with timestamp if no proper filename found
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"audio_{timestamp}.mp3"
-        
+        key = _connection_key(parsed_url)
+        path = parsed_url.path or "/"
+        if parsed_url.query:
+            path += "?" + parsed_url.query
+        headers = {"User-Agent": "whisperer"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if condition:
+                headers["If-Range"] = condition
+
+        connection, response = _request(key, path, headers)
+        location = response.getheader("Location")
+        if response.status not in (301, 302, 303, 307, 308) or not location:
+            return key, connection, response
+        response.read()
+        _release_connection(key, connection, response)
+        url = urllib.parse.urljoin(url, location)
+    raise RuntimeError(f"Too many redirects for {url}")
+
+def _stream_to_file(url, part_path):
+    """Append the rest of url to part_path, resuming from its current size
+
+    A .part file is resumed only if its validator shows it came from the
+    same URL and the server confirms the file has not changed since;
+    otherwise the download starts over.
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = read_validator(part_path) if offset else None
+    condition = if_range(validator) if validator and validator.get("url") == url else None
+    if offset and not condition:
+        log(f"Cannot tell whether {os.path.basename(part_path)} is still current, downloading it again")
+        discard_partial(part_path)
+        offset = 0
+
+    key, connection, response = _open_response(url, offset, condition)
+    restart = False
+    try:
+        if response.status == 416 and offset:
+            # Nothing left after offset, which is only complete if the file is exactly that long
+            response.read()
+            restart = content_range(response)[1] != offset
+        elif response.status == 206 and offset and content_range(response)[0] != offset:
+            response.read()
+            restart = True
+        elif response.status in (200, 206):
+            if response.status == 200 or not offset:
+                # The whole file: the server ignored Range, or If-Range found the file changed
+                offset = 0
+                write_validator(part_path, url, response)
+            length = response.getheader("Content-Length")
+            received = 0
+            with open(part_path, "ab" if offset else "wb") as f:
+                while True:
+                    chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    received += len(chunk)
+            if length is not None and received < int(length):
+                raise http.client.IncompleteRead(b"", int(length) - received)
+        else:
+            response.read()
+            raise RuntimeError(f"HTTP {response.status} {response.reason}")
+    except BaseException:
+        connection.close()
+        raise
+    _release_connection(key, connection, response)
+
+    if restart:
+        log(f"Server response does not continue {os.path.basename(part_path)}, downloading it again")
+        discard_partial(part_path)
+        _stream_to_file(url, part_path)
+
+def download_direct_audio(url):
+    """Download audio from direct URL
+
+    The file is streamed to a hidden .part file and renamed into media/ only
+    once complete; interrupted transfers resume with an HTTP Range request
+    validated against the ETag or Last-Modified date saved beside it.
+    Concurrent downloads of the same name each get their own file.
+    """
+    # Generate filename from URL
+    parsed_url = urllib.parse.urlparse(url)
+    filename = os.path.basename(parsed_url.path)
+    
+    if not filename or '.' not in filename:
+        # Generate filename with timestamp if no proper filename found
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"audio_{timestamp}.mp3"
+    filename = reserve_filename(filename)
+    
+    try:
         filepath = os.path.join(MEDIA_DIR, filename)
+        part_path = partial_download_path(filepath)
         
         print(f"Downloading audio file: {filename}")
         log(f"Downloading audio file: {filename}")
         
-        # Download the file
-        urllib.request.urlretrieve(url, filepath)
+        # Download the file, resuming after dropped connections
+        for attempt in range(1, DOWNLOAD_RETRIES + 1):
+            try:
+                _stream_to_file(url, part_path)
+                break
+            except (http.client.HTTPException, OSError) as e:
+                if attempt == DOWNLOAD_RETRIES:
+                    raise
+                log(f"Download of {filename} interrupted ({e}), resuming (attempt {attempt + 1}/{DOWNLOAD_RETRIES})")
         
-        if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
+        if os.path.exists(part_path) and os.path.getsize(part_path) > 0:
+            os.replace(part_path, filepath)
+            discard_partial(part_path)
             print(f"Successfully downloaded: {filename}")
             log(f"Successfully downloaded: {filename}")
             # Don't play audio here - let the main function handle it
             return filename
         else:
+            discard_partial(part_path)
             print("Download failed: file is empty or doesn't exist")
             log("Download failed: file is empty or doesn't exist")
             return None
@@ -127,4 +380,21 @@ def download_direct_audio(url):
     except Exception as e:
         print(f"Error downloading file: {e}")
         log(f"Error downloading file: {e}")
-        return None 
\ No newline at end of file
+        return None
+    finally:
+        release_filename(filename)
+
+def read_url_list(path):
+    """Read URLs from a text file, one per line, ignoring blank lines and # comments"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+def expand_url_args(items):
+    """Expand command line items that are either URLs or files listing URLs"""
+    urls = []
+    for item in items:
+        if os.path.isfile(item):
+            urls.extend(read_url_list(item))
+        else:
+            urls.append(item)
+    return urls
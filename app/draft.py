@@ -0,0 +1,132 @@
+"""
+Quick draft transcripts, refined by a larger model in the background
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from .config import BASE_DIR, MEDIA_DIR, DEFAULT_LANGUAGE, DEFAULT_MODEL, DEFAULT_DRAFT_MODEL
+from .utils import log
+
+DRAFT_SUFFIX = ".draft"  # Marks a transcript still being refined; holds the refine model and process ID
+
+def marker_path(file_name):
+    """Path of the draft marker stored next to an audio file"""
+    return os.path.join(MEDIA_DIR, os.path.splitext(file_name)[0] + DRAFT_SUFFIX)
+
+def write_marker(file_name, model, pid):
+    """Mark a transcript as a draft being refined by process pid with model"""
+    with open(marker_path(file_name), "w", encoding="utf-8") as f:
+        json.dump({"model": model, "pid": pid}, f)
+
+def remove_marker(file_name):
+    """Mark a transcript as final"""
+    path = marker_path(file_name)
+    if os.path.exists(path):
+        os.remove(path)
+
+def is_running(pid):
+    """Check whether a process is still running, reaping it if it is a finished child of ours"""
+    try:
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        # Started by an earlier session
+        pass
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def refining_model(file_name):
+    """Return the model refining a draft transcript, or None if it is final
+
+    A marker left by a refine process that was killed or crashed is
+    cleared, leaving the draft as the transcript.
+    """
+    path = marker_path(file_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    try:
+        marker = json.loads(content)
+    except ValueError:
+        # Markers written before they held a process ID
+        marker = {"model": content}
+    if not isinstance(marker, dict):
+        marker = {}
+    pid = marker.get("pid")
+    if isinstance(pid, int) and not is_running(pid):
+        log(f"Refine of {file_name} (process {pid}) is no longer running, keeping the draft transcript")
+        remove_marker(file_name)
+        return None
+    return marker.get("model") or DEFAULT_MODEL
+
+def start_refine(file_name, language, detect_speakers, model):
+    """Start a detached process that replaces the draft with the model's transcript"""
+    command = [sys.executable, "-m", "app.draft", file_name, "--language", language, "--model", model]
+    if detect_speakers:
+        command.append("--detect-speakers")
+    # A new session keeps the refine running after the app exits
+    return subprocess.Popen(
+        command,
+        cwd=BASE_DIR,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+
+def transcribe_with_refine(file_name, language=DEFAULT_LANGUAGE, detect_speakers=False, stream=False,
+                           model=DEFAULT_MODEL, draft_model=DEFAULT_DRAFT_MODEL):
+    """Write a draft transcript with a small model now and refine it in the background"""
+    from .transcribe import transcribe
+
+    print(f"Writing a quick draft with '{draft_model}', then refining it with '{model}' in the background")
+    log(f"Draft transcription of {file_name} with '{draft_model}', refining with '{model}'")
+    transcribe(file_name, language, detect_speakers, stream, model=draft_model)
+
+    txt_path = os.path.join(MEDIA_DIR, os.path.splitext(file_name)[0] + ".txt")
+    if not os.path.exists(txt_path):
+        return
+    process = start_refine(file_name, language, detect_speakers, model)
+    write_marker(file_name, model, process.pid)
+
+def refine(file_name, language=DEFAULT_LANGUAGE, detect_speakers=False, model=DEFAULT_MODEL):
+    """Replace a draft transcript with one from a larger model, reporting success"""
+    from .transcribe import transcribe
+
+    # Stay out of the way of the interactive session
+    if hasattr(os, "nice"):
+        os.nice(10)
+
+    log(f"Refining draft transcript of {file_name} with '{model}'")
+    try:
+        transcribe(file_name, language, detect_speakers, model=model)
+    except SystemExit:
+        # transcribe() exits on failure; the draft stays in place as the transcript
+        log(f"Refining {file_name} failed, keeping the draft transcript")
+        remove_marker(file_name)
+        return False
+
+    remove_marker(file_name)
+    log(f"Refined transcript of {file_name} with '{model}'")
+    return True
+
+def main(argv=None):
+    """Entry point of the background refine process"""
+    parser = argparse.ArgumentParser(prog="python -m app.draft", description="Refine a draft transcript")
+    parser.add_argument("file_name")
+    parser.add_argument("--language", default=DEFAULT_LANGUAGE)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--detect-speakers", action="store_true")
+    args = parser.parse_args(argv)
+    return 0 if refine(args.file_name, args.language, args.detect_speakers, args.model) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
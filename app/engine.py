@@ -0,0 +1,487 @@
+"""
+In-process Whisper engine for Whisperer
+"""
+import contextlib
+import importlib.util
+import io
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import warnings
+from .config import MEDIA_DIR, DEFAULT_MODEL, DETECTION_MODEL, CHUNKING_MIN_SECONDS, MODEL_MEMORY_BYTES, load_chunk_workers, load_precision
+from . import cache
+from .tuning import available_memory
+from .utils import log, log_output
+
+SAMPLE_RATE = 16000  # Whisper decodes 16 kHz mono audio
+FRAMES_PER_SECOND = 100  # Whisper mel frames, used by the segment "seek" field
+DETECTION_SECONDS = 30  # Whisper identifies the language from one 30 s window
+PCM_SUFFIX = ".pcm"  # Raw 16 kHz mono s16le audio, ready to transcribe
+
+# Decoding options matching the defaults of the `whisper` command line tool,
+# so both transcription paths produce the same transcript
+CLI_DECODE_OPTIONS = {
+    "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+    "best_of": 5,
+    "beam_size": 5,
+    "fp16": False,
+}
+
+# Segment lines printed by Whisper in verbose mode: "[00:01.000 --> 00:04.500]  text"
+SEGMENT_LINE = re.compile(r"^\[((?:\d+:)?\d+:\d+\.\d+) --> ((?:\d+:)?\d+:\d+\.\d+)\]\s*(.*)$")
+
+# Models loaded in this process, keyed by (model name, device, precision)
+_models = {}
+
+def is_available():
+    """Check if the whisper Python package can be imported in this process"""
+    return importlib.util.find_spec("whisper") is not None
+
+def parse_timestamp(timestamp):
+    """Convert a Whisper timestamp ([HH:]MM:SS.mmm) to seconds"""
+    seconds = 0.0
+    for part in timestamp.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def parse_segment_line(line):
+    """Parse a Whisper verbose segment line into (start, end, text), or None"""
+    match = SEGMENT_LINE.match(line.strip())
+    if not match:
+        return None
+    return parse_timestamp(match.group(1)), parse_timestamp(match.group(2)), match.group(3)
+
+class SegmentLineWriter(io.TextIOBase):
+    """Text stream that hands each segment line Whisper prints to a callback
+
+    Every line is also written to the log as it arrives, like the output of
+    the whisper command line fallback.
+    """
+
+    def __init__(self, on_segment, passthrough):
+        self.on_segment = on_segment
+        self.passthrough = passthrough
+        self._buffer = ""
+
+    def write(self, text):
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                log_output(line)
+            segment = parse_segment_line(line)
+            if segment:
+                self.on_segment(*segment)
+            elif line.strip():
+                self.passthrough.write(line + "\n")
+        return len(text)
+
+    def flush(self):
+        self.passthrough.flush()
+
+@contextlib.contextmanager
+def quantization_warnings_silenced():
+    """Hide the deprecation warnings recent torch releases print for eager-mode quantization"""
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*torch.ao.quantization.*")
+        warnings.filterwarnings("ignore", message=".*quantize_per_tensor.*")
+        yield
+
+def quantize_model(model):
+    """Quantize the linear layers of a Whisper model to int8, in place
+
+    Weights are stored as int8 and activations are quantized on the fly, so
+    the matrix multiplications that dominate CPU decoding run on int8
+    kernels. Embeddings, convolutions and layer norms stay in fp32.
+    """
+    import torch
+    from whisper.model import Linear
+    for module in model.modules():
+        # Whisper's Linear only adds a dtype cast, and quantize_dynamic matches exact types
+        if type(module) is Linear:
+            module.__class__ = torch.nn.Linear
+    with quantization_warnings_silenced():
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def quantized_checkpoint(model):
+    """Return the weights of a quantized Whisper model as plain tensors
+
+    Packed int8 weights are stored as their integer values, scale and zero
+    point: they then load with weights_only, and pickling them does not trip
+    over modules such as yt-dlp's lazy imports.
+    """
+    import torch
+    state = {name: tensor.detach() for name, tensor in model.named_parameters()}
+    layers = {}
+    for name, module in model.named_modules():
+        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+            weight = module.weight()
+            layers[name] = {
+                "weight": weight.int_repr(),
+                "scale": weight.q_scale(),
+                "zero_point": weight.q_zero_point(),
+                "bias": module.bias(),
+            }
+    return {
+        "dims": dict(model.dims.__dict__),
+        "state": state,
+        "linear": layers,
+        "alignment_heads": model.alignment_heads.to_dense(),
+    }
+
+def restore_quantized(checkpoint):
+    """Rebuild a quantized Whisper model from quantized_checkpoint() output"""
+    import torch
+    from whisper.model import ModelDimensions, Whisper
+
+    model = quantize_model(Whisper(ModelDimensions(**checkpoint["dims"])))
+    modules = dict(model.named_modules())
+    for name, layer in checkpoint["linear"].items():
+        weight = (layer["weight"].float() - layer["zero_point"]) * layer["scale"]
+        with quantization_warnings_silenced():
+            weight = torch.quantize_per_tensor(weight, layer["scale"], layer["zero_point"], torch.qint8)
+        modules[name].set_weight_bias(weight, layer["bias"])
+    # The remaining fp32 parameters: embeddings, convolutions and layer norms
+    parameters = dict(model.named_parameters())
+    if parameters.keys() != checkpoint["state"].keys():
+        raise ValueError("parameters do not match the model dimensions")
+    with torch.no_grad():
+        for name, tensor in checkpoint["state"].items():
+            parameters[name].copy_(tensor)
+    return model
+
+def load_quantized_model(model_name):
+    """Load the int8 model from the model cache, quantizing and caching it on a miss"""
+    entry_path = cache.model_entry_path(model_name, "int8")
+    checkpoint = cache.open_model(entry_path)
+    model = None
+    if checkpoint is not None:
+        try:
+            model = restore_quantized(checkpoint)
+        except (KeyError, ValueError, RuntimeError) as e:
+            log(f"Ignoring cached quantized model '{model_name}': {e}")
+    if model is None:
+        import whisper
+        model = quantize_model(whisper.load_model(model_name, device="cpu"))
+        checkpoint = quantized_checkpoint(model)
+        try:
+            cache.store_model(entry_path, checkpoint)
+        except OSError as e:
+            log(f"Could not cache quantized model '{model_name}': {e}")
+    # Word timestamps use these heads; they are not part of the state dict
+    model.register_buffer("alignment_heads", checkpoint["alignment_heads"].to_sparse(), persistent=False)
+    return model.eval()
+
+def load_model(model_name=DEFAULT_MODEL, device="cpu", precision=None):
+    """Load a Whisper model once and reuse it for the rest of the session
+
+    precision defaults to the 'precision' setting; int8 only applies on CPU.
+    """
+    precision = precision or load_precision()
+    if device != "cpu":
+        precision = "fp32"
+    key = (model_name, device, precision)
+    if key not in _models:
+        print(f"  Loading model '{model_name}'...")
+        log(f"Loading Whisper model '{model_name}' on {device} ({precision})")
+        if precision == "int8":
+            _models[key] = load_quantized_model(model_name)
+        else:
+            import whisper
+            _models[key] = whisper.load_model(model_name, device=device)
+    return _models[key]
+
+def pcm_path(audio_path):
+    """Path of the 16 kHz PCM sidecar written next to an audio file"""
+    return os.path.splitext(audio_path)[0] + PCM_SUFFIX
+
+def write_pcm(audio_path):
+    """Decode an audio file once into a raw 16 kHz mono s16le sidecar"""
+    path = pcm_path(audio_path)
+    temp_path = path + ".tmp"
+    # Same conversion as whisper.audio.load_audio, written to disk instead of a pipe
+    result = subprocess.run([
+        "ffmpeg", "-nostdin", "-threads", "0", "-y",
+        "-i", audio_path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE),
+        temp_path
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        log(f"Could not write PCM sidecar for {audio_path}: {result.stderr.strip()}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+    os.replace(temp_path, path)
+    return path
+
+def decode_audio(audio_path):
+    """Decode an audio file to a 16 kHz mono float32 array
+
+    A PCM sidecar newer than the audio file is read directly, without ffmpeg.
+    """
+    path = pcm_path(audio_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(audio_path):
+        import numpy as np
+        return np.fromfile(path, dtype=np.int16).astype(np.float32) / 32768.0
+
+    from whisper.audio import load_audio as whisper_load_audio
+    return whisper_load_audio(audio_path)
+
+def probe_duration(audio_path):
+    """Return an audio file's duration in seconds without decoding it, or None if unknown
+
+    A fresh PCM sidecar gives it from its size, anything else from the
+    container header through ffprobe.
+    """
+    path = pcm_path(audio_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(audio_path):
+        return os.path.getsize(path) / 2 / SAMPLE_RATE
+    try:
+        result = subprocess.run([
+            "ffprobe", "-v", "error", "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1", audio_path
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    except OSError as e:
+        log(f"Could not run ffprobe on {audio_path}: {e}")
+        return None
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        log(f"ffprobe found no duration for {audio_path}: {result.stderr.strip()}")
+        return None
+
+def load_audio(audio_path):
+    """Return the decoded audio of a file, memory-mapped from the audio cache
+
+    Files are decoded once; later runs, in any language or with any model,
+    map the cached array instead of running ffmpeg again.
+    """
+    entry_path = cache.audio_entry_path(audio_path)
+    audio = cache.open_audio(entry_path)
+    if audio is not None:
+        return audio
+
+    audio = decode_audio(audio_path)
+    try:
+        cache.store_audio(entry_path, audio)
+    except OSError as e:
+        log(f"Could not cache decoded audio for {audio_path}: {e}")
+        return audio
+    mapped = cache.open_audio(entry_path)
+    # The entry may already be evicted if it alone exceeds the cache size
+    return audio if mapped is None else mapped
+
+def window_id(cache_path, start, end):
+    """Mel cache id of samples start:end of a decoded-audio cache entry"""
+    return f"{os.path.splitext(os.path.basename(cache_path))[0]}-{start}-{end}"
+
+@contextlib.contextmanager
+def cached_mel(mel_id):
+    """Serve the log-mel spectrogram Whisper computes for mel_id from the mel cache
+
+    whisper.transcribe computes the spectrogram of the whole window before
+    decoding; its function is swapped for one that maps a cached copy, or
+    computes and stores the spectrogram on a miss.
+    """
+    import torch
+    module = importlib.import_module("whisper.transcribe")
+    compute = module.log_mel_spectrogram
+
+    def log_mel_spectrogram(audio, n_mels=80, padding=0, device=None):
+        entry_path = cache.mel_entry_path(mel_id, n_mels, padding)
+        mel = cache.open_mel(entry_path)
+        if mel is not None:
+            mel = torch.from_numpy(mel)
+            return mel if device is None else mel.to(device)
+
+        mel = compute(audio, n_mels, padding, device)
+        try:
+            cache.store_mel(entry_path, mel.cpu().numpy())
+        except OSError as e:
+            log(f"Could not cache mel spectrogram {mel_id}: {e}")
+        return mel
+
+    module.log_mel_spectrogram = log_mel_spectrogram
+    try:
+        yield
+    finally:
+        module.log_mel_spectrogram = compute
+
+def decode(audio, language, word_timestamps=False, model_name=DEFAULT_MODEL, device="cpu", verbose=False, on_segment=None, mel_id=None):
+    """Transcribe a 16 kHz audio array with a loaded model
+
+    If on_segment is given it is called with (start, end, text) as soon as
+    each segment is decoded. If mel_id is given the log-mel spectrogram is
+    read from, or added to, the mel cache.
+    """
+    model = load_model(model_name, device)
+    with contextlib.ExitStack() as stack:
+        if mel_id is not None:
+            stack.enter_context(cached_mel(mel_id))
+        if on_segment is not None:
+            # Whisper only reports segments by printing them in verbose mode
+            stack.enter_context(contextlib.redirect_stdout(SegmentLineWriter(on_segment, sys.stdout)))
+            verbose = True
+        return model.transcribe(
+            audio,
+            language=language,
+            task="transcribe",
+            word_timestamps=word_timestamps,
+            verbose=verbose,
+            **CLI_DECODE_OPTIONS
+        )
+
+def detect_language(audio_path, model_name=DETECTION_MODEL, device="cpu"):
+    """Identify the spoken language from the first 30 seconds with a small model"""
+    import whisper
+    model = load_model(model_name, device)
+    audio = whisper.pad_or_trim(load_audio(audio_path)[:DETECTION_SECONDS * SAMPLE_RATE])
+    mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels).to(model.device)
+    _, probs = model.detect_language(mel)
+    return max(probs, key=probs.get)
+
+def is_silent(decoding):
+    """Check whether whisper would treat a decoded window as silence"""
+    return decoding.no_speech_prob > 0.6 and decoding.avg_logprob < -1.0
+
+def is_reliable(decoding):
+    """Check a temperature 0 decoding against the thresholds whisper uses to retry at a higher temperature"""
+    return is_silent(decoding) or (decoding.compression_ratio <= 2.4 and decoding.avg_logprob >= -1.0)
+
+def batch_decoding_task(model, options):
+    """Whisper decoding task that can beam search a batch of several clips
+
+    whisper.decode repeats each clip's tokens once per beam but not its
+    audio features, so beam search fails on batches of more than one clip.
+    """
+    from whisper.decoding import DecodingTask
+
+    class BatchDecodingTask(DecodingTask):
+        def _get_audio_features(self, mel):
+            return super()._get_audio_features(mel).repeat_interleave(self.n_group, dim=0)
+
+        def _detect_language(self, audio_features, tokens):
+            # One language per clip, not per beam
+            return super()._detect_language(audio_features[::self.n_group], tokens)
+
+    return BatchDecodingTask(model, options)
+
+def decode_clips(clips, language, model_name=DEFAULT_MODEL, device="cpu"):
+    """Decode several clips of at most 30 seconds in one batched forward pass
+
+    Each clip is padded to a full Whisper window and the mel spectrograms are
+    stacked, so the encoder and every decoder step run once for the whole
+    batch. Beam search uses the beam size of the whisper command line, so a
+    clip reads the same as when transcribed alone. Returns one result per
+    clip in the shape model.transcribe() returns, or None for a clip whose
+    decoding looks unreliable and should be transcribed on its own with
+    temperature fallback.
+    """
+    import numpy as np
+    import torch
+    import whisper
+
+    model = load_model(model_name, device)
+    mels = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(np.asarray(clip, dtype=np.float32)), model.dims.n_mels)
+        for clip in clips
+    ]).to(model.device)
+    options = whisper.DecodingOptions(task="transcribe", language=language, without_timestamps=True,
+                                      beam_size=CLI_DECODE_OPTIONS["beam_size"], fp16=CLI_DECODE_OPTIONS["fp16"])
+    with torch.no_grad():
+        decodings = batch_decoding_task(model, options).run(mels)
+
+    results = []
+    for clip, decoding in zip(clips, decodings):
+        if not is_reliable(decoding):
+            results.append(None)
+            continue
+        text = "" if is_silent(decoding) else decoding.text
+        segments = [{"id": 0, "start": 0.0, "end": len(clip) / SAMPLE_RATE, "text": text}] if text else []
+        results.append({"text": text, "segments": segments, "language": decoding.language})
+    return results
+
+def offset_segments(segments, offset_seconds):
+    """Shift segment and word timestamps by offset_seconds"""
+    shifted = []
+    for segment in segments:
+        segment = dict(segment)
+        segment["start"] += offset_seconds
+        segment["end"] += offset_seconds
+        if "seek" in segment:
+            segment["seek"] += int(round(offset_seconds * FRAMES_PER_SECOND))
+        if "words" in segment:
+            segment["words"] = [
+                dict(word, start=word["start"] + offset_seconds, end=word["end"] + offset_seconds)
+                for word in segment["words"]
+            ]
+        shifted.append(segment)
+    return shifted
+
+def write_txt(result, audio_path):
+    """Write a transcript next to the audio file, exactly like the whisper CLI, and its segment file"""
+    from whisper.utils import get_writer
+    from .export import write_segments
+    get_writer("txt", os.path.dirname(audio_path))(result, audio_path)
+    write_segments(result, audio_path)
+
+def chunk_workers(model_name):
+    """Number of processes to decode a long recording with
+
+    Each one loads its own copy of the model, so the chunk_workers setting
+    is lowered until every copy fits in the available memory.
+    """
+    workers = load_chunk_workers()
+    memory = available_memory()
+    per_worker = MODEL_MEMORY_BYTES.get(model_name)
+    if memory is not None and per_worker and workers * per_worker > memory:
+        fitting = max(1, memory // per_worker)
+        log(f"Using {fitting} chunk worker(s) instead of {workers}: "
+            f"{memory / 1024 ** 3:.1f} GB available, about {per_worker / 1024 ** 3:.1f} GB per {model_name} model")
+        workers = fitting
+    return workers
+
+def transcribe_file(file_name, language, word_timestamps=False, model_name=DEFAULT_MODEL, device="cpu", verbose=False, on_segment=None, previous_segments=()):
+    """Transcribe a file from the media directory and write its .txt transcript
+
+    previous_segments are segments already decoded by an interrupted run;
+    decoding resumes at the end of the last one.
+    """
+    audio_path = os.path.join(MEDIA_DIR, file_name)
+    audio = load_audio(audio_path)
+
+    offset = previous_segments[-1]["end"] if previous_segments else 0.0
+    start_sample = int(offset * SAMPLE_RATE)
+    if offset:
+        audio = audio[start_sample:]
+        if on_segment is not None:
+            report = on_segment
+            on_segment = lambda start, end, text: report(start + offset, end + offset, text)
+
+    # Audio memory-mapped from the audio cache can be located by path, which
+    # also identifies its mel spectrogram in the mel cache
+    cache_path = getattr(audio, "filename", None)
+
+    # Long recordings are split at silences and decoded on several processes,
+    # unless we already are a worker of a batch or chunk pool
+    workers = 1
+    if len(audio) >= CHUNKING_MIN_SECONDS * SAMPLE_RATE and multiprocessing.parent_process() is None:
+        workers = chunk_workers(model_name)
+    if workers > 1:
+        from .chunking import transcribe_chunked
+        # Workers map their own window of the cached audio instead of receiving a copy
+        source = (cache_path, start_sample) if cache_path else None
+        result = transcribe_chunked(audio, language, word_timestamps, model_name, workers=workers,
+                                    on_segment=on_segment, source=source)
+    else:
+        mel_id = window_id(cache_path, start_sample, start_sample + len(audio)) if cache_path else None
+        result = decode(audio, language, word_timestamps, model_name, device, verbose, on_segment, mel_id)
+
+    if previous_segments:
+        segments = list(previous_segments) + offset_segments(result["segments"], offset)
+        result = dict(result, segments=segments, text="".join(segment["text"] for segment in segments))
+
+    write_txt(result, audio_path)
+    return result
@@ -0,0 +1,119 @@
+"""
+Structured segment files with word timings, and subtitle exporters that read them
+"""
+import json
+import os
+from .config import MEDIA_DIR
+from .utils import log
+
+SEGMENTS_SUFFIX = ".segments.json"  # Written next to the .txt by every transcription
+EXPORT_FORMATS = ["srt", "vtt", "tsv"]
+
+def segments_path(audio_path):
+    """Path of the segment file stored next to an audio file"""
+    return os.path.splitext(audio_path)[0] + SEGMENTS_SUFFIX
+
+def compact_segments(result):
+    """Reduce a Whisper result to segment and word timings
+
+    Words are stored as [word, start, end, probability] lists, which keeps
+    the file a fraction of the size of Whisper's own JSON output.
+    """
+    segments = []
+    for segment in result.get("segments", []):
+        compact = {
+            "start": round(segment["start"], 2),
+            "end": round(segment["end"], 2),
+            "text": segment["text"].strip(),
+        }
+        if segment.get("words"):
+            compact["words"] = [
+                [word["word"], round(word["start"], 2), round(word["end"], 2), round(word.get("probability", 0.0), 3)]
+                for word in segment["words"]
+            ]
+        segments.append(compact)
+    return {"language": result.get("language"), "segments": segments}
+
+def write_segments(result, audio_path):
+    """Write the segment file of a transcription next to the audio file"""
+    path = segments_path(audio_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(compact_segments(result), f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return path
+
+def read_segments(path):
+    """Return the segments of a segment file"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["segments"]
+
+def load_segments(audio_path):
+    """Return the segments stored for an audio file, or None if there is no segment file"""
+    path = segments_path(audio_path)
+    if not os.path.exists(path):
+        return None
+    return read_segments(path)
+
+def format_timestamp(seconds, separator):
+    """Format seconds as HH:MM:SS<separator>mmm"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+def to_srt(segments):
+    """Render segments as SubRip subtitles"""
+    blocks = []
+    for i, segment in enumerate(segments, 1):
+        start = format_timestamp(segment["start"], ",")
+        end = format_timestamp(segment["end"], ",")
+        blocks.append(f"{i}\n{start} --> {end}\n{segment['text']}\n")
+    return "\n".join(blocks)
+
+def to_vtt(segments):
+    """Render segments as WebVTT subtitles"""
+    blocks = ["WEBVTT\n"]
+    for segment in segments:
+        start = format_timestamp(segment["start"], ".")
+        end = format_timestamp(segment["end"], ".")
+        blocks.append(f"{start} --> {end}\n{segment['text']}\n")
+    return "\n".join(blocks)
+
+def to_tsv(segments):
+    """Render segments as tab-separated start, end (in milliseconds) and text, like Whisper's tsv writer"""
+    lines = ["start\tend\ttext"]
+    for segment in segments:
+        text = segment["text"].replace("\t", " ")
+        lines.append(f"{int(round(segment['start'] * 1000))}\t{int(round(segment['end'] * 1000))}\t{text}")
+    return "\n".join(lines) + "\n"
+
+RENDERERS = {"srt": to_srt, "vtt": to_vtt, "tsv": to_tsv}
+
+def export(file_name, output_format):
+    """Write <name>.<format> from a file's segment file, without decoding again
+
+    Returns the path written, or None if the file has no segment file yet.
+    """
+    audio_path = os.path.join(MEDIA_DIR, file_name)
+    segments = load_segments(audio_path)
+    if segments is None:
+        return None
+    path = os.path.splitext(audio_path)[0] + "." + output_format
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(RENDERERS[output_format](segments))
+    log(f"Exported {file_name} to {os.path.basename(path)}")
+    return path
+
+def export_all(files, output_format):
+    """Export every file that has a segment file, reporting the others"""
+    exported = []
+    for file_name in files:
+        path = export(file_name, output_format)
+        if path:
+            exported.append(path)
+            print(f"Exported: {os.path.basename(path)}")
+        elif os.path.exists(os.path.join(MEDIA_DIR, os.path.splitext(file_name)[0] + ".txt")):
+            print(f"Skipped: {file_name} (transcribed before segment files existed)")
+    return exported
@@ -0,0 +1,102 @@
+"""
+Download/transcribe pipeline overlapping network I/O with CPU decoding
+"""
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from .batch import init_worker, threads_per_worker, transcribe_worker
+from .config import DEFAULT_BATCH_WORKERS, DEFAULT_DOWNLOAD_WORKERS, DEFAULT_LANGUAGE, DEFAULT_MAX_PENDING, DEFAULT_MODEL
+from .tuning import core_slots
+from .utils import log, worker_log_queue, find_existing_transcript
+
+_STOP = None  # Queue sentinel telling a worker thread to exit
+
+def run_pipeline(urls, language=DEFAULT_LANGUAGE, workers=DEFAULT_BATCH_WORKERS,
+                 download_workers=DEFAULT_DOWNLOAD_WORKERS, max_pending=DEFAULT_MAX_PENDING, model=DEFAULT_MODEL):
+    """Download URLs and transcribe them concurrently
+
+    Downloader threads push finished files onto a queue that transcription
+    workers consume. A downloader takes one of max_pending slots before
+    fetching a file, and a worker frees it when it takes the file, so at
+    most max_pending files are downloading or waiting beyond those being
+    decoded, and a fast network cannot fill the disk ahead of slow decoders.
+    """
+    workers = max(1, workers)
+    download_workers = max(1, min(download_workers, len(urls))) if urls else 1
+    total = len(urls)
+
+    url_queue = queue.Queue()
+    for url in urls:
+        url_queue.put(url)
+    ready = queue.Queue()
+    pending = threading.BoundedSemaphore(max(1, max_pending))
+
+    lock = threading.Lock()
+    downloaded, download_failed, done, failed = [], [], [], []
+
+    print(f"Downloading {total} URL(s) ({download_workers} at a time) and transcribing with {workers} worker(s)...")
+    log(f"Pipeline: {total} URL(s), {download_workers} downloader(s), {workers} transcriber(s), {max_pending} pending max")
+
+    def download_loop():
+        from .download import download_from_url
+        while True:
+            try:
+                url = url_queue.get_nowait()
+            except queue.Empty:
+                return
+            # Blocks while the decoders are behind
+            pending.acquire()
+            try:
+                file_name = download_from_url(url)
+            except Exception as e:
+                log(f"Download failed for {url}: {e}")
+                file_name = None
+
+            with lock:
+                (downloaded if file_name else download_failed).append(url)
+                count = len(downloaded) + len(download_failed)
+            if not file_name:
+                pending.release()
+                print(f"[{count}/{total}] Failed: {url}")
+                continue
+            print(f"[{count}/{total}] Downloaded: {url} -> {file_name}")
+            if find_existing_transcript(file_name) is None:
+                ready.put(file_name)
+            else:
+                pending.release()
+
+    def transcribe_loop(pool):
+        while True:
+            file_name = ready.get()
+            if file_name is _STOP:
+                return
+            pending.release()
+            try:
+                ok = pool.submit(transcribe_worker, file_name, language, model).result()
+            except Exception as e:
+                # A crashed worker must not stop this thread from draining the queue
+                log(f"Transcription worker failed for {file_name}: {e}")
+                ok = False
+            with lock:
+                (done if ok else failed).append(file_name)
+            print(f"Transcribed: {file_name}" if ok else f"Transcription failed: {file_name}")
+
+    threads = threads_per_worker(workers)
+    initargs = (threads, core_slots(workers, threads), worker_log_queue())
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as pool:
+        transcribers = [threading.Thread(target=transcribe_loop, args=(pool,), daemon=True) for _ in range(workers)]
+        downloaders = [threading.Thread(target=download_loop, daemon=True) for _ in range(download_workers)]
+        for thread in transcribers + downloaders:
+            thread.start()
+
+        for thread in downloaders:
+            thread.join()
+        for _ in transcribers:
+            ready.put(_STOP)
+        for thread in transcribers:
+            thread.join()
+
+    print(f"\nDone: {len(downloaded)} downloaded, {len(done)} transcribed, {len(download_failed) + len(failed)} failed.")
+    log(f"Pipeline complete: {len(downloaded)} downloaded, {len(done)} transcribed, "
+        f"{len(download_failed)} download(s) and {len(failed)} transcription(s) failed")
+    return done, failed
@@ -0,0 +1,146 @@
+"""
+Incrementally maintained full-text search index over the transcripts in media/
+"""
+import os
+import sqlite3
+from .config import MEDIA_DIR, SEARCH_INDEX_FILE
+from .export import SEGMENTS_SUFFIX, read_segments
+from .utils import log, pick_transcripts
+SEARCH_LIMIT = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    name TEXT PRIMARY KEY,
+    signature TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments USING fts5(
+    text,
+    name UNINDEXED,
+    start_ms UNINDEXED,
+    end_ms UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+def connect(path=None):
+    """Open the search index, creating it if needed"""
+    path = path or SEARCH_INDEX_FILE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+def transcript_files(media_dir=None):
+    """Map each transcribed base name to its transcript path and segment file path (or None)"""
+    directory = media_dir or MEDIA_DIR
+    names, segments = [], {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(SEGMENTS_SUFFIX):
+                segments[entry.name[:-len(SEGMENTS_SUFFIX)]] = entry.path
+            else:
+                names.append(entry.name)
+    return {
+        name: (os.path.join(directory, file_name), segments.get(name))
+        for name, file_name in pick_transcripts(names).items()
+    }
+
+def signature(paths):
+    """Size and mtime of a transcript's files, which change whenever it is rewritten"""
+    parts = []
+    for path in paths:
+        if path is None:
+            parts.append("-")
+            continue
+        stat = os.stat(path)
+        parts.append(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+def transcript_rows(name, transcript_path, segments_path):
+    """Rows to index for one transcript: timed segments when available, else its lines"""
+    if segments_path:
+        try:
+            return [
+                (segment["text"], name, int(round(segment["start"] * 1000)), int(round(segment["end"] * 1000)))
+                for segment in read_segments(segments_path) if segment["text"]
+            ]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log(f"Could not read {os.path.basename(segments_path)}, indexing the transcript without timestamps: {e}")
+    with open(transcript_path, "r", encoding="utf-8") as f:
+        return [(line.strip(), name, None, None) for line in f if line.strip()]
+
+def update_index(connection, media_dir=None):
+    """Reindex new or changed transcripts and drop deleted ones, returning (updated, removed)"""
+    files = transcript_files(media_dir)
+    indexed = dict(connection.execute("SELECT name, signature FROM transcripts"))
+
+    updated = 0
+    with connection:
+        for name, (transcript_path, segments_path) in files.items():
+            current = signature((transcript_path, segments_path))
+            if indexed.get(name) == current:
+                continue
+            connection.execute("DELETE FROM segments WHERE name = ?", (name,))
+            connection.executemany(
+                "INSERT INTO segments (text, name, start_ms, end_ms) VALUES (?, ?, ?, ?)",
+                transcript_rows(name, transcript_path, segments_path)
+            )
+            connection.execute("INSERT OR REPLACE INTO transcripts (name, signature) VALUES (?, ?)", (name, current))
+            updated += 1
+
+        removed = [name for name in indexed if name not in files]
+        for name in removed:
+            connection.execute("DELETE FROM segments WHERE name = ?", (name,))
+            connection.execute("DELETE FROM transcripts WHERE name = ?", (name,))
+
+    if updated or removed:
+        log(f"Search index: {updated} transcript(s) indexed, {len(removed)} removed")
+    return updated, len(removed)
+
+def fts_query(text):
+    """Turn free text into an FTS5 query matching all of its words, in any order"""
+    words = [word.replace('"', '""') for word in text.split()]
+    return " ".join(f'"{word}"' for word in words)
+
+def search(connection, text, limit=SEARCH_LIMIT):
+    """Return (name, start_ms, end_ms, snippet) for the best matching segments
+
+    start_ms and end_ms are None for transcripts without a segment file.
+    """
+    query = fts_query(text)
+    if not query:
+        return []
+    return connection.execute(
+        "SELECT name, start_ms, end_ms, snippet(segments, 0, '[', ']', '…', 12) FROM segments "
+        "WHERE segments MATCH ? ORDER BY rank LIMIT ?",
+        (query, limit)
+    ).fetchall()
+
+def format_offset(milliseconds):
+    """Format an offset in milliseconds as H:MM:SS.mmm"""
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+def run_search(text, limit=SEARCH_LIMIT):
+    """Bring the index up to date, then print the matches for a search command"""
+    connection = connect()
+    try:
+        update_index(connection)
+        results = search(connection, text, limit)
+    except sqlite3.OperationalError as e:
+        print(f"Search failed: {e}")
+        log(f"Search for {text!r} failed: {e}")
+        return []
+    finally:
+        connection.close()
+
+    if not results:
+        print(f"No transcript matches '{text}'.")
+    for name, start_ms, end_ms, snippet in results:
+        offset = f"{format_offset(start_ms)} ({start_ms} ms)" if start_ms is not None else "(no timestamps)"
+        print(f"{name}  {offset}  {snippet}")
+    return results
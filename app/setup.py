@@ -1,8 +1,12 @@
+import hashlib
 import os
 import subprocess
 import venv
 from .config import VENV_DIR, LOG_FILE
-from .utils import log
+from .utils import log, flush_log
+
+REQUIREMENTS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "requirements.txt")
+STAMP_FILE_NAME = ".whisperer-deps"  # Written inside the venv once dependencies are verified
 
 def create_venv():
     """Create a new virtual environment"""
@@ -16,8 +20,10 @@ def install_dependencies():
     log("Installing dependencies from requirements.txt...")
 
     pip_bin = os.path.join(VENV_DIR, "bin", "pip")
-    requirements_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "requirements.txt")
+    requirements_path = REQUIREMENTS_PATH
 
+    # pip writes to the log file directly, after the lines queued so far
+    flush_log()
     with open(LOG_FILE, "a", encoding="utf-8") as logf:
         subprocess.check_call(
             [pip_bin, "install", "--upgrade", "pip", "setuptools", "wheel"],
@@ -29,11 +35,55 @@ def install_dependencies():
             stdout=logf, stderr=logf
         )
 
+def venv_python_version():
+    """Read the venv's interpreter version from pyvenv.cfg without starting it"""
+    try:
+        with open(os.path.join(VENV_DIR, "pyvenv.cfg"), "r", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.partition("=")
+                if key.strip() in ("version", "version_info"):
+                    return value.strip()
+    except OSError:
+        pass
+    return ""
+
+def dependency_fingerprint():
+    """Fingerprint of requirements.txt and the venv interpreter version"""
+    digest = hashlib.sha256()
+    try:
+        with open(REQUIREMENTS_PATH, "rb") as f:
+            digest.update(f.read())
+    except OSError:
+        pass
+    digest.update(venv_python_version().encode("utf-8"))
+    return digest.hexdigest()
+
+def read_stamp():
+    """Return the fingerprint recorded by the last successful dependency check"""
+    try:
+        with open(os.path.join(VENV_DIR, STAMP_FILE_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def write_stamp(fingerprint):
+    """Record that dependencies were verified for this fingerprint"""
+    try:
+        with open(os.path.join(VENV_DIR, STAMP_FILE_NAME), "w", encoding="utf-8") as f:
+            f.write(fingerprint + "\n")
+    except OSError as e:
+        log(f"Could not write dependency stamp: {e}")
+
 def ensure_venv_and_dependencies():
     """Ensure virtual environment exists and all dependencies are installed"""
     if not os.path.exists(VENV_DIR):
         create_venv()
 
+    # Skip the slow import check when nothing changed since the last launch
+    fingerprint = dependency_fingerprint()
+    if read_stamp() == fingerprint:
+        return
+
     python_bin = os.path.join(VENV_DIR, "bin", "python")
 
     try:
@@ -42,4 +92,6 @@ def ensure_venv_and_dependencies():
             check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
         )
     except subprocess.CalledProcessError:
-        install_dependencies() 
\ No newline at end of file
+        install_dependencies()
+
+    write_stamp(fingerprint) 
\ No newline at end of file
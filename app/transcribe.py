@@ -1,11 +1,99 @@
+import json
 import os
 import subprocess
 import sys
-from .config import VENV_DIR, MEDIA_DIR, LOG_FILE, DEFAULT_LANGUAGE
-from .utils import log
+from .config import VENV_DIR, MEDIA_DIR, DEFAULT_LANGUAGE, DEFAULT_MODEL, AUTO_LANGUAGE, load_precision
+from .export import SEGMENTS_SUFFIX, segments_path, write_segments
+from .utils import log, log_output
+from . import cache, catalog, checkpoint, engine, tuning
 
-def transcribe(file_name, language=DEFAULT_LANGUAGE, detect_speakers=False):
-    """Transcribe an audio file using Whisper"""
+PARTIAL_SUFFIX = ".partial.txt"  # Segments decoded so far, kept if transcription is interrupted
+
+class TranscriptStream:
+    """Show decoded segments as they arrive and append them to a partial transcript"""
+
+    def __init__(self, file_name, previous_segments=()):
+        base_name = os.path.splitext(file_name)[0]
+        self.path = os.path.join(MEDIA_DIR, base_name + PARTIAL_SUFFIX)
+        self._file = open(self.path, "w", encoding="utf-8")
+        # Show the text recovered from an interrupted run first
+        for segment in previous_segments:
+            self.add_segment(segment["start"], segment["end"], segment["text"])
+
+    def add_segment(self, start, end, text):
+        """Display one segment and append it to the partial transcript"""
+        text = text.strip()
+        print(f"  {text}", flush=True)
+        self._file.write(text + "\n")
+        self._file.flush()
+
+    def close(self, completed):
+        """Close the partial transcript, removing it once the full .txt is written"""
+        self._file.close()
+        if completed and os.path.exists(self.path):
+            os.remove(self.path)
+
+def format_offset(seconds):
+    """Format an offset in seconds as H:MM:SS"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+def resolve_language(audio_path):
+    """Detect the language of an audio file once, caching it per file content
+
+    Returns None if the language cannot be detected up front; Whisper then
+    detects it itself while decoding.
+    """
+    language = cache.detected_language(audio_path)
+    if language:
+        return language
+    if not engine.is_available():
+        return None
+
+    try:
+        language = engine.detect_language(audio_path)
+    except Exception as e:
+        log(f"Language detection failed for {audio_path}: {e}")
+        return None
+    cache.store_detected_language(audio_path, language)
+    catalog.record(audio_path, language=language)
+    return language
+
+def transcript_key(audio_path, model, language, detect_speakers, batched=False):
+    """Transcript cache key of an audio file for these transcription settings
+
+    batched marks a clip decode without timestamps or temperature fallback (see clips.py),
+    which must never be restored in place of a full transcription.
+    """
+    options = {"detect_speakers": detect_speakers}
+    if load_precision() != "fp32":
+        # Quantized weights give slightly different transcripts; fp32 entries keep their keys
+        options["precision"] = load_precision()
+    if batched:
+        options["batched"] = True
+    return cache.cache_key(audio_path, model, language or AUTO_LANGUAGE, options)
+
+def restore_transcript(key, audio_path):
+    """Restore a cached transcript and its segment file next to the audio, returning True on a hit"""
+    base_path = os.path.splitext(audio_path)[0]
+    if not cache.restore(key, base_path + ".txt"):
+        return False
+    # Transcripts cached before segment files existed restore without one
+    cache.restore(key, segments_path(audio_path), suffix=SEGMENTS_SUFFIX)
+    return True
+
+def store_transcript(key, audio_path):
+    """Add a transcript and its segment file to the cache"""
+    cache.store(key, os.path.splitext(audio_path)[0] + ".txt")
+    cache.store(key, segments_path(audio_path), suffix=SEGMENTS_SUFFIX)
+
+def transcribe(file_name, language=DEFAULT_LANGUAGE, detect_speakers=False, stream=False, model=DEFAULT_MODEL):
+    """Transcribe an audio file using Whisper
+
+    With stream=True each segment is printed as soon as it is decoded.
+    Decoded segments are checkpointed so an interrupted run resumes where it stopped.
+    """
     print(f"Transcribing '{file_name}' to text in {language}...")
     log(f"Transcribing '{file_name}' to text in {language}...")
 
@@ -17,101 +105,162 @@ def transcribe(file_name, language=DEFAULT_LANGUAGE, detect_speakers=False):
         print(f"Using existing unformatted transcription: {noformat_path}")
         return
 
+    audio_path = os.path.join(MEDIA_DIR, file_name)
+    if language == AUTO_LANGUAGE:
+        # A cheap pass on the first 30 s, so the full decode uses the right language
+        language = resolve_language(audio_path)
+        if language:
+            print(f"Detected language: {language}")
+            log(f"Detected language of {file_name}: {language}")
+
+    # Identical audio transcribed with the same settings is restored from the cache
+    txt_path = os.path.join(MEDIA_DIR, base_name + ".txt")
+    key = transcript_key(audio_path, model, language, detect_speakers)
+    if restore_transcript(key, audio_path):
+        print("Restored transcription from cache (identical audio already transcribed)")
+        log(f"Restored cached transcription for {file_name}")
+        if stream:
+            with open(txt_path, "r", encoding="utf-8") as f:
+                print(f.read())
+        return
+
+    # Pick up after the last segment checkpointed by an interrupted run
+    previous_segments = checkpoint.load(audio_path, key)
+    if previous_segments:
+        resume_from = checkpoint.resume_offset(previous_segments)
+        print(f"Resuming from {format_offset(resume_from)} ({len(previous_segments)} segments already decoded)")
+        log(f"Resuming transcription of {file_name} from {resume_from:.2f}s")
+
+    checkpoint_writer = checkpoint.CheckpointWriter(audio_path, key, previous_segments)
+    transcript_stream = TranscriptStream(file_name, previous_segments) if stream else None
+
+    def on_segment(start, end, text):
+        checkpoint_writer.add_segment(start, end, text)
+        if transcript_stream:
+            transcript_stream.add_segment(start, end, text)
+
+    completed = False
+    try:
+        run_transcription(file_name, language, detect_speakers, on_segment, previous_segments, model)
+        completed = True
+    finally:
+        checkpoint_writer.close()
+        if transcript_stream:
+            transcript_stream.close(completed)
+
+    checkpoint.remove(audio_path)
+    store_transcript(key, audio_path)
+
+def run_transcription(file_name, language=DEFAULT_LANGUAGE, detect_speakers=False, on_segment=None, previous_segments=(), model=DEFAULT_MODEL):
+    """Decode an audio file, preferring the in-process engine"""
+    # The in-process engine keeps the model loaded between files
+    if engine.is_available():
+        try:
+            transcribe_in_process(file_name, language, detect_speakers, on_segment, previous_segments, model)
+            return
+        except ImportError as e:
+            log(f"In-process engine unavailable ({e}), falling back to whisper CLI")
+
+    transcribe_subprocess(file_name, language, detect_speakers, on_segment, previous_segments, model)
+
+def transcribe_in_process(file_name, language=DEFAULT_LANGUAGE, detect_speakers=False, on_segment=None, previous_segments=(), model=DEFAULT_MODEL):
+    """Transcribe an audio file with the in-process Whisper engine"""
+    try:
+        engine.transcribe_file(file_name, language, word_timestamps=detect_speakers, model_name=model,
+                               on_segment=on_segment, previous_segments=previous_segments)
+    except ImportError:
+        raise
+    except Exception as e:
+        print("Error during transcription. Check logs/whisperer.log for details.")
+        log(f"Transcription failed for {file_name}: {e}")
+        sys.exit(1)
+
+    if detect_speakers:
+        # Process the output to add speaker separation
+        process_speaker_output(file_name)
+    print()  # Extra blank line after successful transcription
+
+def transcribe_subprocess(file_name, language=DEFAULT_LANGUAGE, detect_speakers=False, on_segment=None, previous_segments=(), model=DEFAULT_MODEL):
+    """Transcribe an audio file by running the whisper command line tool"""
     whisper_cmd = os.path.join(VENV_DIR, "bin", "whisper")
     
     # Use CPU for transcription
     device = "cpu"
     
+    command = [whisper_cmd, file_name, "--model", model]
+    if language:
+        command += ["--language", language]
+    # Without --language the CLI detects the language itself. JSON keeps the
+    # segment and word timings; the .txt is written from it afterwards
+    command += ["--task", "transcribe", "--output_format", "json"]
     if detect_speakers:
-        # Use speaker detection with real-time progress
-        process = subprocess.Popen(
-            [whisper_cmd, file_name, "--language", language, "--task", "transcribe", "--output_format", "txt", "--word_timestamps", "True", "--device", device, "--verbose", "True"],
-            cwd=MEDIA_DIR,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-        
-        # Capture output in real-time and display progress
-        output_lines = []
-        while True:
-            line = process.stdout.readline()
-            if not line and process.poll() is not None:
-                break
-            if line:
-                line = line.strip()
-                output_lines.append(line)
-                # Display progress lines (timestamps and transcription progress)
-                if line.startswith('[') and '-->' in line:
+        # Word timestamps improve speaker separation
+        command += ["--word_timestamps", "True"]
+    command += ["--device", device, "--verbose", "True"]
+    if previous_segments:
+        # Skip the audio an interrupted run already decoded
+        command += ["--clip_timestamps", f"{checkpoint.resume_offset(previous_segments):.3f}"]
+
+    process = subprocess.Popen(
+        command,
+        cwd=MEDIA_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        universal_newlines=True,
+        env=tuning.thread_env()
+    )
+    
+    # Stream output to the log and display progress as it arrives
+    segments = []
+    while True:
+        line = process.stdout.readline()
+        if not line and process.poll() is not None:
+            break
+        if line:
+            line = line.strip()
+            log_output(line)
+            # Display progress lines (timestamps and transcription progress)
+            segment = engine.parse_segment_line(line)
+            if segment:
+                segments.append(segment)
+                if on_segment:
+                    on_segment(*segment)
+                else:
                     print(".", end="", flush=True)  # Show dot for each completed block
-                elif line.startswith('Loading'):
-                    print(f"  {line}")
-                elif line.startswith('Detecting') or line.startswith('Processing'):
-                    print(f"  {line}")
-        
-        result = process.wait()
-        
-        # Add newline after progress dots
-        print()  # New line after progress dots
-        
-        # Log the output
-        with open(LOG_FILE, "a", encoding="utf-8") as logf:
-            logf.write('\n'.join(output_lines) + '\n')
-        
-        if result == 0:
+            elif line.startswith('Transcribing') or line.startswith('Loading'):
+                print(f"  {line}")
+            elif line.startswith('Detecting') or line.startswith('Processing'):
+                print(f"  {line}")
+    
+    result = process.wait()
+    
+    # Add newline after progress dots
+    print()  # New line after progress dots
+    
+    if result == 0:
+        audio_path = os.path.join(MEDIA_DIR, file_name)
+        json_path = os.path.splitext(audio_path)[0] + ".json"
+        if os.path.exists(json_path):
+            with open(json_path, "r", encoding="utf-8") as f:
+                decoded = json.load(f)
+            os.remove(json_path)
+        else:
+            log(f"whisper CLI wrote no JSON for {file_name}, keeping the segments it printed")
+            decoded = {"segments": [{"start": start, "end": end, "text": text} for start, end, text in segments]}
+        # After a resume the CLI only decoded the rest of the file
+        decoded["segments"] = list(previous_segments) + decoded["segments"]
+        checkpoint.write_transcript(audio_path, decoded["segments"])
+        write_segments(decoded, audio_path)
+        if detect_speakers:
             # Process the output to add speaker separation
             process_speaker_output(file_name)
-            print()  # Extra blank line after successful transcription
-        else:
-            print("Error during transcription. Check logs/whisperer.log for details.")
-            log(f"Transcription failed for {file_name} with exit code {result}")
-            sys.exit(1)
+        print()  # Extra blank line after successful transcription
     else:
-        # Standard transcription with real-time progress
-        process = subprocess.Popen(
-            [whisper_cmd, file_name, "--language", language, "--task", "transcribe", "--output_format", "txt", "--device", device, "--verbose", "True"],
-            cwd=MEDIA_DIR,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-        
-        # Capture output in real-time and display progress
-        output_lines = []
-        while True:
-            line = process.stdout.readline()
-            if not line and process.poll() is not None:
-                break
-            if line:
-                line = line.strip()
-                output_lines.append(line)
-                # Display progress lines (timestamps and transcription progress)
-                if line.startswith('[') and '-->' in line:
-                    print(".", end="", flush=True)  # Show dot for each completed block
-                elif line.startswith('Transcribing') or line.startswith('Loading'):
-                    print(f"  {line}")
-                elif line.startswith('Detecting') or line.startswith('Processing'):
-                    print(f"  {line}")
-        
-        result = process.wait()
-        
-        # Add newline after progress dots
-        print()  # New line after progress dots
-        
-        # Log the output
-        with open(LOG_FILE, "a", encoding="utf-8") as logf:
-            logf.write('\n'.join(output_lines) + '\n')
-
-        if result == 0:
-            print()  # Extra blank line after successful transcription
-        else:
-            print("Error during transcription. Check logs/whisperer.log for details.")
-            log(f"Transcription failed for {file_name} with exit code {result}")
-            sys.exit(1)
+        print("Error during transcription. Check logs/whisperer.log for details.")
+        log(f"Transcription failed for {file_name} with exit code {result}")
+        sys.exit(1)
 
 def process_speaker_output(file_name):
     """Process Whisper output to add speaker separation"""
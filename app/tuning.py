@@ -0,0 +1,175 @@
+"""
+CPU thread and core affinity control for decoding
+"""
+import multiprocessing
+import os
+import queue
+import time
+from .config import DEFAULT_MODEL, load_setting, load_thread_settings, save_settings
+from .utils import log
+
+TUNE_SECONDS = 30  # Whisper's encoder always processes one 30 s window
+TUNE_TOLERANCE = 1.1  # Prefer the fewest threads within 10% of the fastest time
+CORE_WAIT_SECONDS = 5  # How long a starting worker waits for its set of cores
+
+def available_cpus():
+    """Return the CPU cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def available_memory():
+    """Return the bytes of memory new processes can use, or None if unknown
+
+    Linux reports it in /proc/meminfo; elsewhere half the physical memory is assumed.
+    """
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2
+    except (AttributeError, OSError, ValueError):
+        return None
+
+def core_sets(workers, threads):
+    """Split the available cores into one disjoint set per worker, or None if they don't fit"""
+    cpus = available_cpus()
+    if workers * threads > len(cpus):
+        return None
+    return [cpus[i * threads:(i + 1) * threads] for i in range(workers)]
+
+def core_slots(workers, threads):
+    """Queue of core sets the workers of a pool take from when cpu_affinity is on
+
+    Returns None when affinity is off, unsupported on this platform (macOS)
+    or the workers would not each get their own cores.
+    """
+    _, _, affinity = load_thread_settings()
+    if not affinity or not hasattr(os, "sched_setaffinity"):
+        return None
+    sets = core_sets(workers, threads)
+    if sets is None:
+        log(f"Not pinning workers: {workers} x {threads} threads exceed the available cores")
+        return None
+    slots = multiprocessing.Queue()
+    for cores in sets:
+        slots.put(cores)
+    return slots
+
+def take_cores(slots):
+    """Take this worker's core set from a core_slots() queue, or None"""
+    if slots is None:
+        return None
+    try:
+        return slots.get(timeout=CORE_WAIT_SECONDS)
+    except queue.Empty:
+        return None
+
+def apply_threads(threads, cores=None):
+    """Limit this process to threads intra-op threads, optionally pinned to cores
+
+    The thread environment variables are inherited by the whisper CLI when
+    the subprocess fallback is used, and so is the CPU affinity.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    if cores and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            log(f"Could not pin process to cores {cores}: {e}")
+
+    from . import engine
+    if engine.is_available():
+        import torch
+        torch.set_num_threads(threads)
+        _, inter_op, _ = load_thread_settings()
+        if inter_op and torch.get_num_interop_threads() != inter_op:
+            try:
+                torch.set_num_interop_threads(inter_op)
+            except RuntimeError as e:
+                # Only possible before torch runs its first parallel work
+                log(f"Could not set inter-op threads to {inter_op}: {e}")
+
+def thread_env(env=None):
+    """Return an environment for the whisper CLI with the configured thread limits"""
+    env = dict(os.environ if env is None else env)
+    intra_op, _, _ = load_thread_settings()
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        # A worker's own limit, set by apply_threads, takes precedence
+        if intra_op and var not in env:
+            env[var] = str(intra_op)
+    return env
+
+def thread_candidates(cpus):
+    """Thread counts worth timing: powers of two up to the core count, and the core count"""
+    candidates = []
+    threads = 1
+    while threads < cpus:
+        candidates.append(threads)
+        threads *= 2
+    candidates.append(cpus)
+    return candidates
+
+def pick_threads(timings):
+    """Return the fewest threads whose time is within TUNE_TOLERANCE of the fastest"""
+    fastest = min(timings.values())
+    return min(threads for threads, seconds in timings.items() if seconds <= fastest * TUNE_TOLERANCE)
+
+def reference_clip():
+    """A deterministic 30 s clip of tones and noise, enough to time the model"""
+    import numpy as np
+    from .engine import SAMPLE_RATE
+    t = np.arange(TUNE_SECONDS * SAMPLE_RATE, dtype=np.float32) / SAMPLE_RATE
+    rng = np.random.default_rng(0)
+    clip = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+    return (clip + 0.02 * rng.standard_normal(len(t))).astype(np.float32)
+
+def autotune(model_name=DEFAULT_MODEL):
+    """Time the model on a reference clip at several thread counts and save the best settings"""
+    import torch
+    import whisper
+    from . import engine
+
+    print("Tuning CPU threads for this machine (first run only)...")
+    model = engine.load_model(model_name)
+    mel = whisper.log_mel_spectrogram(reference_clip(), model.dims.n_mels).unsqueeze(0).to(model.device)
+
+    timings = {}
+    previous = torch.get_num_threads()
+    try:
+        with torch.no_grad():
+            for threads in thread_candidates(len(available_cpus())):
+                torch.set_num_threads(threads)
+                model.embed_audio(mel)  # Warm up the thread pool
+                start = time.perf_counter()
+                model.embed_audio(mel)
+                timings[threads] = time.perf_counter() - start
+    finally:
+        torch.set_num_threads(previous)
+
+    intra_op = pick_threads(timings)
+    summary = ", ".join(f"{threads}: {seconds:.2f}s" for threads, seconds in timings.items())
+    print(f"  Using {intra_op} thread(s) per transcription")
+    log(f"Thread tuning with '{model_name}' ({summary}): intra_op_threads={intra_op}")
+    # Whisper runs its ops one after another, so one inter-op thread is enough
+    save_settings(intra_op_threads=intra_op, inter_op_threads=1)
+    return intra_op
+
+def ensure_tuned(model_name=DEFAULT_MODEL):
+    """Auto-tune the thread settings if settings.json has none yet"""
+    if load_setting('intra_op_threads', None) is not None:
+        return
+    from . import engine
+    if not engine.is_available():
+        return
+    try:
+        autotune(model_name)
+    except Exception as e:
+        # Tuning is an optimization; the defaults still work
+        log(f"Thread tuning failed: {e}")
@@ -1,31 +1,133 @@
-import os
-from .config import MEDIA_DIR, load_language, save_language, SUPPORTED_LANGUAGES
+import time
+from datetime import date, datetime, timedelta
+from .config import MEDIA_DIR, AUTO_LANGUAGE, LANGUAGE_OPTIONS, load_language, save_language
+from . import catalog
+
+PAGE_SIZE = 20
+FIRST_FILE_CHOICE = 3  # 1 is URL download, 2 is language change
+MENU_HELP = "n/p: next/previous page, /TEXT: name contains TEXT, t/u/a: transcribed/untranscribed/all, d FROM [TO]: modified between dates (YYYY-MM-DD)"
 
 def list_audio_files():
-    """List all audio files in the media directory"""
-    return [f for f in os.listdir(MEDIA_DIR) if f.lower().endswith((".mp3", ".wav", ".m4a", ".flac"))]
+    """List all audio files in the media directory, rescanning it only if it changed"""
+    return catalog.audio_files(MEDIA_DIR)
+
+def file_choice(file_id):
+    """Menu number of a catalogued file; it stays the same while the file is in media/"""
+    return file_id + FIRST_FILE_CHOICE - 1
+
+def choice_file(choice):
+    """Name of the file behind a menu number, or None"""
+    if choice < FIRST_FILE_CHOICE:
+        return None
+    return catalog.file_name(choice - FIRST_FILE_CHOICE + 1, MEDIA_DIR)
+
+def new_view():
+    """Menu state: the page shown and the active filters"""
+    return {"page": 0, "text": None, "status": None, "since": None, "until": None}
+
+def day_start_ns(day):
+    """Local midnight at the start of a date, in nanoseconds since the epoch"""
+    return int(time.mktime(day.timetuple())) * 1_000_000_000
+
+def load_page(view):
+    """Return (matching file count, entries) for the page a view shows"""
+    since = day_start_ns(view["since"]) if view["since"] else None
+    until = day_start_ns(view["until"] + timedelta(days=1)) if view["until"] else None
+    return catalog.page(MEDIA_DIR, text=view["text"], status=view["status"], since=since, until=until,
+                        offset=view["page"] * PAGE_SIZE, limit=PAGE_SIZE)
+
+def describe_filters(view):
+    """Short description of a view's active filters, or an empty string"""
+    filters = []
+    if view["text"]:
+        filters.append(f"name contains '{view['text']}'")
+    if view["status"]:
+        filters.append(view["status"])
+    if view["since"] or view["until"]:
+        filters.append(f"modified {view['since'] or '...'} to {view['until'] or '...'}")
+    return ", ".join(filters)
+
+def print_menu(entries, total=None, view=None):
+    """Print the main menu with one page of files
 
-def print_menu(files):
-    """Print the main menu"""
+    entries are (id, name, transcribed, mtime_ns) rows from the catalog, so
+    only the visible page is ever rendered.
+    """
+    view = view or new_view()
+    total = len(entries) if total is None else total
     current_language = load_language()
     print("Select an option:")
     print("1. Download audio from URL")
     print(f"2. Change language (currently '{current_language}')")
-    for i, file in enumerate(files, start=3):
-        print(f"{i}. {file}")
+    if total:
+        first = view["page"] * PAGE_SIZE
+        filters = describe_filters(view)
+        print(f"Files {first + 1}-{first + len(entries)} of {total}" + (f" ({filters})" if filters else "") + ":")
+    elif view != new_view():
+        print(f"No files match ({describe_filters(view)}).")
+    for file_id, name, transcribed, mtime_ns in entries:
+        modified = datetime.fromtimestamp(mtime_ns / 1e9).strftime("%Y-%m-%d")
+        print(f"{file_choice(file_id)}. {name}  [{modified}{', transcribed' if transcribed else ''}]")
     print("0. Exit")
+    if total > PAGE_SIZE or view != new_view():
+        print(MENU_HELP)
 
-def get_choice(files):
-    """Get user choice from menu"""
+def apply_command(view, command, total):
+    """Update a view from a paging or filter command, returning False if the command is not one"""
+    if command == "n":
+        if (view["page"] + 1) * PAGE_SIZE < total:
+            view["page"] += 1
+        return True
+    if command == "p":
+        view["page"] = max(0, view["page"] - 1)
+        return True
+    if command.startswith("/"):
+        view["text"] = command[1:].strip() or None
+    elif command in ("t", "u", "a"):
+        view["status"] = {"t": "transcribed", "u": "untranscribed", "a": None}[command]
+    elif command == "d" or command.startswith("d "):
+        days = command.split()[1:]
+        if len(days) > 2:
+            return False
+        try:
+            since, until = [date.fromisoformat(day) for day in days] + [None] * (2 - len(days))
+        except ValueError:
+            return False
+        view["since"], view["until"] = since, until
+    else:
+        return False
+    # Filters change what the pages hold
+    view["page"] = 0
+    return True
+
+def get_choice(view=None, total=0):
+    """Get user choice from menu
+
+    Returns a menu number, or None after a paging or filter command, when
+    the menu should be shown again. Any file's number is accepted, not only
+    the ones on the visible page.
+    """
     while True:
+        text = input("Enter your choice: ").strip()
         try:
-            choice = int(input("Enter your choice: "))
-            if 0 <= choice <= len(files) + 2:  # +2 for URL download and language change
+            choice = int(text)
+            if 0 <= choice < FIRST_FILE_CHOICE or choice_file(choice) is not None:
                 return choice
         except ValueError:
-            pass
+            if view is not None and apply_command(view, text.lower() if len(text) == 1 else text, total):
+                return None
         print("Invalid input. Try again.")
 
+def pick_choice():
+    """Show the paged file menu until an option or a file is chosen, returning its menu number"""
+    view = new_view()
+    while True:
+        total, entries = load_page(view)
+        print_menu(entries, total, view)
+        choice = get_choice(view, total)
+        if choice is not None:
+            return choice
+
 def get_url_input():
     """Get URL input from user"""
     while True:
@@ -40,15 +142,16 @@ def change_language():
     print(f"\nCurrent language: {current_language}")
     print("Available languages:")
     
-    for i, lang in enumerate(SUPPORTED_LANGUAGES, 1):
+    for i, lang in enumerate(LANGUAGE_OPTIONS, 1):
         marker = " (current)" if lang == current_language else ""
-        print(f"{i}. {lang}{marker}")
+        description = " (detect for each file)" if lang == AUTO_LANGUAGE else ""
+        print(f"{i}. {lang}{description}{marker}")
     
     while True:
         try:
-            choice = int(input("Select language (1-4): "))
-            if 1 <= choice <= len(SUPPORTED_LANGUAGES):
-                selected_language = SUPPORTED_LANGUAGES[choice - 1]
+            choice = int(input(f"Select language (1-{len(LANGUAGE_OPTIONS)}): "))
+            if 1 <= choice <= len(LANGUAGE_OPTIONS):
+                selected_language = LANGUAGE_OPTIONS[choice - 1]
                 if selected_language == current_language:
                     print("Language is already set to this option.")
                     return
@@ -60,4 +163,4 @@ def change_language():
                 return
         except ValueError:
             pass
-        print("Invalid input. Please enter a number between 1 and 4.") 
\ No newline at end of file
+        print(f"Invalid input. Please enter a number between 1 and {len(LANGUAGE_OPTIONS)}.") 
\ No newline at end of file
@@ -1,11 +1,141 @@
+import atexit
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import threading
 from datetime import datetime
-from .config import LOG_FILE
+from .config import LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, MEDIA_DIR
+
+TRANSCRIPT_SUFFIXES = (".noformat.txt", ".txt")  # In order of priority
+SKIPPED_SUFFIXES = (".partial.txt",)  # Transcripts still being written
+
+_logger = logging.getLogger("whisperer")
+_logger.propagate = False
+_logger.setLevel(logging.INFO)
+_writer_lock = threading.Lock()
+# Log writer of this process: the rotating file handler and the background
+# threads feeding it, or, in a worker process, the parent's queue
+_writer = {"pid": None, "path": None, "handler": None, "listeners": [], "worker_queue": None}
+
+def start_log():
+    """Open the log file once per process, written by a background thread
+
+    Callers only put records on a queue, so logging never waits for the disk.
+    """
+    with _writer_lock:
+        if _writer["pid"] == os.getpid() and _writer["path"] == LOG_FILE:
+            return
+        if _writer["pid"] == os.getpid():
+            _stop_writer()
+        # A forked process inherits the parent's writer but not its threads
+        os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+        )
+        records = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, handler)
+        listener.start()
+        _logger.handlers = [logging.handlers.QueueHandler(records)]
+        _writer.update(pid=os.getpid(), path=LOG_FILE, handler=handler, listeners=[listener], worker_queue=None)
+
+def _stop_writer():
+    """Write out every queued record and close the log file; the caller holds _writer_lock"""
+    if _writer["pid"] != os.getpid():
+        return
+    for listener in _writer["listeners"]:
+        listener.stop()
+    if _writer["handler"]:
+        _writer["handler"].close()
+    _logger.handlers = []
+    _writer.update(pid=None, path=None, handler=None, listeners=[], worker_queue=None)
+
+def stop_log():
+    """Write out every queued record and close the log file"""
+    with _writer_lock:
+        _stop_writer()
+
+atexit.register(stop_log)
+
+def flush_log():
+    """Block until every record logged so far is in the log file"""
+    with _writer_lock:
+        if _writer["pid"] != os.getpid():
+            return
+        for listener in _writer["listeners"]:
+            # Stopping drains the queue; the listener can be started again
+            listener.stop()
+            listener.start()
+        if _writer["handler"]:
+            _writer["handler"].flush()
+
+def worker_log_queue():
+    """Queue that worker processes send their records to, for init_worker
+
+    The records are written by this process, so concurrent workers never
+    contend for the file or interleave partial lines.
+    """
+    start_log()
+    with _writer_lock:
+        if _writer["worker_queue"] is None:
+            records = multiprocessing.Queue()
+            listener = logging.handlers.QueueListener(records, _writer["handler"])
+            listener.start()
+            _writer["listeners"].append(listener)
+            _writer["worker_queue"] = records
+            # Drain the queue before multiprocessing's own exit handler closes it
+            atexit.unregister(stop_log)
+            atexit.register(stop_log)
+        return _writer["worker_queue"]
+
+def log_to_queue(records):
+    """Send this worker process's records to its parent's worker_log_queue()"""
+    with _writer_lock:
+        _logger.handlers = [logging.handlers.QueueHandler(records)]
+        # Pools started from this worker pass the same queue on
+        _writer.update(pid=os.getpid(), path=LOG_FILE, handler=None, listeners=[], worker_queue=records)
 
 def log(msg):
     """Log a message with timestamp to the log file"""
     timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(f"{timestamp} {msg}\n")
+    start_log()
+    _logger.info(f"{timestamp} {msg}")
+
+def log_output(line):
+    """Log a line of a subprocess's output as is"""
+    start_log()
+    _logger.info(line)
+
+def find_existing_transcript(file_name):
+    """Return the path of an existing transcript for an audio file, or None
+
+    An unformatted `.noformat.txt` transcript takes priority over `.txt`.
+    """
+    base_name = os.path.splitext(file_name)[0]
+    for suffix in TRANSCRIPT_SUFFIXES:
+        path = os.path.join(MEDIA_DIR, base_name + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+def pick_transcripts(names):
+    """Map each base name to the file name of its transcript among a directory's file names
+
+    Transcripts still being written are ignored, and suffixes win in the
+    order of TRANSCRIPT_SUFFIXES, as in find_existing_transcript.
+    """
+    picked = {}
+    for name in names:
+        if name.endswith(SKIPPED_SUFFIXES):
+            continue
+        for rank, suffix in enumerate(TRANSCRIPT_SUFFIXES):
+            if name.endswith(suffix):
+                base = name[:-len(suffix)]
+                if base not in picked or rank < picked[base][0]:
+                    picked[base] = (rank, name)
+                break
+    return {base: name for base, (_, name) in picked.items()}
 
 def clean_transcript(text):
     """Clean and format transcript text while intelligently joining sentence fragments"""
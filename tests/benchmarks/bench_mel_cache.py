@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark the log-mel spectrogram cache against recomputing the spectrogram
+
+Run from the project root (requires whisper, torch and numpy):
+    python tests/benchmarks/bench_mel_cache.py --minutes 30 --n-mels 128
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+import torch
+from whisper.audio import N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram
+from app import cache
+
+def best_time(func, repeat):
+    """Return the fastest of repeat runs of func, in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10, help="length of the synthetic recording (default: 10)")
+    parser.add_argument("--n-mels", type=int, default=128, choices=[80, 128], help="mel bands: 80 for most models, 128 for large-v3/turbo")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (default: 3)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal(int(args.minutes * 60 * SAMPLE_RATE)) * 0.1).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as cache_dir, patch('app.cache.MEL_CACHE_DIR', cache_dir):
+        entry_path = cache.mel_entry_path("bench", args.n_mels, N_SAMPLES)
+        compute = lambda: log_mel_spectrogram(audio, args.n_mels, padding=N_SAMPLES)
+        cache.store_mel(entry_path, compute().numpy())
+        # Touch every page, as the decoder eventually reads every frame
+        load = lambda: torch.from_numpy(cache.open_mel(entry_path)).sum()
+
+        computed = best_time(compute, args.repeat)
+        loaded = best_time(load, args.repeat)
+        size = os.path.getsize(entry_path)
+
+    print(f"{args.minutes:g} min of audio, {args.n_mels} mel bands, {size / 1024 / 1024:.1f} MB cache entry")
+    print(f"  compute spectrogram: {computed * 1000:8.1f} ms")
+    print(f"  load from cache:     {loaded * 1000:8.1f} ms")
+    print(f"  saved per run:       {(computed - loaded) * 1000:8.1f} ms ({computed / loaded:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Compare int8 dynamic quantization against the fp32 model on a fixed set of recordings
+
+Run from the project root (requires whisper, torch and numpy):
+    python tests/benchmarks/bench_quantization.py --model small --language fr media/a.mp3 media/b.mp3
+
+Each file is cut to its first --seconds and decoded greedily with both
+models. Accuracy is the word error rate of the int8 transcript against the
+fp32 one, so 0% means quantization changed nothing.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import torch
+from app import engine
+from app.config import MEDIA_DIR, AUDIO_EXTENSIONS
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance between two transcripts, relative to the reference length"""
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(1, len(ref))
+
+def timed_transcribe(model, audio, language):
+    """Decode greedily and return (text, seconds)"""
+    start = time.perf_counter()
+    result = model.transcribe(audio, language=language, temperature=0.0, fp16=False, verbose=None)
+    return result["text"].strip(), time.perf_counter() - start
+
+def timed_load(model_name, precision):
+    """Load a model and return (model, seconds)"""
+    start = time.perf_counter()
+    model = engine.load_model(model_name, precision=precision)
+    return model, time.perf_counter() - start
+
+def default_samples(count):
+    """The first count audio files of the media directory, in name order"""
+    names = sorted(name for name in os.listdir(MEDIA_DIR) if name.lower().endswith(AUDIO_EXTENSIONS))
+    return [os.path.join(MEDIA_DIR, name) for name in names[:count]]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", help="recordings to decode (default: the first --count files in media/)")
+    parser.add_argument("--model", default="base", help="Whisper model (default: base)")
+    parser.add_argument("--language", default=None, help="language of the recordings (default: detect)")
+    parser.add_argument("--seconds", type=float, default=60, help="decode only the first seconds of each file (default: 60)")
+    parser.add_argument("--count", type=int, default=3, help="files taken from media/ when none are given (default: 3)")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch's choice)")
+    args = parser.parse_args()
+
+    files = args.files or default_samples(args.count)
+    if not files:
+        parser.error("no recordings given and none found in media/")
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    fp32, fp32_load = timed_load(args.model, "fp32")
+    int8, int8_load = timed_load(args.model, "int8")
+    print(f"Model '{args.model}', {torch.get_num_threads()} threads")
+    print(f"  load: fp32 {fp32_load:.1f}s, int8 {int8_load:.1f}s (quantized on first run, cached after)")
+
+    totals = {"audio": 0.0, "fp32": 0.0, "int8": 0.0, "words": 0, "errors": 0.0}
+    for path in files:
+        audio = engine.load_audio(path)[:int(args.seconds * engine.SAMPLE_RATE)]
+        duration = len(audio) / engine.SAMPLE_RATE
+        reference, fp32_time = timed_transcribe(fp32, audio, args.language)
+        hypothesis, int8_time = timed_transcribe(int8, audio, args.language)
+        wer = word_error_rate(reference, hypothesis)
+        words = len(reference.split())
+
+        totals["audio"] += duration
+        totals["fp32"] += fp32_time
+        totals["int8"] += int8_time
+        totals["words"] += words
+        totals["errors"] += wer * words
+        print(f"  {os.path.basename(path)}: {duration:.0f}s of audio, fp32 {fp32_time:.1f}s, "
+              f"int8 {int8_time:.1f}s ({fp32_time / int8_time:.2f}x), WER {wer:.1%}")
+
+    print(f"Total: {totals['audio']:.0f}s of audio")
+    print(f"  fp32: {totals['fp32']:8.1f}s ({totals['audio'] / totals['fp32']:.1f}x real time)")
+    print(f"  int8: {totals['int8']:8.1f}s ({totals['audio'] / totals['int8']:.1f}x real time)")
+    print(f"  speedup: {totals['fp32'] / totals['int8']:.2f}x, "
+          f"WER against fp32: {totals['errors'] / max(1, totals['words']):.1%}")
+
+if __name__ == "__main__":
+    main()
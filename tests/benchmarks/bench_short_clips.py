@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Compare files per minute for short clips decoded one by one and in batches
+
+Run from the project root (requires whisper, torch and numpy):
+    python tests/benchmarks/bench_short_clips.py --model base --language fr media/notes/*.m4a
+
+Without files, synthetic 10 s clips are used; they measure speed only.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+from app import engine
+from app.clips import clip_batches
+
+def synthetic_clips(count, seconds):
+    """Deterministic clips of tones and noise"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * engine.SAMPLE_RATE), dtype=np.float32) / engine.SAMPLE_RATE
+    return [(0.2 * np.sin(2 * np.pi * (200 + 20 * i) * t) + 0.02 * rng.standard_normal(len(t))).astype(np.float32)
+            for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", help="clips of at most 30 s (default: synthetic clips)")
+    parser.add_argument("--model", default="base", help="Whisper model (default: base)")
+    parser.add_argument("--language", default=None, help="language of the clips (default: detect)")
+    parser.add_argument("--count", type=int, default=16, help="synthetic clips when no files are given (default: 16)")
+    parser.add_argument("--seconds", type=float, default=10, help="length of each synthetic clip (default: 10)")
+    parser.add_argument("--batch-size", type=int, default=None, help="clips per forward pass (default: CLIP_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    clips = [engine.load_audio(path) for path in args.files] or synthetic_clips(args.count, args.seconds)
+    model = engine.load_model(args.model)
+
+    def run(batch_size):
+        """Decode every clip in batches of batch_size like --batch does, returning (seconds, clips retried alone)"""
+        start = time.perf_counter()
+        retried = 0
+        for batch in clip_batches(list(range(len(clips))), batch_size):
+            results = engine.decode_clips([clips[i] for i in batch], args.language, args.model)
+            for i, result in zip(batch, results):
+                if result is None:
+                    retried += 1
+                    engine.decode(clips[i], args.language, model_name=args.model, verbose=None)
+        return time.perf_counter() - start, retried
+
+    # Both sides use the same decoding options; only the batch size differs
+    sequential, _ = run(1)
+    batched, retried = run(args.batch_size)
+
+    print(f"{len(clips)} clips with '{model.dims.n_mels}'-band model '{args.model}'")
+    print(f"  one by one: {sequential:7.1f}s ({len(clips) / sequential * 60:.1f} files/min)")
+    print(f"  batched:    {batched:7.1f}s ({len(clips) / batched * 60:.1f} files/min, {retried} retried alone)")
+    print(f"  speedup:    {sequential / batched:.1f}x")
+
+if __name__ == "__main__":
+    main()
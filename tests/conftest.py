@@ -5,6 +5,9 @@ import pytest
 import os
 import tempfile
 import shutil
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import Mock, patch
 from app.config import BASE_DIR
 
@@ -15,6 +18,19 @@ def temp_dir():
     yield temp_dir
     shutil.rmtree(temp_dir)
 
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path):
+    """Keep every test's cache entries and log lines out of the real cache and log directories"""
+    with patch('app.cache.TRANSCRIPT_CACHE_DIR', str(tmp_path / "cache" / "transcripts")), \
+         patch('app.cache.AUDIO_CACHE_DIR', str(tmp_path / "cache" / "audio")), \
+         patch('app.cache.MEL_CACHE_DIR', str(tmp_path / "cache" / "mel")), \
+         patch('app.cache.LANGUAGE_CACHE_DIR', str(tmp_path / "cache" / "languages")), \
+         patch('app.cache.MODEL_CACHE_DIR', str(tmp_path / "cache" / "models")), \
+         patch('app.search.SEARCH_INDEX_FILE', str(tmp_path / "cache" / "search.sqlite3")), \
+         patch('app.catalog.CATALOG_FILE', str(tmp_path / "cache" / "catalog.sqlite3")), \
+         patch('app.utils.LOG_FILE', str(tmp_path / "logs" / "whisperer.log")):
+        yield tmp_path / "cache"
+
 @pytest.fixture
 def mock_venv_dir(temp_dir):
     """Mock virtual environment directory"""
@@ -71,6 +87,70 @@ def mock_urllib():
         mock_retrieve.return_value = None
         yield mock_retrieve
 
+class AudioRequestHandler(BaseHTTPRequestHandler):
+    """Serve in-memory files over keep-alive HTTP/1.1 with Range support"""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        self.server.requests.append((self.path, range_header))
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag = f'"{zlib.crc32(body):08x}"'
+        if self.headers.get("If-Range") not in (None, etag):
+            # The file changed since the client's copy: send all of it
+            range_header = None
+        start = int(range_header.split("=")[1].rstrip("-")) if range_header else 0
+        if start >= len(body):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(body)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(206 if start else 200)
+        self.send_header("ETag", etag)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+        if self.path in self.server.drop_once:
+            # Simulate a dropped connection halfway through the transfer
+            self.server.drop_once.discard(self.path)
+            self.wfile.write(body[start:start + (len(body) - start) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body[start:])
+
+@pytest.fixture
+def http_server():
+    """Local HTTP server standing in for remote audio hosts"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), AudioRequestHandler)
+    server.files = {}
+    server.requests = []
+    server.drop_once = set()
+    server.connections = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    from app.download import close_connections
+    close_connections()
+    server.shutdown()
+    server.server_close()
+
 @pytest.fixture
 def sample_audio_file(mock_media_dir):
     """Create a sample audio file for testing"""
@@ -0,0 +1,165 @@
+"""
+Tests for app entry point
+"""
+import pytest
+import os
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+from app.app import main, parse_args
+from app.config import BASE_DIR
+
+# `./whisperer --help` must stay well under this, whatever is installed in the venv
+STARTUP_BUDGET_SECONDS = 1.5
+
+HEAVY_MODULES = ["app.transcribe", "app.engine", "app.download", "app.batch", "app.pipeline", "whisper", "torch", "numpy", "yt_dlp"]
+
+def test_help_startup_time_budget():
+    """Test that the CLI answers --help within the startup time budget"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "app.app", "--help"],
+        cwd=BASE_DIR, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    
+    assert result.returncode == 0
+    assert "--batch" in result.stdout
+    assert elapsed < STARTUP_BUDGET_SECONDS, f"--help took {elapsed:.2f}s"
+
+def test_entry_point_imports_no_heavy_modules():
+    """Test that importing the entry point loads nothing transcription-related"""
+    code = (
+        "import sys, app.app; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR, capture_output=True, text=True)
+    
+    assert result.returncode == 0
+    assert result.stdout.strip() == ""
+
+def test_parse_args_defaults():
+    """Test default command line arguments"""
+    args = parse_args([])
+    assert args.batch is False
+    assert args.workers >= 1
+
+def test_parse_args_model():
+    """Test the model and draft options"""
+    args = parse_args(["--model", "small", "--draft"])
+    assert args.model == "small"
+    assert args.draft == "tiny"
+    assert parse_args([]).draft is None
+    with pytest.raises(SystemExit):
+        parse_args(["--model", "huge"])
+
+def test_main_tune():
+    """Test --tune times the machine again and exits"""
+    with patch('app.app.ensure_directories'), \
+         patch('app.setup.ensure_venv_and_dependencies'), \
+         patch('app.app.load_model_name', return_value="base"), \
+         patch('app.tuning.autotune') as mock_autotune, \
+         patch('app.app.pick_choice') as mock_choice:
+        main(["--tune"])
+    
+    mock_autotune.assert_called_once_with("base")
+    mock_choice.assert_not_called()
+
+def test_main_export():
+    """Test --export writes the requested format without setting up Whisper"""
+    with patch('app.app.ensure_directories'), \
+         patch('app.setup.ensure_venv_and_dependencies') as mock_setup, \
+         patch('app.app.list_audio_files', return_value=["a.mp3"]), \
+         patch('app.export.export_all') as mock_export:
+        main(["--export", "srt"])
+    
+    mock_export.assert_called_once_with(["a.mp3"], "srt")
+    mock_setup.assert_not_called()
+
+def test_main_search():
+    """Test --search joins the words into one query"""
+    with patch('app.app.ensure_directories'), \
+         patch('app.setup.ensure_venv_and_dependencies') as mock_setup, \
+         patch('app.search.run_search') as mock_search:
+        main(["--search", "bonjour", "madame"])
+    
+    mock_search.assert_called_once_with("bonjour madame")
+    mock_setup.assert_not_called()
+
+def test_main_exit(capsys):
+    """Test choosing exit from the menu"""
+    with patch('app.app.ensure_directories'), \
+         patch('app.setup.ensure_venv_and_dependencies'), \
+         patch('app.app.pick_choice', return_value=0):
+        main([])
+    
+    assert "Goodbye!" in capsys.readouterr().out
+
+def test_main_shows_existing_transcript(temp_dir, capsys):
+    """Test that an existing transcript is shown without transcribing"""
+    transcript = os.path.join(temp_dir, "talk.txt")
+    with open(transcript, 'w', encoding='utf-8') as f:
+        f.write("Bonjour")
+    
+    with patch('app.app.ensure_directories'), \
+         patch('app.setup.ensure_venv_and_dependencies'), \
+         patch('app.app.pick_choice', return_value=3), \
+         patch('app.app.choice_file', return_value="talk.mp3"), \
+         patch('app.catalog.transcript_path', return_value=transcript), \
+         patch('app.vlc_player.play_audio_with_vlc') as mock_play, \
+         patch('app.transcribe.transcribe') as mock_transcribe:
+        main([])
+    
+    assert "Bonjour" in capsys.readouterr().out
+    mock_play.assert_called_once_with("talk.mp3")
+    mock_transcribe.assert_not_called()
+
+def test_main_batch():
+    """Test --batch runs the batch transcription"""
+    with patch('app.app.ensure_directories'), \
+         patch('app.setup.ensure_venv_and_dependencies'), \
+         patch('app.app.list_audio_files', return_value=["a.mp3"]), \
+         patch('app.app.load_language', return_value="en"), \
+         patch('app.app.load_model_name', return_value="turbo"), \
+         patch('app.tuning.ensure_tuned') as mock_tuned, \
+         patch('app.batch.run_batch') as mock_batch:
+        main(["--batch", "--workers", "3"])
+    
+    mock_batch.assert_called_once_with(["a.mp3"], language="en", workers=3, model="turbo")
+    mock_tuned.assert_called_once_with("turbo")
+
+def test_main_urls(temp_dir):
+    """Test --urls runs the download/transcribe pipeline"""
+    with patch('app.app.ensure_directories'), \
+         patch('app.setup.ensure_venv_and_dependencies'), \
+         patch('app.app.load_language', return_value="fr"), \
+         patch('app.app.load_model_name', return_value="turbo"), \
+         patch('app.tuning.ensure_tuned'), \
+         patch('app.pipeline.run_pipeline') as mock_pipeline:
+        main(["--urls", "https://example.com/a.mp3", "--workers", "2", "--download-workers", "3", "--max-pending", "1",
+              "--model", "small"])
+    
+    mock_pipeline.assert_called_once_with(["https://example.com/a.mp3"], language="fr", workers=2,
+                                          download_workers=3, max_pending=1, model="small")
+
+def test_main_draft_then_refine():
+    """Test that a draft model transcribes first and hands over to the refine step"""
+    with patch('app.app.ensure_directories'), \
+         patch('app.setup.ensure_venv_and_dependencies'), \
+         patch('app.app.pick_choice', return_value=3), \
+         patch('app.app.choice_file', return_value="talk.mp3"), \
+         patch('app.catalog.transcript_path', return_value=None), \
+         patch('app.app.load_language', return_value="fr"), \
+         patch('app.app.load_model_name', return_value="turbo"), \
+         patch('app.app.load_draft_model', return_value="base"), \
+         patch('app.vlc_player.play_audio_with_vlc'), \
+         patch('app.tuning.ensure_tuned'), \
+         patch('app.tuning.apply_threads'), \
+         patch('app.transcribe.transcribe') as mock_transcribe, \
+         patch('app.draft.transcribe_with_refine') as mock_refine:
+        main([])
+    
+    mock_transcribe.assert_not_called()
+    mock_refine.assert_called_once_with("talk.mp3", language="fr", detect_speakers=True, stream=True,
+                                        model="turbo", draft_model="base")
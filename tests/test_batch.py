@@ -0,0 +1,90 @@
+"""
+Tests for batch module
+"""
+import pytest
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+from app.batch import find_untranscribed, threads_per_worker, init_worker, transcribe_worker, run_batch
+
+def test_find_untranscribed(mock_media_dir):
+    """Test that files with .txt or .noformat.txt transcripts are skipped"""
+    for name in ["a.mp3", "a.txt", "b.mp3", "b.noformat.txt", "c.mp3"]:
+        with open(os.path.join(mock_media_dir, name), 'w') as f:
+            f.write("transcript")
+    
+    with patch('app.batch.MEDIA_DIR', mock_media_dir):
+        pending = find_untranscribed(["a.mp3", "b.mp3", "c.mp3"])
+    
+    assert pending == ["c.mp3"]
+
+def test_threads_per_worker():
+    """Test CPU cores are split between workers"""
+    with patch('os.cpu_count', return_value=8), \
+         patch('app.batch.load_thread_settings', return_value=(None, None, False)):
+        assert threads_per_worker(1) == 8
+        assert threads_per_worker(3) == 2
+        assert threads_per_worker(16) == 1
+
+def test_threads_per_worker_capped_by_setting():
+    """Test the intra_op_threads setting caps each worker's threads"""
+    with patch('os.cpu_count', return_value=8), \
+         patch('app.batch.load_thread_settings', return_value=(2, 1, False)):
+        assert threads_per_worker(1) == 2
+        assert threads_per_worker(8) == 1
+
+def test_init_worker_sets_thread_env():
+    """Test worker initialization limits OpenMP/MKL threads"""
+    with patch.dict(os.environ, {}), \
+         patch('app.engine.is_available', return_value=False):
+        init_worker(3)
+        assert os.environ["OMP_NUM_THREADS"] == "3"
+        assert os.environ["MKL_NUM_THREADS"] == "3"
+
+def test_transcribe_worker_handles_exit():
+    """Test a failing transcription does not kill the worker"""
+    with patch('app.transcribe.transcribe', side_effect=SystemExit(1)):
+        assert transcribe_worker("a.mp3", "fr") is False
+
+def test_run_batch_nothing_to_do(capsys):
+    """Test batch run when everything is already transcribed"""
+    with patch('app.batch.find_untranscribed', return_value=[]):
+        done, failed = run_batch(["a.mp3"])
+    
+    assert done == [] and failed == []
+    assert "Nothing to transcribe" in capsys.readouterr().out
+
+def test_run_batch_reports_results():
+    """Test batch run transcribes pending files and reports failures"""
+    with patch('app.batch.find_untranscribed', return_value=["a.mp3", "b.mp3"]), \
+         patch('app.batch.ProcessPoolExecutor', ThreadPoolExecutor), \
+         patch('app.batch.init_worker') as mock_init, \
+         patch('app.clips.split_short_clips', side_effect=lambda files: ([], files)), \
+         patch('app.batch.transcribe_worker', side_effect=lambda f, lang, model: f == "a.mp3"), \
+         patch('app.batch.log'):
+        
+        done, failed = run_batch(["a.mp3", "b.mp3"], language="en", workers=4)
+    
+    assert done == ["a.mp3"]
+    assert failed == ["b.mp3"]
+    # Workers are capped at the number of pending files
+    assert mock_init.call_count <= 2
+
+def test_run_batch_decodes_short_clips_together():
+    """Test short clips go to the batched clip worker and long files to the regular one"""
+    with patch('app.batch.find_untranscribed', side_effect=lambda files: files), \
+         patch('app.batch.ProcessPoolExecutor', ThreadPoolExecutor), \
+         patch('app.batch.init_worker'), \
+         patch('app.batch.CLIP_BATCH_SIZE', 2), \
+         patch('app.clips.CLIP_BATCH_SIZE', 2), \
+         patch('app.clips.split_short_clips', return_value=(["a.m4a", "b.m4a", "c.m4a"], ["long.mp3"])), \
+         patch('app.batch.transcribe_clips_worker', side_effect=lambda files, lang, model: [f for f in files if f != "b.m4a"]) as mock_clips, \
+         patch('app.batch.transcribe_worker', return_value=True) as mock_worker, \
+         patch('app.batch.log'):
+        
+        done, failed = run_batch(["a.m4a", "b.m4a", "c.m4a", "long.mp3"], language="fr", workers=2, model="small")
+    
+    assert sorted(done) == ["a.m4a", "c.m4a", "long.mp3"]
+    assert failed == ["b.m4a"]
+    assert sorted(call.args[0] for call in mock_clips.call_args_list) == [["a.m4a", "b.m4a"], ["c.m4a"]]
+    mock_worker.assert_called_once_with("long.mp3", "fr", "small")
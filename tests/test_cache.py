@@ -0,0 +1,155 @@
+"""
+Tests for cache module
+"""
+import pytest
+import os
+import time
+from unittest.mock import patch
+from app import cache
+from app.cache import file_hash, cache_key, restore, store, evict
+
+def write(path, content):
+    """Write a small test file"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def test_file_hash_depends_on_content(temp_dir):
+    """Test that identical content hashes identically regardless of name"""
+    write(os.path.join(temp_dir, "a.mp3"), "same audio")
+    write(os.path.join(temp_dir, "b.mp3"), "same audio")
+    write(os.path.join(temp_dir, "c.mp3"), "other audio")
+    
+    assert file_hash(os.path.join(temp_dir, "a.mp3")) == file_hash(os.path.join(temp_dir, "b.mp3"))
+    assert file_hash(os.path.join(temp_dir, "a.mp3")) != file_hash(os.path.join(temp_dir, "c.mp3"))
+
+def test_cache_key_includes_settings(temp_dir):
+    """Test that model, language and options change the key"""
+    audio = os.path.join(temp_dir, "a.mp3")
+    write(audio, "audio")
+    
+    base = cache_key(audio, "turbo", "fr")
+    assert base == cache_key(audio, "turbo", "fr")
+    assert base != cache_key(audio, "tiny", "fr")
+    assert base != cache_key(audio, "turbo", "en")
+    assert base != cache_key(audio, "turbo", "fr", {"detect_speakers": True})
+
+def test_cache_key_missing_file(temp_dir):
+    """Test that a missing audio file disables caching"""
+    assert cache_key(os.path.join(temp_dir, "missing.mp3"), "turbo", "fr") is None
+
+def test_store_and_restore(temp_dir):
+    """Test a stored transcript is restored on a hit"""
+    cache_dir = os.path.join(temp_dir, "cache")
+    src = os.path.join(temp_dir, "a.txt")
+    dest = os.path.join(temp_dir, "renamed.txt")
+    write(src, "Bonjour")
+    
+    with patch('app.cache.TRANSCRIPT_CACHE_DIR', cache_dir), \
+         patch('app.cache.log'):
+        assert restore("key", dest) is False
+        assert store("key", src) is True
+        assert restore("key", dest) is True
+    
+    with open(dest, encoding='utf-8') as f:
+        assert f.read() == "Bonjour"
+
+def test_evict_removes_oldest(temp_dir):
+    """Test eviction removes least recently used entries first"""
+    for i, name in enumerate(["old.txt", "mid.txt", "new.txt"]):
+        path = os.path.join(temp_dir, name)
+        write(path, "x" * 10)
+        os.utime(path, (time.time() + i, time.time() + i))
+    
+    with patch('app.cache.log'):
+        evict(temp_dir, 20)
+    
+    assert sorted(os.listdir(temp_dir)) == ["mid.txt", "new.txt"]
+
+def test_store_and_open_audio(temp_dir):
+    """Test decoded audio is stored as .npy and memory-mapped back"""
+    np = pytest.importorskip("numpy")
+    audio_path = os.path.join(temp_dir, "a.mp3")
+    write(audio_path, "audio")
+    entry = cache.audio_entry_path(audio_path)
+    
+    assert os.path.basename(entry) == file_hash(audio_path) + ".npy"
+    assert cache.open_audio(entry) is None
+    
+    cache.store_audio(entry, np.array([0.25, -0.5], dtype=np.float64))
+    audio = cache.open_audio(entry)
+    
+    assert isinstance(audio, np.memmap)
+    assert audio.dtype == np.float32
+    assert audio.tolist() == [0.25, -0.5]
+
+def test_detected_language_roundtrip(temp_dir):
+    """Test detected languages are remembered per audio content"""
+    audio_path = os.path.join(temp_dir, "a.mp3")
+    copy_path = os.path.join(temp_dir, "copy.mp3")
+    write(audio_path, "audio")
+    write(copy_path, "audio")
+    
+    assert cache.detected_language(audio_path) is None
+    cache.store_detected_language(audio_path, "it")
+    
+    assert cache.detected_language(copy_path) == "it"
+
+def test_store_audio_keeps_mapped_entry(temp_dir):
+    """Test storing audio another worker already cached leaves the mapped entry untouched"""
+    np = pytest.importorskip("numpy")
+    audio_path = os.path.join(temp_dir, "a.mp3")
+    write(audio_path, "audio")
+    entry = cache.audio_entry_path(audio_path)
+    cache.store_audio(entry, np.array([0.25, -0.5]))
+    audio = cache.open_audio(entry)
+    
+    cache.store_audio(entry, np.array([0.25, -0.5]))
+    
+    assert audio.tolist() == [0.25, -0.5]
+    assert os.listdir(os.path.dirname(entry)) == [os.path.basename(entry)]
+
+def test_write_entry_uses_private_temp_files(temp_dir):
+    """Test concurrent writers of one entry never share a temp file"""
+    entry = os.path.join(temp_dir, "entry.txt")
+    temp_paths = []
+    
+    def first(f):
+        temp_paths.append(f.name)
+        # A second writer of the same entry starts and finishes meanwhile
+        cache.write_entry(entry, second)
+        f.write(b"first")
+    
+    def second(f):
+        temp_paths.append(f.name)
+        f.write(b"second")
+    
+    cache.write_entry(entry, first)
+    
+    assert temp_paths[0] != temp_paths[1]
+    with open(entry, 'rb') as f:
+        assert f.read() == b"first"
+    assert os.listdir(temp_dir) == ["entry.txt"]
+
+def test_write_entry_removes_temp_file_on_error(temp_dir):
+    """Test a failed write leaves neither an entry nor a temp file"""
+    def fail(f):
+        raise OSError("disk full")
+    
+    with pytest.raises(OSError):
+        cache.write_entry(os.path.join(temp_dir, "entry.txt"), fail)
+    
+    assert os.listdir(temp_dir) == []
+
+def test_evict_skips_temp_files_in_progress(temp_dir):
+    """Test eviction leaves fresh temp files to their writers but removes stale ones"""
+    fresh = os.path.join(temp_dir, ".fresh.tmp")
+    stale = os.path.join(temp_dir, ".stale.tmp")
+    write(fresh, "x" * 10)
+    write(stale, "x" * 10)
+    old = time.time() - cache.STALE_TEMP_SECONDS - 1
+    os.utime(stale, (old, old))
+    
+    with patch('app.cache.log'):
+        evict(temp_dir, 0)
+    
+    assert os.listdir(temp_dir) == [".fresh.tmp"]
@@ -0,0 +1,159 @@
+"""
+Tests for catalog module
+"""
+import os
+import sqlite3
+import time
+import pytest
+from unittest.mock import patch
+from app import cache
+from app.catalog import (
+    connect, refresh, audio_files, untranscribed, transcript_path, page, file_id, file_name, recorded, record
+)
+
+def write_file(path, content="x"):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def age(path, seconds=60):
+    """Move a file's or directory's mtime into the past, as if it changed long ago"""
+    earlier = time.time() - seconds
+    os.utime(path, (earlier, earlier))
+
+def test_audio_files_and_transcript_status(mock_media_dir):
+    """Test audio files are listed with the transcript that goes with them"""
+    for name in ["a.mp3", "a.txt", "b.WAV", "b.txt", "b.noformat.txt", "c.m4a", "c.partial.txt", "notes.txt",
+                 ".next.m4a.part", "talk.pcm"]:
+        write_file(os.path.join(mock_media_dir, name))
+
+    assert audio_files(mock_media_dir) == ["a.mp3", "b.WAV", "c.m4a"]
+    assert untranscribed(mock_media_dir) == ["c.m4a"]
+    assert transcript_path("a.mp3", mock_media_dir) == os.path.join(mock_media_dir, "a.txt")
+    assert transcript_path("b.WAV", mock_media_dir) == os.path.join(mock_media_dir, "b.noformat.txt")
+    assert transcript_path("c.m4a", mock_media_dir) is None
+    assert transcript_path("missing.mp3", mock_media_dir) is None
+
+def test_unchanged_directory_is_not_scanned(mock_media_dir):
+    """Test an old, unchanged directory is answered from the catalog alone"""
+    write_file(os.path.join(mock_media_dir, "a.mp3"))
+    age(mock_media_dir)
+    connection = connect()
+    try:
+        assert refresh(connection, mock_media_dir) is True
+        with patch('app.catalog.scan') as mock_scan:
+            assert refresh(connection, mock_media_dir) is False
+        mock_scan.assert_not_called()
+    finally:
+        connection.close()
+
+def test_changes_are_picked_up(mock_media_dir):
+    """Test new transcripts, new files and removed files change the answers"""
+    write_file(os.path.join(mock_media_dir, "a.mp3"))
+    write_file(os.path.join(mock_media_dir, "b.mp3"))
+    age(mock_media_dir)
+    assert untranscribed(mock_media_dir) == ["a.mp3", "b.mp3"]
+
+    write_file(os.path.join(mock_media_dir, "a.txt"))
+    write_file(os.path.join(mock_media_dir, "c.mp3"))
+    os.remove(os.path.join(mock_media_dir, "b.mp3"))
+
+    assert audio_files(mock_media_dir) == ["a.mp3", "c.mp3"]
+    assert untranscribed(mock_media_dir) == ["c.mp3"]
+
+def test_recorded_values_follow_the_file(mock_media_dir):
+    """Test recorded facts survive rescans but not a change to the file"""
+    path = os.path.join(mock_media_dir, "a.mp3")
+    write_file(path)
+    audio_files(mock_media_dir)
+
+    record(path, duration=12.5, language="fr")
+    write_file(os.path.join(mock_media_dir, "other.mp3"))
+    audio_files(mock_media_dir)
+    assert recorded(path, "duration") == 12.5
+    assert recorded(path, "language") == "fr"
+
+    write_file(path, "new content")
+    assert recorded(path, "duration") is None
+
+def test_record_outside_the_catalog_is_ignored(temp_dir):
+    """Test files that were never scanned are not recorded and recording never raises"""
+    path = os.path.join(temp_dir, "a.mp3")
+    write_file(path)
+    record(path, duration=3.0)
+    assert recorded(path, "duration") is None
+
+    with patch('app.catalog.log') as mock_log:
+        record(os.path.join(temp_dir, "missing.mp3"), duration=3.0)
+    mock_log.assert_called_once()
+
+def test_unknown_fields_are_rejected(mock_media_dir):
+    """Test only the catalog's columns can be recorded"""
+    with pytest.raises(ValueError):
+        record(os.path.join(mock_media_dir, "a.mp3"), transcript="a.txt")
+    with pytest.raises(ValueError):
+        recorded(os.path.join(mock_media_dir, "a.mp3"), "size")
+
+def test_file_hash_is_read_from_the_catalog(mock_media_dir):
+    """Test a catalogued file is hashed once and the hash is reused by later runs"""
+    path = os.path.join(mock_media_dir, "a.mp3")
+    write_file(path)
+    audio_files(mock_media_dir)
+
+    digest = cache.file_hash(path)
+    assert recorded(path, "hash") == digest
+
+    with patch.dict('app.cache._hashes', clear=True), \
+         patch('builtins.open', side_effect=AssertionError("file read again")):
+        assert cache.file_hash(path) == digest
+
+def test_page_filters(mock_media_dir):
+    """Test pages are cut from the sorted listing after filtering by name, status and date"""
+    write_file(os.path.join(mock_media_dir, "50%_talk.mp3"))
+    write_file(os.path.join(mock_media_dir, "Talk_b.mp3"))
+    write_file(os.path.join(mock_media_dir, "talk_b.txt"))
+    write_file(os.path.join(mock_media_dir, "Talk_b.txt"))
+    write_file(os.path.join(mock_media_dir, "song.mp3"))
+    age(os.path.join(mock_media_dir, "song.mp3"), 86400 * 10)
+    cutoff = (time.time() - 86400) * 1e9
+
+    total, rows = page(mock_media_dir, limit=2)
+    assert total == 3
+    assert [row[1] for row in rows] == ["50%_talk.mp3", "Talk_b.mp3"]
+    assert [row[1] for row in page(mock_media_dir, offset=2, limit=2)[1]] == ["song.mp3"]
+
+    assert [row[1] for row in page(mock_media_dir, text="TALK")[1]] == ["50%_talk.mp3", "Talk_b.mp3"]
+    assert [row[1] for row in page(mock_media_dir, text="%_")[1]] == ["50%_talk.mp3"]
+    assert page(mock_media_dir, status="transcribed")[1][0][1:3] == ("Talk_b.mp3", True)
+    assert page(mock_media_dir, status="untranscribed")[0] == 2
+    assert [row[1] for row in page(mock_media_dir, until=cutoff)[1]] == ["song.mp3"]
+    assert page(mock_media_dir, since=cutoff)[0] == 2
+    with pytest.raises(ValueError):
+        page(mock_media_dir, status="pending")
+
+def test_ids_are_stable(mock_media_dir):
+    """Test a file keeps its ID when it changes and others are added or removed"""
+    write_file(os.path.join(mock_media_dir, "b.mp3"))
+    write_file(os.path.join(mock_media_dir, "c.mp3"))
+    ids = {name: file_id(name, mock_media_dir) for name in ["b.mp3", "c.mp3"]}
+
+    write_file(os.path.join(mock_media_dir, "a.mp3"))
+    os.remove(os.path.join(mock_media_dir, "b.mp3"))
+    write_file(os.path.join(mock_media_dir, "c.mp3"), "longer content")
+
+    assert file_id("c.mp3", mock_media_dir) == ids["c.mp3"]
+    assert file_id("a.mp3", mock_media_dir) > max(ids.values())
+    assert file_id("b.mp3", mock_media_dir) is None
+    assert file_name(ids["c.mp3"], mock_media_dir) == "c.mp3"
+    assert file_name(ids["b.mp3"], mock_media_dir) is None
+
+def test_old_catalog_is_rebuilt(mock_media_dir, isolated_cache):
+    """Test a catalog from an older schema is replaced instead of failing"""
+    os.makedirs(isolated_cache, exist_ok=True)
+    old = sqlite3.connect(str(isolated_cache / "catalog.sqlite3"))
+    old.execute("CREATE TABLE media (directory TEXT, name TEXT, PRIMARY KEY (directory, name))")
+    old.commit()
+    old.close()
+    write_file(os.path.join(mock_media_dir, "a.mp3"))
+
+    assert audio_files(mock_media_dir) == ["a.mp3"]
+    assert file_id("a.mp3", mock_media_dir) == 1
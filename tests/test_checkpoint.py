@@ -0,0 +1,77 @@
+"""
+Tests for checkpoint module
+"""
+import pytest
+import os
+from unittest.mock import patch
+from app.checkpoint import checkpoint_path, load, resume_offset, remove, write_transcript, CheckpointWriter
+
+KEY = "abc"  # Transcript key of the run writing the checkpoint
+
+def test_checkpoint_path(temp_dir):
+    """Test that the checkpoint sits next to the audio file"""
+    assert checkpoint_path(os.path.join(temp_dir, "talk.mp3")) == os.path.join(temp_dir, "talk.checkpoint.jsonl")
+
+def test_writer_and_load_round_trip(temp_dir):
+    """Test that written segments are loaded back in order"""
+    audio_path = os.path.join(temp_dir, "talk.mp3")
+    writer = CheckpointWriter(audio_path, KEY)
+    writer.add_segment(0.0, 1.5, " Un")
+    writer.add_segment(1.5, 3.0, " Deux")
+    writer.close()
+    
+    segments = load(audio_path, KEY)
+    assert [s["text"] for s in segments] == [" Un", " Deux"]
+    assert resume_offset(segments) == 3.0
+
+def test_writer_is_lazy(temp_dir):
+    """Test that no checkpoint is created before the first segment"""
+    audio_path = os.path.join(temp_dir, "talk.mp3")
+    CheckpointWriter(audio_path, KEY).close()
+    assert not os.path.exists(checkpoint_path(audio_path))
+
+def test_writer_rewrites_resumed_segments(temp_dir):
+    """Test that resuming drops a half-written line before appending"""
+    audio_path = os.path.join(temp_dir, "talk.mp3")
+    with open(checkpoint_path(audio_path), 'w', encoding='utf-8') as f:
+        f.write('{"key": "abc"}\n{"start": 0.0, "end": 1.0, "text": " Un"}\n{"start": 1.0, "en')
+    
+    segments = load(audio_path, KEY)
+    writer = CheckpointWriter(audio_path, KEY, segments)
+    writer.add_segment(1.0, 2.0, " Deux")
+    writer.close()
+    
+    assert [s["text"] for s in load(audio_path, KEY)] == [" Un", " Deux"]
+
+def test_load_ignores_checkpoint_of_other_settings(temp_dir):
+    """Test that a checkpoint written with another key, or without one, is not resumed"""
+    audio_path = os.path.join(temp_dir, "talk.mp3")
+    writer = CheckpointWriter(audio_path, KEY)
+    writer.add_segment(0.0, 1.5, " Un")
+    writer.close()
+    
+    with patch('app.checkpoint.log'):
+        assert load(audio_path, "other") == []
+        with open(checkpoint_path(audio_path), 'w', encoding='utf-8') as f:
+            f.write('{"start": 0.0, "end": 1.0, "text": " Un"}\n')
+        assert load(audio_path, KEY) == []
+
+def test_load_missing_and_remove(temp_dir):
+    """Test loading without a checkpoint and removing it"""
+    audio_path = os.path.join(temp_dir, "talk.mp3")
+    assert load(audio_path, KEY) == []
+    assert resume_offset([]) == 0.0
+    
+    writer = CheckpointWriter(audio_path, KEY)
+    writer.add_segment(0.0, 1.0, " Un")
+    writer.close()
+    remove(audio_path)
+    assert not os.path.exists(checkpoint_path(audio_path))
+
+def test_write_transcript(temp_dir):
+    """Test the transcript matches Whisper's txt format"""
+    audio_path = os.path.join(temp_dir, "talk.mp3")
+    write_transcript(audio_path, [{"text": " Un "}, {"text": " Deux"}])
+    
+    with open(os.path.join(temp_dir, "talk.txt"), encoding='utf-8') as f:
+        assert f.read() == "Un\nDeux\n"
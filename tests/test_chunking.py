@@ -0,0 +1,123 @@
+"""
+Tests for chunking module
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import os
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from app.chunking import frame_energy_db, find_split_points, chunk_bounds, stitch, read_window, decode_chunk, transcribe_chunked
+
+SAMPLE_RATE = 16000
+
+def speech_with_pauses(seconds, pause_every, pause_length=1.0):
+    """Build a noisy signal with silent pauses at regular intervals"""
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal(seconds * SAMPLE_RATE) * 0.1).astype(np.float32)
+    for start in np.arange(pause_every, seconds, pause_every):
+        audio[int(start * SAMPLE_RATE):int((start + pause_length) * SAMPLE_RATE)] = 0.0
+    return audio
+
+def test_frame_energy_db_silence_is_quiet():
+    """Test that silent frames have much lower energy than noise"""
+    audio = np.concatenate([np.zeros(480, dtype=np.float32), np.ones(480, dtype=np.float32)])
+    energy = frame_energy_db(audio, 480)
+    assert len(energy) == 2
+    assert energy[0] < energy[1] - 50
+
+def test_find_split_points_land_in_silence():
+    """Test that splits are placed inside the pauses"""
+    audio = speech_with_pauses(300, pause_every=50)
+    points = find_split_points(audio, target_seconds=100)
+    
+    assert len(points) == 2
+    for point in points:
+        assert np.all(audio[point - 1600:point + 1600] == 0.0)
+
+def test_find_split_points_short_audio():
+    """Test that audio shorter than the target is not split"""
+    audio = speech_with_pauses(30, pause_every=10)
+    assert find_split_points(audio, target_seconds=100) == []
+
+def test_find_split_points_short_first_chunk():
+    """Test that the first chunk can be shorter so text appears sooner"""
+    audio = speech_with_pauses(300, pause_every=20)
+    points = find_split_points(audio, target_seconds=100, first_target_seconds=20)
+    
+    assert 15 * SAMPLE_RATE <= points[0] <= 25 * SAMPLE_RATE
+    assert points[1] - points[0] > 60 * SAMPLE_RATE
+
+def test_chunk_bounds_cover_audio():
+    """Test that chunk bounds cover every sample exactly once"""
+    assert chunk_bounds(100, [30, 70]) == [(0, 30), (30, 70), (70, 100)]
+    assert chunk_bounds(100, []) == [(0, 100)]
+
+def test_stitch_orders_and_renumbers():
+    """Test that chunk results are merged in order with corrected ids"""
+    results = [
+        {"segments": [{"id": 0, "start": 0.0, "end": 1.0, "text": " Un"}], "language": "fr"},
+        {"segments": [{"id": 0, "start": 0.5, "end": 1.0, "text": " deux"}], "language": "fr"},
+    ]
+    merged = stitch(results, [0.0, 120.0])
+    
+    assert merged["text"] == " Un deux"
+    assert merged["language"] == "fr"
+    assert [s["id"] for s in merged["segments"]] == [0, 1]
+    assert merged["segments"][1]["start"] == 120.5
+
+def test_transcribe_chunked_reports_segments_in_order():
+    """Test that segments are reported in file order with corrected timestamps"""
+    audio = speech_with_pauses(400, pause_every=50)
+    
+    def fake_decode(chunk, language, word_timestamps, model_name):
+        return {"segments": [{"start": 0.0, "end": 1.0, "text": f" {len(chunk)}"}], "language": "fr"}
+    
+    reported = []
+    with patch('app.chunking.ProcessPoolExecutor', ThreadPoolExecutor), \
+         patch('app.chunking.init_worker'), \
+         patch('app.chunking.decode_chunk', side_effect=fake_decode), \
+         patch('app.chunking.CHUNK_MIN_SECONDS', 100):
+        result = transcribe_chunked(audio, "fr", workers=2, on_segment=lambda *s: reported.append(s))
+    
+    starts = [start for start, _, _ in reported]
+    assert starts == sorted(starts)
+    assert starts == [s["start"] for s in result["segments"]]
+    assert len(reported) >= 3
+
+def test_transcribe_chunked_sends_cache_windows(temp_dir):
+    """Test that workers get (path, start, end) windows of the cached audio, not copies"""
+    audio = speech_with_pauses(400, pause_every=50)
+    path = os.path.join(temp_dir, "audio.npy")
+    np.save(path, audio)
+    
+    chunks = []
+    def fake_decode(chunk, language, word_timestamps, model_name):
+        chunks.append(chunk)
+        return {"segments": [], "language": "fr"}
+    
+    with patch('app.chunking.ProcessPoolExecutor', ThreadPoolExecutor), \
+         patch('app.chunking.init_worker'), \
+         patch('app.chunking.decode_chunk', side_effect=fake_decode), \
+         patch('app.chunking.CHUNK_MIN_SECONDS', 100):
+        transcribe_chunked(audio[16000:], "fr", workers=2, source=(path, 16000))
+    
+    assert all(isinstance(chunk, tuple) and chunk[0] == path for chunk in chunks)
+    windows = sorted(chunk[1:] for chunk in chunks)
+    assert windows[0][0] == 16000
+    assert windows[-1][1] == len(audio)
+
+def test_decode_chunk_maps_window(temp_dir):
+    """Test a worker reads exactly its window from the cached audio"""
+    audio = np.arange(100, dtype=np.float32)
+    path = os.path.join(temp_dir, "audio.npy")
+    np.save(path, audio)
+    
+    assert read_window(path, 10, 20).tolist() == list(range(10, 20))
+    with patch('app.chunking.decode', return_value={"segments": []}) as mock_decode:
+        decode_chunk((path, 10, 20), "fr", False, "tiny")
+    
+    assert mock_decode.call_args[0][0].tolist() == list(range(10, 20))
+    # The window also names its mel spectrogram in the mel cache
+    assert mock_decode.call_args[1]["mel_id"] == "audio-10-20"
@@ -0,0 +1,113 @@
+"""
+Tests for clips module
+"""
+import os
+from unittest.mock import patch
+from app.clips import split_short_clips, clip_batches, transcribe_clips
+
+def fake_write_txt(result, audio_path):
+    with open(os.path.splitext(audio_path)[0] + ".txt", 'w', encoding='utf-8') as f:
+        f.write(result["text"].strip() + "\n")
+
+def test_split_short_clips(mock_media_dir):
+    """Test clips up to 30 seconds are separated from longer files without decoding any"""
+    durations = {"note.m4a": 12.0, "edge.m4a": 30.0, "talk.mp3": 31.0, "broken.mp3": None}
+    with patch('app.clips.MEDIA_DIR', mock_media_dir), \
+         patch('app.engine.is_available', return_value=True), \
+         patch('app.engine.probe_duration', side_effect=lambda path: durations[os.path.basename(path)]), \
+         patch('app.engine.load_audio') as mock_load:
+        short, other = split_short_clips(["note.m4a", "edge.m4a", "talk.mp3", "broken.mp3"])
+    
+    assert short == ["note.m4a", "edge.m4a"]
+    assert other == ["talk.mp3", "broken.mp3"]
+    mock_load.assert_not_called()
+
+def test_split_short_clips_without_engine():
+    """Test every file takes the regular path when whisper is not importable"""
+    with patch('app.engine.is_available', return_value=False):
+        assert split_short_clips(["a.mp3"]) == ([], ["a.mp3"])
+
+def test_clip_batches():
+    """Test clips are grouped into batches of the requested size"""
+    assert clip_batches(["a", "b", "c"], 2) == [["a", "b"], ["c"]]
+    assert clip_batches([], 2) == []
+
+def test_transcribe_clips_writes_each_transcript(mock_media_dir):
+    """Test one batched decode writes a transcript per clip and retries unreliable ones alone"""
+    results = [{"text": " Salut", "segments": [], "language": "fr"}, None, {"text": " Merci", "segments": [], "language": "fr"}]
+    
+    def fake_transcribe(file_name, language, detect_speakers, model):
+        fake_write_txt({"text": "Retried"}, os.path.join(mock_media_dir, file_name))
+    
+    with patch('app.clips.MEDIA_DIR', mock_media_dir), \
+         patch('app.utils.MEDIA_DIR', mock_media_dir), \
+         patch('app.transcribe.transcript_key', return_value=None), \
+         patch('app.engine.load_audio', return_value=[0.0]), \
+         patch('app.engine.decode_clips', return_value=results) as mock_decode, \
+         patch('app.engine.write_txt', side_effect=fake_write_txt), \
+         patch('app.transcribe.transcribe', side_effect=fake_transcribe) as mock_transcribe, \
+         patch('app.clips.log'):
+        done = transcribe_clips(["a.m4a", "b.m4a", "c.m4a"], language="fr", model="small")
+    
+    assert done == ["a.m4a", "b.m4a", "c.m4a"]
+    mock_decode.assert_called_once_with([[0.0]] * 3, "fr", "small")
+    mock_transcribe.assert_called_once_with("b.m4a", "fr", False, model="small")
+    with open(os.path.join(mock_media_dir, "c.txt"), encoding='utf-8') as f:
+        assert f.read() == "Merci\n"
+
+def test_transcribe_clips_auto_language_and_cache(mock_media_dir):
+    """Test cached clips are restored and auto lets Whisper detect each clip's language"""
+    with patch('app.clips.MEDIA_DIR', mock_media_dir), \
+         patch('app.utils.MEDIA_DIR', mock_media_dir), \
+         patch('app.transcribe.transcript_key', side_effect=lambda path, *a, batched=False: os.path.basename(path) + ("+batched" if batched else "")), \
+         patch('app.cache.restore', side_effect=lambda key, dest, suffix=".txt": key == "a.m4a" and fake_write_txt({"text": "Cached"}, dest) is None), \
+         patch('app.cache.store') as mock_store, \
+         patch('app.engine.load_audio', return_value=[0.0]), \
+         patch('app.engine.decode_clips', return_value=[{"text": " Hallo", "segments": [], "language": "de"}]) as mock_decode, \
+         patch('app.engine.write_txt', side_effect=fake_write_txt), \
+         patch('app.clips.log'):
+        done = transcribe_clips(["a.m4a", "b.m4a"], language="auto")
+    
+    assert done == ["a.m4a", "b.m4a"]
+    mock_decode.assert_called_once_with([[0.0]], None, "turbo")
+    mock_store.assert_any_call("b.m4a+batched", os.path.join(mock_media_dir, "b.txt"))
+    mock_store.assert_any_call("b.m4a+batched", os.path.join(mock_media_dir, "b.segments.json"), suffix=".segments.json")
+
+def test_split_short_clips_reuses_recorded_durations(mock_media_dir):
+    """Test durations measured once are read back from the media catalog"""
+    from app.catalog import audio_files
+    for name in ["note.m4a", "talk.mp3"]:
+        with open(os.path.join(mock_media_dir, name), 'w') as f:
+            f.write(name)
+    audio_files(mock_media_dir)
+    durations = {"note.m4a": 12.0, "talk.mp3": 31.0}
+    with patch('app.clips.MEDIA_DIR', mock_media_dir), \
+         patch('app.engine.is_available', return_value=True), \
+         patch('app.engine.probe_duration', side_effect=lambda path: durations[os.path.basename(path)]):
+        assert split_short_clips(["note.m4a", "talk.mp3"]) == (["note.m4a"], ["talk.mp3"])
+    
+    with patch('app.clips.MEDIA_DIR', mock_media_dir), \
+         patch('app.engine.is_available', return_value=True), \
+         patch('app.engine.probe_duration') as mock_probe:
+        assert split_short_clips(["note.m4a", "talk.mp3"]) == (["note.m4a"], ["talk.mp3"])
+    mock_probe.assert_not_called()
+
+def test_transcribe_clips_longer_than_probed(mock_media_dir):
+    """Test a clip that decodes longer than one window is transcribed on its own"""
+    lengths = {"a.m4a": 16000 * 10, "b.m4a": 16000 * 31}
+    
+    def fake_transcribe(file_name, language, detect_speakers, model):
+        fake_write_txt({"text": "Alone"}, os.path.join(mock_media_dir, file_name))
+    
+    with patch('app.clips.MEDIA_DIR', mock_media_dir), \
+         patch('app.utils.MEDIA_DIR', mock_media_dir), \
+         patch('app.transcribe.transcript_key', return_value=None), \
+         patch('app.engine.load_audio', side_effect=lambda path: [0.0] * lengths[os.path.basename(path)]), \
+         patch('app.engine.decode_clips', return_value=[{"text": " Salut", "segments": [], "language": "fr"}]) as mock_decode, \
+         patch('app.engine.write_txt', side_effect=fake_write_txt), \
+         patch('app.transcribe.transcribe', side_effect=fake_transcribe) as mock_transcribe, \
+         patch('app.clips.log'):
+        assert transcribe_clips(["a.m4a", "b.m4a"], language="fr") == ["a.m4a", "b.m4a"]
+    
+    assert len(mock_decode.call_args[0][0]) == 1
+    mock_transcribe.assert_called_once_with("b.m4a", "fr", False, model="turbo")
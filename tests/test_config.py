@@ -6,7 +6,7 @@ import json
 import tempfile
 import shutil
 from unittest.mock import patch
-from app.config import BASE_DIR, VENV_DIR, MEDIA_DIR, LOG_DIR, LOG_FILE, DEFAULT_LANGUAGE, load_language, save_language, SUPPORTED_LANGUAGES
+from app.config import BASE_DIR, VENV_DIR, MEDIA_DIR, LOG_DIR, LOG_FILE, DEFAULT_LANGUAGE, load_language, save_language, SUPPORTED_LANGUAGES, ensure_directories, load_ingest_mode, DEFAULT_INGEST_MODE, load_model_name, load_draft_model, DEFAULT_MODEL, load_precision, load_thread_settings, save_settings, load_chunk_workers, DEFAULT_CHUNK_WORKERS
 
 def test_base_dir():
     """Test BASE_DIR is set correctly"""
@@ -125,4 +125,85 @@ def test_save_language_permission_error():
     """Test save_language handles permission errors gracefully"""
     with patch('app.config.SETTINGS_FILE', '/root/inaccessible/settings.json'):
         result = save_language("en")
-        assert result == False 
\ No newline at end of file
+        assert result == False 
+def test_import_has_no_side_effects():
+    """Test that directories are only created by ensure_directories"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log_dir = os.path.join(temp_dir, "logs")
+        media_dir = os.path.join(temp_dir, "media")
+        
+        with patch('app.config.LOG_DIR', log_dir), \
+             patch('app.config.MEDIA_DIR', media_dir):
+            assert not os.path.exists(log_dir)
+            ensure_directories()
+            assert os.path.isdir(log_dir)
+            assert os.path.isdir(media_dir)
+
+def test_load_ingest_mode_default():
+    """Test load_ingest_mode returns default when no settings file exists"""
+    with patch('app.config.SETTINGS_FILE', '/nonexistent/file.json'):
+        assert load_ingest_mode() == DEFAULT_INGEST_MODE == "native"
+
+def test_load_ingest_mode_from_file(temp_dir):
+    """Test load_ingest_mode loads valid modes and ignores unknown ones"""
+    settings_file = os.path.join(temp_dir, "settings.json")
+    with patch('app.config.SETTINGS_FILE', settings_file):
+        for mode, expected in [("pcm", "pcm"), ("mp3", "mp3"), ("flac", DEFAULT_INGEST_MODE)]:
+            with open(settings_file, 'w') as f:
+                json.dump({"language": "en", "ingest_mode": mode}, f)
+            assert load_ingest_mode() == expected
+
+def test_load_language_auto(temp_dir):
+    """Test load_language accepts automatic detection"""
+    settings_file = os.path.join(temp_dir, "settings.json")
+    with open(settings_file, 'w') as f:
+        json.dump({"language": "auto"}, f)
+    
+    with patch('app.config.SETTINGS_FILE', settings_file):
+        assert load_language() == "auto"
+
+def test_load_model_settings(temp_dir):
+    """Test the model and draft model settings fall back when missing or unknown"""
+    settings_file = os.path.join(temp_dir, "settings.json")
+    with patch('app.config.SETTINGS_FILE', settings_file):
+        assert load_model_name() == DEFAULT_MODEL
+        assert load_draft_model() is None
+        with open(settings_file, 'w') as f:
+            json.dump({"model": "small", "draft_model": "tiny"}, f)
+        assert load_model_name() == "small"
+        assert load_draft_model() == "tiny"
+        with open(settings_file, 'w') as f:
+            json.dump({"model": "huge", "draft_model": "huge"}, f)
+        assert load_model_name() == DEFAULT_MODEL
+        assert load_draft_model() is None
+
+def test_load_precision(temp_dir):
+    """Test the precision setting accepts fp32 and int8 only"""
+    settings_file = os.path.join(temp_dir, "settings.json")
+    with patch('app.config.SETTINGS_FILE', settings_file):
+        assert load_precision() == "fp32"
+        for precision, expected in [("int8", "int8"), ("fp16", "fp32")]:
+            with open(settings_file, 'w') as f:
+                json.dump({"precision": precision}, f)
+            assert load_precision() == expected
+
+def test_load_chunk_workers(temp_dir):
+    """Test the chunk_workers setting accepts positive counts only"""
+    settings_file = os.path.join(temp_dir, "settings.json")
+    with patch('app.config.SETTINGS_FILE', settings_file):
+        assert load_chunk_workers() == DEFAULT_CHUNK_WORKERS
+        for workers, expected in [(2, 2), (0, DEFAULT_CHUNK_WORKERS), ("4", DEFAULT_CHUNK_WORKERS)]:
+            save_settings(chunk_workers=workers)
+            assert load_chunk_workers() == expected
+
+def test_thread_settings(temp_dir):
+    """Test thread settings are saved next to the language and validated on load"""
+    settings_file = os.path.join(temp_dir, "settings.json")
+    with patch('app.config.SETTINGS_FILE', settings_file):
+        assert load_thread_settings() == (None, None, False)
+        save_language("fr")
+        assert save_settings(intra_op_threads=4, inter_op_threads=1, cpu_affinity=True)
+        assert load_thread_settings() == (4, 1, True)
+        assert load_language() == "fr"
+        save_settings(intra_op_threads=0, inter_op_threads="2", cpu_affinity="yes")
+        assert load_thread_settings() == (None, None, False)
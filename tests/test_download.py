@@ -2,9 +2,14 @@
 Tests for download module
 """
 import pytest
+import json
 import os
+import zlib
 from unittest.mock import Mock, patch
-from app.download import is_youtube_url, download_from_url, download_youtube_audio, download_direct_audio
+from app.download import (
+    is_youtube_url, download_from_url, download_youtube_audio, youtube_filename, youtube_dl, create_youtube_dl, youtube_postprocessors,
+    _record_output_path, _youtube, YOUTUBE_FILENAME_FIELD, download_direct_audio, partial_download_path, validator_path, content_range, reserve_filename, release_filename, read_url_list, expand_url_args
+)
 
 def test_is_youtube_url_youtube_com():
     """Test YouTube URL detection for youtube.com"""
@@ -52,96 +57,314 @@ def test_download_from_url_direct(mock_subprocess, temp_dir):
         mock_youtube.assert_not_called()
         assert result == "test_audio.mp3"
 
-def test_download_youtube_audio_success(mock_subprocess, temp_dir):
-    """Test successful YouTube audio download"""
-    with patch('app.download.VENV_DIR', os.path.join(temp_dir, "venv")), \
-         patch('app.download.MEDIA_DIR', os.path.join(temp_dir, "media")), \
-         patch('app.download.LOG_FILE', os.path.join(temp_dir, "test.log")), \
-         patch('app.download.log') as mock_log:
+def fake_youtube_dl(media_dir, title="Test Video Title"):
+    """YoutubeDL stand-in that 'downloads' an mp3 and reports it like the post-processor hook"""
+    ydl = Mock()
+    ydl.extract_info.return_value = {"id": "test", "title": title}
+
+    def process_ie_result(info, download):
+        path = os.path.join(media_dir, info[YOUTUBE_FILENAME_FIELD] + ".mp3")
+        with open(path, 'w') as f:
+            f.write("fake audio")
+        _record_output_path({"status": "finished", "info_dict": {"filepath": path}})
+        return info
+
+    ydl.process_ie_result.side_effect = process_ie_result
+    return ydl
+
+def test_download_from_url_writes_pcm_sidecar(mock_media_dir):
+    """Test that the pcm ingest mode decodes each download once"""
+    with patch('app.download.download_direct_audio', return_value="audio.m4a"), \
+         patch('app.download.MEDIA_DIR', mock_media_dir), \
+         patch('app.download.load_ingest_mode', return_value="pcm"), \
+         patch('app.engine.write_pcm') as mock_write_pcm:
         
-        # Create media directory
-        os.makedirs(os.path.join(temp_dir, "media"), exist_ok=True)
+        assert download_from_url("https://example.com/audio.m4a") == "audio.m4a"
         
-        # Mock the first call (title extraction) to return success with title
-        mock_subprocess['run'].side_effect = [
-            Mock(returncode=0, stdout="Test Video Title\n"),  # Title extraction
-            Mock(returncode=0)  # Download
-        ]
+        mock_write_pcm.assert_called_once_with(os.path.join(mock_media_dir, "audio.m4a"))
+
+def test_download_from_url_native_skips_pcm(mock_media_dir):
+    """Test that the native ingest mode keeps the download as is"""
+    with patch('app.download.download_direct_audio', return_value="audio.m4a"), \
+         patch('app.download.load_ingest_mode', return_value="native"), \
+         patch('app.engine.write_pcm') as mock_write_pcm:
         
-        # Create the expected downloaded file
-        with open(os.path.join(temp_dir, "media", "Test_Video_Title.mp3"), 'w') as f:
-            f.write("fake audio")
+        assert download_from_url("https://example.com/audio.m4a") == "audio.m4a"
+        
+        mock_write_pcm.assert_not_called()
+
+def test_youtube_postprocessors():
+    """Test only the mp3 ingest mode re-encodes audio"""
+    assert youtube_postprocessors("mp3")[0]["preferredcodec"] == "mp3"
+    assert youtube_postprocessors("native")[0]["preferredcodec"] == "best"
+    assert youtube_postprocessors("pcm")[0]["preferredcodec"] == "best"
+
+def test_download_youtube_audio_success(mock_media_dir):
+    """Test successful YouTube audio download"""
+    ydl = fake_youtube_dl(mock_media_dir)
+    with patch('app.download.youtube_dl', return_value=ydl), \
+         patch('app.download.log') as mock_log:
         
         result = download_youtube_audio("https://youtube.com/watch?v=test")
         
         assert result == "Test_Video_Title.mp3"
+        # Metadata is fetched once and reused for the download
+        ydl.extract_info.assert_called_once_with("https://youtube.com/watch?v=test", download=False)
+        ydl.process_ie_result.assert_called_once()
 
-def test_download_youtube_audio_failure(mock_subprocess, temp_dir):
+def test_download_youtube_audio_uses_hook_path(mock_media_dir):
+    """Test that the file reported by the post-processor hook is returned, not a prefix match"""
+    # A file sharing the name prefix must not be picked up
+    with open(os.path.join(mock_media_dir, "Test_Video_Title_old.mp3"), 'w') as f:
+        f.write("older audio")
+    
+    with patch('app.download.youtube_dl', return_value=fake_youtube_dl(mock_media_dir)), \
+         patch('app.download.log'):
+        result = download_youtube_audio("https://youtube.com/watch?v=test")
+    
+    assert result == "Test_Video_Title.mp3"
+
+def test_download_youtube_audio_failure(mock_media_dir):
     """Test YouTube audio download failure"""
-    with patch('app.download.VENV_DIR', os.path.join(temp_dir, "venv")), \
-         patch('app.download.MEDIA_DIR', os.path.join(temp_dir, "media")), \
-         patch('app.download.LOG_FILE', os.path.join(temp_dir, "test.log")), \
+    ydl = fake_youtube_dl(mock_media_dir)
+    ydl.process_ie_result.side_effect = Exception("ERROR: unable to download")
+    with patch('app.download.youtube_dl', return_value=ydl), \
          patch('app.download.log') as mock_log:
         
-        # Mock failed download
-        mock_subprocess['run'].side_effect = [
-            Mock(returncode=0, stdout="Test Video Title\n"),  # Title extraction succeeds
-            Mock(returncode=1)  # Download fails
-        ]
-        
         result = download_youtube_audio("https://youtube.com/watch?v=test")
         
         assert result is None
 
-def test_download_direct_audio_success(mock_urllib, temp_dir):
+def test_youtube_filename():
+    """Test video titles are turned into safe, short file names"""
+    assert youtube_filename("Test Video Title") == "Test_Video_Title"
+    assert youtube_filename('What? A "quoted" title: part 1/2 of a long series') == "What_A_quoted_title_part_12_of"
+    assert youtube_filename("???").startswith("youtube_")
+    assert youtube_filename(None).startswith("youtube_")
+
+def test_youtube_dl_is_reused():
+    """Test that a thread creates its YoutubeDL instance once"""
+    _youtube.ydl = None
+    with patch('app.download.create_youtube_dl', return_value=Mock()) as mock_create:
+        first = youtube_dl()
+        second = youtube_dl()
+    _youtube.ydl = None
+    
+    assert first is second
+    mock_create.assert_called_once()
+
+def test_create_youtube_dl_output_template(mock_media_dir):
+    """Test the output template uses the file name chosen from the title"""
+    pytest.importorskip("yt_dlp")
+    with patch('app.download.MEDIA_DIR', mock_media_dir):
+        ydl = create_youtube_dl()
+    
+    info = {"id": "test", "title": "Test Video Title", "ext": "webm", YOUTUBE_FILENAME_FIELD: "Test_Video_Title"}
+    assert ydl.prepare_filename(info) == os.path.join(mock_media_dir, "Test_Video_Title.webm")
+
+def test_download_direct_audio_success(http_server, mock_media_dir):
     """Test successful direct audio download"""
-    with patch('app.download.MEDIA_DIR', os.path.join(temp_dir, "media")), \
+    http_server.files["/audio.mp3"] = b"fake audio content"
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
          patch('app.download.log') as mock_log:
         
-        # Create media directory
-        os.makedirs(os.path.join(temp_dir, "media"), exist_ok=True)
-        
-        # Mock successful download - create the file
-        def mock_urlretrieve(url, filepath):
-            with open(filepath, 'w') as f:
-                f.write("fake audio content")
-        
-        mock_urllib.side_effect = mock_urlretrieve
+        result = download_direct_audio(f"{http_server.url}/audio.mp3")
         
-        result = download_direct_audio("https://example.com/audio.mp3")
-        
-        mock_urllib.assert_called_once()
         assert result == "audio.mp3"
+        with open(os.path.join(mock_media_dir, "audio.mp3"), 'rb') as f:
+            assert f.read() == b"fake audio content"
+        # The temp file is renamed into place
+        assert os.listdir(mock_media_dir) == ["audio.mp3"]
 
-def test_download_direct_audio_with_timestamp(mock_urllib, temp_dir):
+def test_download_direct_audio_with_timestamp(http_server, mock_media_dir):
     """Test direct audio download with timestamp filename"""
-    with patch('app.download.MEDIA_DIR', os.path.join(temp_dir, "media")), \
+    http_server.files["/"] = b"fake audio content"
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
          patch('app.download.log') as mock_log:
         
-        # Create media directory
-        os.makedirs(os.path.join(temp_dir, "media"), exist_ok=True)
-        
-        # Mock successful download - create the file
-        def mock_urlretrieve(url, filepath):
-            with open(filepath, 'w') as f:
-                f.write("fake audio content")
-        
-        mock_urllib.side_effect = mock_urlretrieve
+        result = download_direct_audio(f"{http_server.url}/")
         
-        result = download_direct_audio("https://example.com/")
-        
-        mock_urllib.assert_called_once()
         assert result.startswith("audio_")
         assert result.endswith(".mp3")
+        assert os.path.exists(os.path.join(mock_media_dir, result))
 
-def test_download_direct_audio_failure(mock_urllib, temp_dir):
+def test_download_direct_audio_failure(http_server, mock_media_dir):
     """Test direct audio download failure"""
-    with patch('app.download.MEDIA_DIR', os.path.join(temp_dir, "media")), \
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
          patch('app.download.log') as mock_log:
         
-        # Mock failed download
-        mock_urllib.side_effect = Exception("Download failed")
-        
-        result = download_direct_audio("https://example.com/audio.mp3")
+        # Nothing is served at this path
+        result = download_direct_audio(f"{http_server.url}/audio.mp3")
         
-        assert result is None 
\ No newline at end of file
+        assert result is None
+        assert os.listdir(mock_media_dir) == []
+
+def write_partial(media_dir, name, content, url, etag):
+    """Leave a .part file and its validator behind like an interrupted download"""
+    part_path = partial_download_path(os.path.join(media_dir, name))
+    with open(part_path, 'wb') as f:
+        f.write(content)
+    with open(validator_path(part_path), 'w', encoding='utf-8') as f:
+        json.dump({"url": url, "etag": etag, "last_modified": None}, f)
+
+def served_etag(body):
+    """ETag the test server sends for a body"""
+    return f'"{zlib.crc32(body):08x}"'
+
+def test_download_direct_audio_resumes_partial_file(http_server, mock_media_dir):
+    """Test that a leftover .part file is resumed with a Range request"""
+    body = bytes(range(256)) * 40
+    http_server.files["/audio.mp3"] = body
+    url = f"{http_server.url}/audio.mp3"
+    write_partial(mock_media_dir, "audio.mp3", body[:1000], url, served_etag(body))
+    
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
+         patch('app.download.log'):
+        result = download_direct_audio(url)
+    
+    assert result == "audio.mp3"
+    assert http_server.requests == [("/audio.mp3", "bytes=1000-")]
+    with open(os.path.join(mock_media_dir, "audio.mp3"), 'rb') as f:
+        assert f.read() == body
+    assert os.listdir(mock_media_dir) == ["audio.mp3"]
+
+def test_download_direct_audio_restarts_unvalidated_partial_file(http_server, mock_media_dir):
+    """Test that a .part file without a validator for this URL is downloaded again"""
+    body = bytes(range(256)) * 40
+    http_server.files["/audio.mp3"] = body
+    write_partial(mock_media_dir, "audio.mp3", b"x" * 1000, "https://other.example/audio.mp3", served_etag(body))
+    
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
+         patch('app.download.log'):
+        result = download_direct_audio(f"{http_server.url}/audio.mp3")
+    
+    assert result == "audio.mp3"
+    assert http_server.requests == [("/audio.mp3", None)]
+    with open(os.path.join(mock_media_dir, "audio.mp3"), 'rb') as f:
+        assert f.read() == body
+
+def test_download_direct_audio_restarts_changed_file(http_server, mock_media_dir):
+    """Test that If-Range makes a file changed on the server come back whole"""
+    body = bytes(range(256)) * 40
+    http_server.files["/audio.mp3"] = body
+    url = f"{http_server.url}/audio.mp3"
+    write_partial(mock_media_dir, "audio.mp3", b"x" * 1000, url, '"stale"')
+    
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
+         patch('app.download.log'):
+        result = download_direct_audio(url)
+    
+    assert result == "audio.mp3"
+    with open(os.path.join(mock_media_dir, "audio.mp3"), 'rb') as f:
+        assert f.read() == body
+
+def test_download_direct_audio_restarts_oversized_partial_file(http_server, mock_media_dir):
+    """Test that a 416 for a .part file longer than the served file restarts the download"""
+    body = bytes(range(256)) * 4
+    http_server.files["/audio.mp3"] = body
+    url = f"{http_server.url}/audio.mp3"
+    write_partial(mock_media_dir, "audio.mp3", body * 2, url, served_etag(body))
+    
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
+         patch('app.download.log'):
+        result = download_direct_audio(url)
+    
+    assert result == "audio.mp3"
+    assert http_server.requests == [("/audio.mp3", f"bytes={len(body) * 2}-"), ("/audio.mp3", None)]
+    with open(os.path.join(mock_media_dir, "audio.mp3"), 'rb') as f:
+        assert f.read() == body
+
+def test_download_direct_audio_keeps_complete_partial_file(http_server, mock_media_dir):
+    """Test that a 416 for a .part file of exactly the served size finishes the download"""
+    body = bytes(range(256)) * 4
+    http_server.files["/audio.mp3"] = body
+    url = f"{http_server.url}/audio.mp3"
+    write_partial(mock_media_dir, "audio.mp3", body, url, served_etag(body))
+    
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
+         patch('app.download.log'):
+        result = download_direct_audio(url)
+    
+    assert result == "audio.mp3"
+    assert http_server.requests == [("/audio.mp3", f"bytes={len(body)}-")]
+    assert os.listdir(mock_media_dir) == ["audio.mp3"]
+
+def test_content_range():
+    """Test Content-Range headers are parsed into the first byte and total size"""
+    def response(value):
+        return Mock(getheader=Mock(return_value=value))
+    
+    assert content_range(response("bytes 1000-9999/10000")) == (1000, 10000)
+    assert content_range(response("bytes */10000")) == (None, 10000)
+    assert content_range(response("bytes 0-99/*")) == (0, None)
+    assert content_range(response(None)) == (None, None)
+
+def test_download_direct_audio_resumes_after_dropped_connection(http_server, mock_media_dir):
+    """Test that an interrupted transfer continues where it stopped"""
+    body = bytes(range(256)) * 40
+    http_server.files["/audio.mp3"] = body
+    http_server.drop_once.add("/audio.mp3")
+    
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
+         patch('app.download.log'):
+        result = download_direct_audio(f"{http_server.url}/audio.mp3")
+    
+    assert result == "audio.mp3"
+    assert http_server.requests == [("/audio.mp3", None), ("/audio.mp3", f"bytes={len(body) // 2}-")]
+    with open(os.path.join(mock_media_dir, "audio.mp3"), 'rb') as f:
+        assert f.read() == body
+
+def test_download_direct_audio_reuses_connection(http_server, mock_media_dir):
+    """Test that several files from the same host share one keep-alive connection"""
+    for name in ["a.mp3", "b.mp3", "c.mp3"]:
+        http_server.files[f"/{name}"] = b"fake audio content"
+    
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
+         patch('app.download.log'):
+        results = [download_direct_audio(f"{http_server.url}/{name}") for name in ["a.mp3", "b.mp3", "c.mp3"]]
+    
+    assert results == ["a.mp3", "b.mp3", "c.mp3"]
+    assert http_server.connections == 1
+
+def test_download_direct_audio_keeps_existing_file(http_server, mock_media_dir):
+    """Test that a download never replaces a media file of the same name"""
+    http_server.files["/audio.mp3"] = b"new audio"
+    with open(os.path.join(mock_media_dir, "audio.mp3"), 'wb') as f:
+        f.write(b"old audio")
+    
+    with patch('app.download.MEDIA_DIR', mock_media_dir), \
+         patch('app.download.log'):
+        result = download_direct_audio(f"{http_server.url}/audio.mp3")
+    
+    assert result == "audio_1.mp3"
+    with open(os.path.join(mock_media_dir, "audio.mp3"), 'rb') as f:
+        assert f.read() == b"old audio"
+
+def test_reserve_filename_while_downloading(mock_media_dir):
+    """Test concurrent downloads of one name each get their own file until released"""
+    with patch('app.download.MEDIA_DIR', mock_media_dir):
+        first = reserve_filename("audio_20240101_120000.mp3")
+        second = reserve_filename("audio_20240101_120000.mp3")
+        release_filename(first)
+        third = reserve_filename("audio_20240101_120000.mp3")
+        release_filename(second)
+        release_filename(third)
+    
+    assert first == third == "audio_20240101_120000.mp3"
+    assert second == "audio_20240101_120000_1.mp3"
+
+def test_read_url_list(temp_dir):
+    """Test reading URLs from a file skips blank lines and comments"""
+    path = os.path.join(temp_dir, "urls.txt")
+    with open(path, 'w') as f:
+        f.write("# podcasts\nhttps://example.com/a.mp3\n\n  https://example.com/b.mp3  \n")
+    
+    assert read_url_list(path) == ["https://example.com/a.mp3", "https://example.com/b.mp3"]
+
+def test_expand_url_args(temp_dir):
+    """Test command line items can mix URLs and URL files"""
+    path = os.path.join(temp_dir, "urls.txt")
+    with open(path, 'w') as f:
+        f.write("https://example.com/b.mp3\n")
+    
+    assert expand_url_args(["https://example.com/a.mp3", path]) == ["https://example.com/a.mp3", "https://example.com/b.mp3"]
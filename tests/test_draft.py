@@ -0,0 +1,87 @@
+"""
+Tests for draft module
+"""
+import os
+import subprocess
+import sys
+from unittest.mock import Mock, patch
+from app.draft import marker_path, write_marker, refining_model, start_refine, transcribe_with_refine, refine, main
+
+def write_transcript(temp_dir, name="talk.txt", text="Bonjour"):
+    with open(os.path.join(temp_dir, name), 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def test_refining_model(temp_dir):
+    """Test the draft marker records the refine model"""
+    with patch('app.draft.MEDIA_DIR', temp_dir):
+        assert refining_model("talk.mp3") is None
+        write_marker("talk.mp3", "large", os.getpid())
+        assert marker_path("talk.mp3") == os.path.join(temp_dir, "talk.draft")
+        assert refining_model("talk.mp3") == "large"
+
+def test_refining_model_clears_dead_refine(temp_dir):
+    """Test a marker whose refine process is gone is cleared, leaving the draft as the transcript"""
+    with patch('app.draft.MEDIA_DIR', temp_dir), \
+         patch('app.draft.log'):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        write_marker("talk.mp3", "large", process.pid)
+        
+        assert refining_model("talk.mp3") is None
+        assert not os.path.exists(marker_path("talk.mp3"))
+
+def test_transcribe_with_refine(temp_dir):
+    """Test that the draft model runs first and the refine is started in the background"""
+    with patch('app.draft.MEDIA_DIR', temp_dir), \
+         patch('app.transcribe.transcribe', side_effect=lambda *a, **k: write_transcript(temp_dir)) as mock_transcribe, \
+         patch('app.draft.start_refine', return_value=Mock(pid=os.getpid())) as mock_start, \
+         patch('app.draft.log'):
+        transcribe_with_refine("talk.mp3", "fr", True, True, model="turbo", draft_model="tiny")
+
+        assert refining_model("talk.mp3") == "turbo"
+    mock_transcribe.assert_called_once_with("talk.mp3", "fr", True, True, model="tiny")
+    mock_start.assert_called_once_with("talk.mp3", "fr", True, "turbo")
+
+def test_transcribe_with_refine_no_draft(temp_dir):
+    """Test that no refine starts when the draft produced no transcript"""
+    with patch('app.draft.MEDIA_DIR', temp_dir), \
+         patch('app.transcribe.transcribe'), \
+         patch('app.draft.start_refine') as mock_start, \
+         patch('app.draft.log'):
+        transcribe_with_refine("talk.mp3", "fr", model="turbo", draft_model="tiny")
+
+        assert refining_model("talk.mp3") is None
+    mock_start.assert_not_called()
+
+def test_start_refine_detaches():
+    """Test the refine process runs this module detached from the terminal"""
+    with patch('app.draft.subprocess.Popen') as mock_popen:
+        start_refine("talk.mp3", "en", True, "large")
+
+    command = mock_popen.call_args[0][0]
+    assert command == [sys.executable, "-m", "app.draft", "talk.mp3", "--language", "en", "--model", "large",
+                       "--detect-speakers"]
+    assert mock_popen.call_args[1]["start_new_session"] is True
+
+def test_refine_removes_marker(temp_dir):
+    """Test a successful refine replaces the draft and clears the marker"""
+    with patch('app.draft.MEDIA_DIR', temp_dir), \
+         patch('app.draft.os.nice', create=True), \
+         patch('app.transcribe.transcribe') as mock_transcribe, \
+         patch('app.draft.log'):
+        write_marker("talk.mp3", "turbo", os.getpid())
+        assert refine("talk.mp3", "fr", False, "turbo") is True
+        assert refining_model("talk.mp3") is None
+    mock_transcribe.assert_called_once_with("talk.mp3", "fr", False, model="turbo")
+
+def test_refine_failure_keeps_draft(temp_dir):
+    """Test a failed refine keeps the draft as the transcript and clears the marker"""
+    with patch('app.draft.MEDIA_DIR', temp_dir), \
+         patch('app.draft.os.nice', create=True), \
+         patch('app.transcribe.transcribe', side_effect=SystemExit(1)), \
+         patch('app.draft.log'):
+        write_transcript(temp_dir)
+        write_marker("talk.mp3", "turbo", os.getpid())
+        assert main(["talk.mp3", "--language", "fr", "--model", "turbo"]) == 1
+        assert refining_model("talk.mp3") is None
+        assert os.path.exists(os.path.join(temp_dir, "talk.txt"))
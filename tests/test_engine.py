@@ -0,0 +1,372 @@
+"""
+Tests for engine module
+"""
+import pytest
+import os
+from unittest.mock import Mock, patch
+from app import engine
+from app.engine import is_available, load_model, transcribe_file, parse_segment_line, SegmentLineWriter, offset_segments, CLI_DECODE_OPTIONS
+
+@pytest.fixture(autouse=True)
+def clear_models():
+    """Start every test with no models loaded"""
+    engine._models.clear()
+    yield
+    engine._models.clear()
+
+def test_is_available_without_whisper():
+    """Test engine is unavailable when whisper cannot be found"""
+    with patch('importlib.util.find_spec', return_value=None):
+        assert is_available() is False
+
+def test_load_model_is_cached():
+    """Test that a model is loaded once and then reused"""
+    fake_whisper = Mock()
+    with patch.dict('sys.modules', {'whisper': fake_whisper}), \
+         patch('app.engine.log'):
+        
+        first = load_model("tiny")
+        second = load_model("tiny")
+        
+        assert first is second
+        fake_whisper.load_model.assert_called_once_with("tiny", device="cpu")
+
+def test_load_model_per_name():
+    """Test that different model names are loaded separately"""
+    fake_whisper = Mock()
+    with patch.dict('sys.modules', {'whisper': fake_whisper}), \
+         patch('app.engine.log'):
+        
+        load_model("tiny")
+        load_model("base")
+        
+        assert fake_whisper.load_model.call_count == 2
+
+def test_transcribe_file_writes_txt(temp_dir):
+    """Test that transcribe_file decodes with CLI options and writes a .txt"""
+    fake_model = Mock()
+    fake_model.transcribe.return_value = {"segments": [{"text": " Bonjour"}]}
+    audio = [0.0] * 16000
+    
+    with patch('app.engine.MEDIA_DIR', temp_dir), \
+         patch('app.engine.load_model', return_value=fake_model), \
+         patch('app.engine.load_audio', return_value=audio), \
+         patch('app.engine.write_txt') as mock_write:
+        
+        result = transcribe_file("test_audio.mp3", "fr", word_timestamps=True)
+        
+        fake_model.transcribe.assert_called_once_with(
+            audio, language="fr", task="transcribe", word_timestamps=True,
+            verbose=False, **CLI_DECODE_OPTIONS
+        )
+        mock_write.assert_called_once_with(result, os.path.join(temp_dir, "test_audio.mp3"))
+
+def test_transcribe_file_chunks_long_audio(temp_dir):
+    """Test that long recordings go through the parallel chunked path"""
+    audio = [0.0] * (16000 * 3)
+    fake_chunking = Mock()
+    
+    with patch('app.engine.MEDIA_DIR', temp_dir), \
+         patch('app.engine.CHUNKING_MIN_SECONDS', 2), \
+         patch('app.engine.chunk_workers', return_value=4), \
+         patch('app.engine.load_audio', return_value=audio), \
+         patch('app.engine.decode') as mock_decode, \
+         patch('app.engine.write_txt'), \
+         patch.dict('sys.modules', {'app.chunking': fake_chunking}):
+        
+        transcribe_file("long.mp3", "fr")
+        
+        fake_chunking.transcribe_chunked.assert_called_once()
+        mock_decode.assert_not_called()
+
+def test_chunk_workers_fit_in_memory():
+    """Test the chunk worker count is lowered until each model copy fits in memory"""
+    gigabyte = 1024 ** 3
+    with patch('app.engine.load_chunk_workers', return_value=8), \
+         patch('app.engine.log'):
+        with patch('app.engine.available_memory', return_value=64 * gigabyte):
+            assert engine.chunk_workers("turbo") == 8
+        with patch('app.engine.available_memory', return_value=10 * gigabyte):
+            assert engine.chunk_workers("turbo") == 2
+            assert engine.chunk_workers("tiny") == 8
+        with patch('app.engine.available_memory', return_value=gigabyte):
+            assert engine.chunk_workers("large") == 1
+        with patch('app.engine.available_memory', return_value=None):
+            assert engine.chunk_workers("large") == 8
+
+def test_parse_segment_line():
+    """Test parsing of Whisper verbose segment lines"""
+    assert parse_segment_line("[00:01.500 --> 00:04.000]  Bonjour") == (1.5, 4.0, "Bonjour")
+    assert parse_segment_line("[01:00:01.000 --> 01:00:02.250]  Salut") == (3601.0, 3602.25, "Salut")
+    assert parse_segment_line("Detecting language using up to the first 30 seconds.") is None
+
+def test_segment_line_writer():
+    """Test that printed segment lines reach the callback, other lines pass through, and all are logged"""
+    segments = []
+    passthrough = Mock()
+    writer = SegmentLineWriter(lambda *s: segments.append(s), passthrough)
+    
+    with patch('app.engine.log_output') as mock_log_output:
+        writer.write("[00:00.000 --> 00:01")
+        writer.write(".000]  Un\nDetected language: French\n")
+    
+    assert segments == [(0.0, 1.0, "Un")]
+    passthrough.write.assert_called_once_with("Detected language: French\n")
+    assert [c.args[0] for c in mock_log_output.call_args_list] == ["[00:00.000 --> 00:01.000]  Un", "Detected language: French"]
+
+def test_offset_segments_shifts_timestamps():
+    """Test that segment and word timestamps are shifted by the offset"""
+    segments = [{"start": 1.0, "end": 2.0, "seek": 0, "text": " Salut", "words": [{"word": " Salut", "start": 1.0, "end": 1.5}]}]
+    shifted = offset_segments(segments, 60.0)
+    
+    assert shifted[0]["start"] == 61.0
+    assert shifted[0]["end"] == 62.0
+    assert shifted[0]["seek"] == 6000
+    assert shifted[0]["words"][0]["start"] == 61.0
+    # The original segments are left untouched
+    assert segments[0]["start"] == 1.0
+
+def test_transcribe_file_resumes_after_previous_segments(temp_dir):
+    """Test that resumed decoding skips audio already decoded and keeps earlier segments"""
+    audio = list(range(16000 * 10))
+    previous = [{"start": 0.0, "end": 4.0, "text": " Avant"}]
+    reported = []
+    
+    def fake_decode(audio_part, language, word_timestamps, model_name, device, verbose, on_segment, mel_id=None):
+        on_segment(1.0, 2.0, " Après")
+        return {"segments": [{"start": 1.0, "end": 2.0, "text": " Après"}], "language": "fr"}
+    
+    with patch('app.engine.MEDIA_DIR', temp_dir), \
+         patch('app.engine.load_audio', return_value=audio), \
+         patch('app.engine.decode', side_effect=fake_decode) as mock_decode, \
+         patch('app.engine.write_txt'):
+        
+        result = transcribe_file("talk.mp3", "fr", on_segment=lambda *s: reported.append(s), previous_segments=previous)
+    
+    assert len(mock_decode.call_args[0][0]) == 16000 * 6
+    assert reported == [(5.0, 6.0, " Après")]
+    assert [s["start"] for s in result["segments"]] == [0.0, 5.0]
+    assert result["text"] == " Avant Après"
+
+def test_write_pcm(mock_subprocess, temp_dir):
+    """Test the PCM sidecar is decoded with ffmpeg to a temp file, then renamed"""
+    audio_path = os.path.join(temp_dir, "talk.opus")
+    
+    def fake_ffmpeg(cmd, **kwargs):
+        with open(cmd[-1], 'wb') as f:
+            f.write(b"\x00\x00")
+        return Mock(returncode=0)
+    
+    mock_subprocess['run'].side_effect = fake_ffmpeg
+    path = engine.write_pcm(audio_path)
+    
+    assert path == os.path.join(temp_dir, "talk.pcm")
+    assert os.path.exists(path)
+    cmd = mock_subprocess['run'].call_args[0][0]
+    assert cmd[0] == "ffmpeg"
+    assert cmd[cmd.index("-ar") + 1] == "16000"
+    assert cmd[cmd.index("-ac") + 1] == "1"
+
+def test_write_pcm_failure(mock_subprocess, temp_dir):
+    """Test a failed decode leaves no sidecar behind"""
+    mock_subprocess['run'].return_value = Mock(returncode=1, stderr="Invalid data")
+    with patch('app.engine.log'):
+        assert engine.write_pcm(os.path.join(temp_dir, "talk.opus")) is None
+    assert os.listdir(temp_dir) == []
+
+def test_load_audio_reads_pcm_sidecar(temp_dir):
+    """Test a fresh PCM sidecar is loaded without running ffmpeg"""
+    np = pytest.importorskip("numpy")
+    audio_path = os.path.join(temp_dir, "talk.opus")
+    with open(audio_path, 'wb') as f:
+        f.write(b"opus")
+    np.array([0, 16384, -32768], dtype=np.int16).tofile(engine.pcm_path(audio_path))
+    
+    audio = engine.decode_audio(audio_path)
+    
+    assert audio.dtype == np.float32
+    assert audio.tolist() == [0.0, 0.5, -1.0]
+
+def test_load_audio_decodes_once(temp_dir, isolated_cache):
+    """Test decoded audio is cached and later loads are memory-mapped without decoding"""
+    np = pytest.importorskip("numpy")
+    audio_path = os.path.join(temp_dir, "talk.mp3")
+    with open(audio_path, 'wb') as f:
+        f.write(b"mp3 data")
+    decoded = np.linspace(-1, 1, 1000, dtype=np.float32)
+    
+    with patch('app.engine.decode_audio', return_value=decoded) as mock_decode:
+        first = engine.load_audio(audio_path)
+        second = engine.load_audio(audio_path)
+    
+    mock_decode.assert_called_once_with(audio_path)
+    assert isinstance(second, np.memmap)
+    assert np.array_equal(first, decoded) and np.array_equal(second, decoded)
+    assert len(os.listdir(isolated_cache / "audio")) == 1
+
+def test_load_audio_shared_across_names(temp_dir):
+    """Test a renamed copy of a file reuses the decoded audio"""
+    np = pytest.importorskip("numpy")
+    for name in ["a.mp3", "b.mp3"]:
+        with open(os.path.join(temp_dir, name), 'wb') as f:
+            f.write(b"same content")
+    
+    with patch('app.engine.decode_audio', return_value=np.zeros(10, dtype=np.float32)) as mock_decode:
+        engine.load_audio(os.path.join(temp_dir, "a.mp3"))
+        engine.load_audio(os.path.join(temp_dir, "b.mp3"))
+    
+    mock_decode.assert_called_once()
+
+def test_cached_mel_computes_once(isolated_cache):
+    """Test the mel spectrogram is computed on the first run and mapped from the cache afterwards"""
+    np = pytest.importorskip("numpy")
+    mel = np.random.default_rng(0).standard_normal((80, 300)).astype(np.float32)
+    compute = Mock(return_value=Mock(cpu=Mock(return_value=Mock(numpy=Mock(return_value=mel)))))
+    fake_transcribe_module = Mock(log_mel_spectrogram=compute)
+    fake_torch = Mock(from_numpy=lambda array: array)
+    
+    with patch.dict('sys.modules', {'torch': fake_torch, 'whisper': Mock(), 'whisper.transcribe': fake_transcribe_module}):
+        for _ in range(2):
+            with engine.cached_mel("abc-0-48000"):
+                result = fake_transcribe_module.log_mel_spectrogram("audio", 80, padding=480000)
+        
+        # The original function is restored afterwards
+        assert fake_transcribe_module.log_mel_spectrogram is compute
+    
+    compute.assert_called_once_with("audio", 80, 480000, None)
+    assert np.array_equal(result, mel)
+    assert os.listdir(isolated_cache / "mel") == ["abc-0-48000-80-480000.npy"]
+
+def test_window_id():
+    """Test mel cache ids name the audio cache entry and the window"""
+    assert engine.window_id("/cache/audio/abc.npy", 16000, 32000) == "abc-16000-32000"
+
+def test_detect_language_uses_first_window():
+    """Test language identification runs the small model on the first 30 s only"""
+    np = pytest.importorskip("numpy")
+    fake_whisper = Mock()
+    fake_whisper.pad_or_trim.side_effect = lambda audio: audio
+    fake_model = Mock()
+    fake_model.detect_language.return_value = (None, {"fr": 0.2, "it": 0.7, "en": 0.1})
+    audio = np.zeros(60 * 16000, dtype=np.float32)
+    
+    with patch.dict('sys.modules', {'whisper': fake_whisper}), \
+         patch('app.engine.load_model', return_value=fake_model) as mock_load, \
+         patch('app.engine.load_audio', return_value=audio):
+        assert engine.detect_language("/media/talk.mp3") == "it"
+    
+    mock_load.assert_called_once_with("tiny", "cpu")
+    assert len(fake_whisper.pad_or_trim.call_args[0][0]) == 30 * 16000
+
+def test_load_model_precision_per_key():
+    """Test that int8 and fp32 copies of a model are loaded separately, and int8 only on CPU"""
+    fake_whisper = Mock()
+    with patch.dict('sys.modules', {'whisper': fake_whisper}), \
+         patch('app.engine.load_quantized_model', return_value="int8 model") as mock_quantized, \
+         patch('app.engine.log'):
+        
+        assert load_model("tiny", precision="int8") == "int8 model"
+        load_model("tiny", precision="fp32")
+        load_model("tiny", device="cuda", precision="int8")
+        
+        mock_quantized.assert_called_once_with("tiny")
+        assert fake_whisper.load_model.call_count == 2
+
+def test_load_model_reads_precision_setting():
+    """Test that the precision setting applies when none is given"""
+    with patch('app.engine.load_precision', return_value="int8"), \
+         patch('app.engine.load_quantized_model') as mock_quantized, \
+         patch('app.engine.log'):
+        load_model("base")
+    
+    mock_quantized.assert_called_once_with("base")
+
+def make_tiny_whisper():
+    """Build a small randomly initialised Whisper model"""
+    torch = pytest.importorskip("torch")
+    whisper_model = pytest.importorskip("whisper.model")
+    torch.manual_seed(0)
+    dims = whisper_model.ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=64, n_audio_head=2, n_audio_layer=1,
+        n_vocab=51865, n_text_ctx=448, n_text_state=64, n_text_head=2, n_text_layer=1
+    )
+    model = whisper_model.Whisper(dims)
+    # Left uninitialised by Whisper, which always loads it from a checkpoint
+    torch.nn.init.normal_(model.decoder.positional_embedding, std=0.02)
+    return model
+
+def test_quantize_model_replaces_linear_layers():
+    """Test that every linear layer is quantized and the model still decodes"""
+    torch = pytest.importorskip("torch")
+    model = engine.quantize_model(make_tiny_whisper())
+    
+    quantized = torch.ao.nn.quantized.dynamic.Linear
+    assert isinstance(model.encoder.blocks[0].mlp[0], quantized)
+    assert isinstance(model.decoder.blocks[0].attn.query, quantized)
+    mel = torch.zeros(1, 80, 3000)
+    assert model.embed_audio(mel).shape == (1, 1500, 64)
+
+def test_load_quantized_model_uses_cache():
+    """Test that quantized weights are saved once and reloaded in later sessions"""
+    torch = pytest.importorskip("torch")
+    whisper = pytest.importorskip("whisper")
+    with patch.object(whisper, 'load_model', side_effect=lambda name, device: make_tiny_whisper()) as mock_load, \
+         patch('app.engine.log'):
+        first = engine.load_quantized_model("tiny")
+        second = engine.load_quantized_model("tiny")
+    
+    mock_load.assert_called_once()
+    tokens = torch.tensor([[50258, 50259]])
+    features = first.embed_audio(torch.zeros(1, 80, 3000))
+    assert torch.equal(first.logits(tokens, features), second.logits(tokens, features))
+    assert torch.equal(first.alignment_heads.to_dense(), second.alignment_heads.to_dense())
+
+def test_decode_clips_batches_short_clips():
+    """Test several clips are decoded in one pass into per-clip results"""
+    np = pytest.importorskip("numpy")
+    model = make_tiny_whisper()
+    clips = [np.zeros(16000 * seconds, dtype=np.float32) for seconds in (2, 5, 30)]
+    engine._models[("tiny", "cpu", "fp32")] = model
+    with patch('app.engine.is_reliable', side_effect=[True, False, True]), \
+         patch('app.engine.is_silent', return_value=False), \
+         patch('app.engine.load_precision', return_value="fp32"), \
+         patch('app.engine.batch_decoding_task', wraps=engine.batch_decoding_task) as mock_task:
+        encoded = []
+        model.encoder.register_forward_hook(lambda module, args, output: encoded.append(args[0].shape))
+        results = engine.decode_clips(clips, "en", "tiny")
+    
+    # One encoder pass over the whole batch, with the beam search of single transcriptions
+    assert encoded == [(3, 80, 3000)]
+    assert mock_task.call_args[0][1].beam_size == CLI_DECODE_OPTIONS["beam_size"]
+    assert results[1] is None
+    assert results[0]["language"] == "en"
+    assert all(segment["end"] == 30.0 for segment in results[2]["segments"])
+
+def test_probe_duration_reads_the_header(mock_subprocess, temp_dir):
+    """Test durations come from ffprobe without decoding the audio"""
+    audio_path = os.path.join(temp_dir, "talk.opus")
+    mock_subprocess['run'].return_value = Mock(returncode=0, stdout="12.480000\n", stderr="")
+    
+    assert engine.probe_duration(audio_path) == 12.48
+    cmd = mock_subprocess['run'].call_args[0][0]
+    assert cmd[0] == "ffprobe" and cmd[-1] == audio_path
+
+def test_probe_duration_unknown(mock_subprocess, temp_dir):
+    """Test a file ffprobe cannot read, or a missing ffprobe, gives no duration"""
+    audio_path = os.path.join(temp_dir, "talk.opus")
+    mock_subprocess['run'].return_value = Mock(returncode=1, stdout="", stderr="Invalid data")
+    with patch('app.engine.log'):
+        assert engine.probe_duration(audio_path) is None
+        mock_subprocess['run'].side_effect = FileNotFoundError("ffprobe")
+        assert engine.probe_duration(audio_path) is None
+
+def test_probe_duration_from_pcm_sidecar(mock_subprocess, temp_dir):
+    """Test a fresh PCM sidecar gives the duration from its size"""
+    audio_path = os.path.join(temp_dir, "talk.opus")
+    with open(audio_path, 'wb') as f:
+        f.write(b"opus")
+    with open(engine.pcm_path(audio_path), 'wb') as f:
+        f.write(b"\x00\x00" * 16000 * 3)
+    
+    assert engine.probe_duration(audio_path) == 3.0
+    mock_subprocess['run'].assert_not_called()
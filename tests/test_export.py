@@ -0,0 +1,77 @@
+"""
+Tests for export module
+"""
+import json
+import os
+from unittest.mock import patch
+from app.export import compact_segments, write_segments, load_segments, to_srt, to_vtt, to_tsv, export, export_all
+
+RESULT = {
+    "language": "fr",
+    "segments": [
+        {"id": 0, "seek": 0, "start": 0.0, "end": 2.5, "text": " Bonjour à tous.", "tokens": [1, 2], "avg_logprob": -0.2,
+         "words": [{"word": " Bonjour", "start": 0.0, "end": 0.84, "probability": 0.9871},
+                   {"word": " à", "start": 0.84, "end": 1.0, "probability": 0.5},
+                   {"word": " tous.", "start": 1.0, "end": 2.5, "probability": 0.75}]},
+        {"id": 1, "seek": 0, "start": 3661.25, "end": 3663.004, "text": " Merci\tbeaucoup."},
+    ],
+}
+
+def test_compact_segments_keeps_timings_only():
+    """Test decoder internals are dropped and words become compact lists"""
+    compact = compact_segments(RESULT)
+    assert compact["language"] == "fr"
+    assert compact["segments"][0] == {
+        "start": 0.0, "end": 2.5, "text": "Bonjour à tous.",
+        "words": [[" Bonjour", 0.0, 0.84, 0.987], [" à", 0.84, 1.0, 0.5], [" tous.", 1.0, 2.5, 0.75]],
+    }
+    assert "words" not in compact["segments"][1]
+
+def test_write_and_load_segments(temp_dir):
+    """Test the segment file sits next to the audio and round-trips"""
+    audio_path = os.path.join(temp_dir, "talk.mp3")
+    path = write_segments(RESULT, audio_path)
+    
+    assert path == os.path.join(temp_dir, "talk.segments.json")
+    with open(path, encoding='utf-8') as f:
+        assert "Bonjour à tous." in f.read()  # Not escaped
+    assert load_segments(audio_path)[1]["end"] == 3663.0
+    assert load_segments(os.path.join(temp_dir, "other.mp3")) is None
+
+def test_subtitle_formats():
+    """Test SRT, VTT and TSV rendering"""
+    segments = compact_segments(RESULT)["segments"]
+    
+    assert to_srt(segments) == (
+        "1\n00:00:00,000 --> 00:00:02,500\nBonjour à tous.\n\n"
+        "2\n01:01:01,250 --> 01:01:03,000\nMerci\tbeaucoup.\n"
+    )
+    assert to_vtt(segments).startswith("WEBVTT\n\n00:00:00.000 --> 00:00:02.500\nBonjour à tous.\n")
+    assert to_tsv(segments) == "start\tend\ttext\n0\t2500\tBonjour à tous.\n3661250\t3663000\tMerci beaucoup.\n"
+
+def test_export_reads_segment_file(mock_media_dir):
+    """Test export writes <name>.<format> from the segment file alone"""
+    write_segments(RESULT, os.path.join(mock_media_dir, "talk.mp3"))
+    with patch('app.export.MEDIA_DIR', mock_media_dir), \
+         patch('app.export.log'):
+        path = export("talk.mp3", "vtt")
+        assert export("missing.mp3", "vtt") is None
+    
+    assert path == os.path.join(mock_media_dir, "talk.vtt")
+    with open(path, encoding='utf-8') as f:
+        assert "Merci" in f.read()
+
+def test_export_all_reports_old_transcripts(mock_media_dir, capsys):
+    """Test files transcribed before segment files existed are reported as skipped"""
+    write_segments(RESULT, os.path.join(mock_media_dir, "new.mp3"))
+    with open(os.path.join(mock_media_dir, "old.txt"), 'w') as f:
+        f.write("Bonjour")
+    with patch('app.export.MEDIA_DIR', mock_media_dir), \
+         patch('app.export.log'):
+        exported = export_all(["new.mp3", "old.mp3", "untranscribed.mp3"], "srt")
+    
+    assert exported == [os.path.join(mock_media_dir, "new.srt")]
+    out = capsys.readouterr().out
+    assert "Exported: new.srt" in out
+    assert "Skipped: old.mp3" in out
+    assert "untranscribed" not in out
@@ -0,0 +1,98 @@
+"""
+Tests for pipeline module
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from app.pipeline import run_pipeline
+
+URLS = [f"https://example.com/{name}.mp3" for name in "abcde"]
+
+def file_name_for(url):
+    return url.rsplit("/", 1)[-1]
+
+def test_run_pipeline_transcribes_every_download():
+    """Test that each downloaded file is transcribed and failures are reported"""
+    def fake_download(url):
+        return None if "c.mp3" in url else file_name_for(url)
+
+    with patch('app.download.download_from_url', side_effect=fake_download), \
+         patch('app.pipeline.find_existing_transcript', return_value=None), \
+         patch('app.pipeline.ProcessPoolExecutor', ThreadPoolExecutor), \
+         patch('app.pipeline.init_worker'), \
+         patch('app.pipeline.transcribe_worker', side_effect=lambda f, lang, model: f != "d.mp3") as mock_worker, \
+         patch('app.pipeline.log'):
+        done, failed = run_pipeline(URLS, language="fr", workers=2, download_workers=2)
+
+    assert sorted(done) == ["a.mp3", "b.mp3", "e.mp3"]
+    assert failed == ["d.mp3"]
+    assert mock_worker.call_count == 4
+
+def test_run_pipeline_survives_crashed_worker():
+    """Test that a worker crash fails its file without blocking the other downloads"""
+    def crashing_worker(file_name, *args):
+        if file_name == "a.mp3":
+            raise RuntimeError("worker process died")
+        return True
+
+    with patch('app.download.download_from_url', side_effect=file_name_for), \
+         patch('app.pipeline.find_existing_transcript', return_value=None), \
+         patch('app.pipeline.ProcessPoolExecutor', ThreadPoolExecutor), \
+         patch('app.pipeline.init_worker'), \
+         patch('app.pipeline.transcribe_worker', side_effect=crashing_worker), \
+         patch('app.pipeline.log'):
+        done, failed = run_pipeline(URLS, language="fr", workers=1, download_workers=2, max_pending=1)
+
+    assert failed == ["a.mp3"]
+    assert sorted(done) == ["b.mp3", "c.mp3", "d.mp3", "e.mp3"]
+
+def test_run_pipeline_skips_transcribed_files():
+    """Test that downloads which already have a transcript are not queued"""
+    with patch('app.download.download_from_url', side_effect=file_name_for), \
+         patch('app.pipeline.find_existing_transcript', return_value="/media/a.txt"), \
+         patch('app.pipeline.ProcessPoolExecutor', ThreadPoolExecutor), \
+         patch('app.pipeline.init_worker'), \
+         patch('app.pipeline.transcribe_worker') as mock_worker, \
+         patch('app.pipeline.log'):
+        done, failed = run_pipeline(URLS[:1], language="fr", workers=1, download_workers=1)
+
+    assert done == [] and failed == []
+    mock_worker.assert_not_called()
+
+def test_run_pipeline_backpressure():
+    """Test that downloads pause while the decoders are behind"""
+    release = threading.Event()
+    downloaded = []
+
+    def fake_download(url):
+        downloaded.append(url)
+        return file_name_for(url)
+
+    def slow_worker(file_name, language, model):
+        release.wait(5)
+        return True
+
+    results = {}
+    with patch('app.download.download_from_url', side_effect=fake_download), \
+         patch('app.pipeline.find_existing_transcript', return_value=None), \
+         patch('app.pipeline.ProcessPoolExecutor', ThreadPoolExecutor), \
+         patch('app.pipeline.init_worker'), \
+         patch('app.pipeline.transcribe_worker', side_effect=slow_worker), \
+         patch('app.pipeline.log'):
+        runner = threading.Thread(target=lambda: results.update(
+            result=run_pipeline(URLS, language="fr", workers=1, download_workers=1, max_pending=1)))
+        runner.start()
+
+        # One file decoding and one waiting; the downloader blocks before fetching a third
+        deadline = time.monotonic() + 5
+        while len(downloaded) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)
+        assert len(downloaded) == 2
+
+        release.set()
+        runner.join(5)
+
+    assert len(downloaded) == 5
+    assert sorted(results["result"][0]) == [file_name_for(url) for url in URLS]
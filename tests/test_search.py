@@ -0,0 +1,121 @@
+"""
+Tests for search module
+"""
+import os
+import time
+from unittest.mock import patch
+from app.export import write_segments
+from app.search import connect, transcript_files, update_index, search, fts_query, format_offset, run_search
+
+def write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def bump_mtime(path):
+    """Make a rewrite visible even on filesystems with coarse mtimes"""
+    later = time.time() + 10
+    os.utime(path, (later, later))
+
+def test_fts_query_quotes_words():
+    """Test user text cannot inject FTS5 syntax"""
+    assert fts_query('café "NEAR" -x') == '"café" """NEAR""" "-x"'
+    assert fts_query("   ") == ""
+
+def test_transcript_files(mock_media_dir):
+    """Test transcripts are found with their segment files and partial ones are skipped"""
+    for name in ["a.txt", "a.segments.json", "b.txt", "b.noformat.txt", "c.partial.txt", "d.mp3"]:
+        write_text(os.path.join(mock_media_dir, name), "x")
+    
+    files = transcript_files(mock_media_dir)
+    assert files == {
+        "a": (os.path.join(mock_media_dir, "a.txt"), os.path.join(mock_media_dir, "a.segments.json")),
+        "b": (os.path.join(mock_media_dir, "b.noformat.txt"), None),
+    }
+
+def test_search_returns_offsets(mock_media_dir, temp_dir):
+    """Test matches in segment files come with millisecond offsets, plain transcripts without"""
+    write_text(os.path.join(mock_media_dir, "talk.txt"), "Bonjour.\nParlons du réchauffement climatique.\n")
+    write_segments({"segments": [
+        {"start": 0.0, "end": 1.5, "text": " Bonjour."},
+        {"start": 83.45, "end": 86.0, "text": " Parlons du réchauffement climatique."},
+    ]}, os.path.join(mock_media_dir, "talk.mp3"))
+    write_text(os.path.join(mock_media_dir, "old.txt"), "Le climat change.\nRechauffement global.\n")
+    
+    connection = connect(os.path.join(temp_dir, "index.sqlite3"))
+    with patch('app.search.log'):
+        assert update_index(connection, mock_media_dir) == (2, 0)
+    
+    # Accents are ignored, as users rarely type them
+    results = search(connection, "rechauffement")
+    assert [(name, start, end) for name, start, end, _ in results] in (
+        [("talk", 83450, 86000), ("old", None, None)],
+        [("old", None, None), ("talk", 83450, 86000)],
+    )
+    assert search(connection, "parlons climatique")[0][3] == "[Parlons] du réchauffement [climatique]."
+    assert search(connection, "absent") == []
+
+def test_dotted_names_use_their_own_segment_file(mock_media_dir, temp_dir):
+    """Test a base name with dots is indexed from its own segment file, not a prefix's"""
+    write_text(os.path.join(mock_media_dir, "Mr._Smith.txt"), "Hello there.\n")
+    write_segments({"segments": [{"start": 1.5, "end": 2.0, "text": " Hello there."}]},
+                   os.path.join(mock_media_dir, "Mr._Smith.mp3"))
+    write_text(os.path.join(mock_media_dir, "Mr.txt"), "Goodbye.\n")
+    write_segments({"segments": [{"start": 9.0, "end": 9.5, "text": " Goodbye."}]},
+                   os.path.join(mock_media_dir, "Mr.mp3"))
+    
+    connection = connect(os.path.join(temp_dir, "index.sqlite3"))
+    with patch('app.search.log'):
+        assert update_index(connection, mock_media_dir) == (2, 0)
+    
+    assert [(name, start) for name, start, _, _ in search(connection, "hello")] == [("Mr._Smith", 1500)]
+    assert [(name, start) for name, start, _, _ in search(connection, "goodbye")] == [("Mr", 9000)]
+
+def test_unreadable_segment_file_falls_back_to_text(mock_media_dir, temp_dir):
+    """Test a broken segment file is indexed from the transcript, without timestamps"""
+    write_text(os.path.join(mock_media_dir, "talk.txt"), "Bonjour.\n")
+    write_text(os.path.join(mock_media_dir, "talk.segments.json"), "{not json")
+    
+    connection = connect(os.path.join(temp_dir, "index.sqlite3"))
+    with patch('app.search.log') as mock_log:
+        assert update_index(connection, mock_media_dir) == (1, 0)
+    
+    assert [(name, start) for name, start, _, _ in search(connection, "bonjour")] == [("talk", None)]
+    assert "talk.segments.json" in mock_log.call_args_list[0][0][0]
+
+def test_update_index_is_incremental(mock_media_dir, temp_dir):
+    """Test only new or changed transcripts are reindexed and deleted ones are dropped"""
+    a = os.path.join(mock_media_dir, "a.txt")
+    b = os.path.join(mock_media_dir, "b.txt")
+    write_text(a, "pommes\n")
+    write_text(b, "poires\n")
+    connection = connect(os.path.join(temp_dir, "index.sqlite3"))
+    
+    with patch('app.search.log'):
+        assert update_index(connection, mock_media_dir) == (2, 0)
+        assert update_index(connection, mock_media_dir) == (0, 0)
+        
+        write_text(a, "cerises\n")
+        bump_mtime(a)
+        os.remove(b)
+        assert update_index(connection, mock_media_dir) == (1, 1)
+    
+    assert search(connection, "pommes") == []
+    assert search(connection, "poires") == []
+    assert search(connection, "cerises")[0][0] == "a"
+
+def test_run_search_prints_matches(mock_media_dir, capsys):
+    """Test the search command updates the index and prints offsets"""
+    write_segments({"segments": [{"start": 3723.25, "end": 3725.0, "text": " Au revoir."}]},
+                   os.path.join(mock_media_dir, "talk.mp3"))
+    write_text(os.path.join(mock_media_dir, "talk.txt"), "Au revoir.\n")
+    
+    with patch('app.search.MEDIA_DIR', mock_media_dir), \
+         patch('app.search.log'):
+        results = run_search("revoir")
+        run_search("absent")
+    
+    assert len(results) == 1
+    out = capsys.readouterr().out
+    assert "talk  1:02:03.250 (3723250 ms)  Au [revoir]." in out
+    assert "No transcript matches 'absent'." in out
+    assert format_offset(0) == "0:00:00.000"
@@ -4,7 +4,7 @@ Tests for setup module
 import pytest
 import os
 from unittest.mock import Mock, patch
-from app.setup import create_venv, install_dependencies, ensure_venv_and_dependencies
+from app.setup import create_venv, install_dependencies, ensure_venv_and_dependencies, venv_python_version
 
 def test_create_venv(mock_subprocess, temp_dir):
     """Test virtual environment creation"""
@@ -68,3 +68,48 @@ def test_ensure_venv_and_dependencies_venv_missing(mock_subprocess, temp_dir):
         # Should install dependencies since import fails
         mock_install.assert_called_once()
 
+def test_ensure_venv_and_dependencies_stamp_skips_check(mock_subprocess, temp_dir):
+    """Test that a matching stamp skips the import check entirely"""
+    venv_dir = os.path.join(temp_dir, "venv")
+    os.makedirs(venv_dir, exist_ok=True)
+    
+    with patch('app.setup.VENV_DIR', venv_dir), \
+         patch('app.setup.install_dependencies') as mock_install:
+        
+        # First launch runs the check and records the fingerprint
+        ensure_venv_and_dependencies()
+        assert mock_subprocess['run'].call_count == 1
+        
+        # Second launch only reads the stamp
+        ensure_venv_and_dependencies()
+        assert mock_subprocess['run'].call_count == 1
+        mock_install.assert_not_called()
+
+def test_ensure_venv_and_dependencies_requirements_changed(mock_subprocess, temp_dir):
+    """Test that changing requirements.txt triggers the full check again"""
+    venv_dir = os.path.join(temp_dir, "venv")
+    os.makedirs(venv_dir, exist_ok=True)
+    requirements = os.path.join(temp_dir, "requirements.txt")
+    with open(requirements, 'w') as f:
+        f.write("openai-whisper\n")
+    
+    with patch('app.setup.VENV_DIR', venv_dir), \
+         patch('app.setup.REQUIREMENTS_PATH', requirements), \
+         patch('app.setup.install_dependencies'):
+        
+        ensure_venv_and_dependencies()
+        with open(requirements, 'a') as f:
+            f.write("yt-dlp\n")
+        ensure_venv_and_dependencies()
+        
+        assert mock_subprocess['run'].call_count == 2
+
+def test_venv_python_version(temp_dir):
+    """Test the interpreter version is read from pyvenv.cfg"""
+    venv_dir = os.path.join(temp_dir, "venv")
+    os.makedirs(venv_dir, exist_ok=True)
+    with open(os.path.join(venv_dir, "pyvenv.cfg"), 'w') as f:
+        f.write("home = /usr/bin\ninclude-system-site-packages = false\nversion = 3.13.1\n")
+    
+    with patch('app.setup.VENV_DIR', venv_dir):
+        assert venv_python_version() == "3.13.1"
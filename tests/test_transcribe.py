@@ -3,14 +3,14 @@ Tests for transcribe module
 """
 import pytest
 import os
-from unittest.mock import Mock, patch
-from app.transcribe import transcribe
+from unittest.mock import ANY, Mock, patch
+from app.transcribe import transcribe, transcript_key, TranscriptStream
 
-def test_transcribe_success(mock_subprocess, temp_dir):
+def test_transcribe_success(mock_subprocess, temp_dir, mock_media_dir):
     """Test successful transcription"""
     with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
          patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
-         patch('app.transcribe.LOG_FILE', os.path.join(temp_dir, "test.log")), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
          patch('app.transcribe.log') as mock_log:
         
         # Mock successful Whisper execution
@@ -19,7 +19,7 @@ def test_transcribe_success(mock_subprocess, temp_dir):
         transcribe("test_audio.mp3")
         
         # Check that transcription was logged
-        mock_log.assert_called_with("Transcribing 'test_audio.mp3' to text in fr...")
+        mock_log.assert_any_call("Transcribing 'test_audio.mp3' to text in fr...")
         
         # Check that subprocess.Popen was called with correct arguments
         mock_subprocess['Popen'].assert_called_once()
@@ -30,14 +30,13 @@ def test_transcribe_success(mock_subprocess, temp_dir):
         assert "fr" in call_args
         assert "--task" in call_args
         assert "transcribe" in call_args
-        assert "--output_format" in call_args
-        assert "txt" in call_args
+        assert call_args[call_args.index("--output_format") + 1] == "json"
 
-def test_transcribe_custom_language(mock_subprocess, temp_dir):
+def test_transcribe_custom_language(mock_subprocess, temp_dir, mock_media_dir):
     """Test transcription with custom language"""
     with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
          patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
-         patch('app.transcribe.LOG_FILE', os.path.join(temp_dir, "test.log")), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
          patch('app.transcribe.log') as mock_log:
         
         # Mock successful Whisper execution
@@ -49,11 +48,11 @@ def test_transcribe_custom_language(mock_subprocess, temp_dir):
         call_args = mock_subprocess['Popen'].call_args[0][0]
         assert "en" in call_args
 
-def test_transcribe_failure(mock_subprocess, temp_dir):
+def test_transcribe_failure(mock_subprocess, temp_dir, mock_media_dir):
     """Test transcription failure"""
     with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
          patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
-         patch('app.transcribe.LOG_FILE', os.path.join(temp_dir, "test.log")), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
          patch('app.transcribe.log') as mock_log, \
          patch('sys.exit') as mock_exit:
         
@@ -68,14 +67,14 @@ def test_transcribe_failure(mock_subprocess, temp_dir):
         # Check that sys.exit was called
         mock_exit.assert_called_once_with(1)
 
-def test_transcribe_whisper_command_path(mock_subprocess, temp_dir):
+def test_transcribe_whisper_command_path(mock_subprocess, temp_dir, mock_media_dir):
     """Test that Whisper command path is correctly constructed"""
     venv_dir = os.path.join(temp_dir, "venv")
     os.makedirs(venv_dir, exist_ok=True)
     
     with patch('app.transcribe.VENV_DIR', venv_dir), \
          patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
-         patch('app.transcribe.LOG_FILE', os.path.join(temp_dir, "test.log")), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
          patch('app.transcribe.log') as mock_log:
         
         # Mock successful Whisper execution
@@ -88,14 +87,14 @@ def test_transcribe_whisper_command_path(mock_subprocess, temp_dir):
         expected_whisper_path = os.path.join(venv_dir, "bin", "whisper")
         assert call_args[0] == expected_whisper_path
 
-def test_transcribe_working_directory(mock_subprocess, temp_dir):
+def test_transcribe_working_directory(mock_subprocess, temp_dir, mock_media_dir):
     """Test that transcription runs in correct working directory"""
     media_dir = os.path.join(temp_dir, "media")
     os.makedirs(media_dir, exist_ok=True)
     
     with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
          patch('app.transcribe.MEDIA_DIR', media_dir), \
-         patch('app.transcribe.LOG_FILE', os.path.join(temp_dir, "test.log")), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
          patch('app.transcribe.log') as mock_log:
         
         # Mock successful Whisper execution
@@ -105,4 +104,302 @@ def test_transcribe_working_directory(mock_subprocess, temp_dir):
         
         # Check that working directory is set to media directory
         call_kwargs = mock_subprocess['Popen'].call_args[1]
-        assert call_kwargs['cwd'] == media_dir 
\ No newline at end of file
+        assert call_kwargs['cwd'] == media_dir 
+
+def test_transcribe_uses_in_process_engine(mock_subprocess, temp_dir, mock_media_dir):
+    """Test that the in-process engine is preferred when whisper is importable"""
+    with patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
+         patch('app.transcribe.engine.is_available', return_value=True), \
+         patch('app.transcribe.engine.transcribe_file') as mock_engine, \
+         patch('app.transcribe.log') as mock_log:
+        
+        transcribe("test_audio.mp3", "en")
+        
+        mock_engine.assert_called_once_with("test_audio.mp3", "en", word_timestamps=False, model_name="turbo", on_segment=ANY, previous_segments=[])
+        mock_subprocess['Popen'].assert_not_called()
+
+def test_transcribe_passes_model(mock_subprocess, temp_dir, mock_media_dir):
+    """Test the chosen model reaches the whisper CLI and the cache key"""
+    with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
+         patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
+         patch('app.transcribe.cache.cache_key', return_value=None) as mock_key, \
+         patch('app.transcribe.log'):
+        
+        transcribe("test_audio.mp3", "en", model="small")
+        
+        call_args = mock_subprocess['Popen'].call_args[0][0]
+        assert call_args[call_args.index("--model") + 1] == "small"
+        assert mock_key.call_args[0][1] == "small"
+
+def test_transcribe_falls_back_to_subprocess(mock_subprocess, temp_dir, mock_media_dir):
+    """Test fallback to the whisper CLI when the engine cannot be imported"""
+    with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
+         patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
+         patch('app.transcribe.engine.is_available', return_value=True), \
+         patch('app.transcribe.engine.transcribe_file', side_effect=ImportError("no torch")), \
+         patch('app.transcribe.log') as mock_log:
+        
+        transcribe("test_audio.mp3")
+        
+        mock_subprocess['Popen'].assert_called_once()
+
+def test_transcribe_in_process_failure(temp_dir):
+    """Test in-process transcription failure exits with an error"""
+    with patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
+         patch('app.transcribe.engine.is_available', return_value=True), \
+         patch('app.transcribe.engine.transcribe_file', side_effect=RuntimeError("bad audio")), \
+         patch('app.transcribe.log') as mock_log, \
+         patch('sys.exit') as mock_exit:
+        
+        transcribe("test_audio.mp3")
+        
+        mock_log.assert_any_call("Transcription failed for test_audio.mp3: bad audio")
+        mock_exit.assert_called_once_with(1)
+
+def test_transcribe_auto_language_uses_detected_language(temp_dir, capsys):
+    """Test that auto mode detects the language once and decodes with it"""
+    media_dir = os.path.join(temp_dir, "media")
+    with patch('app.transcribe.MEDIA_DIR', media_dir), \
+         patch('app.transcribe.cache.detected_language', return_value=None), \
+         patch('app.transcribe.cache.store_detected_language') as mock_store_language, \
+         patch('app.transcribe.cache.cache_key', return_value=None) as mock_key, \
+         patch('app.transcribe.engine.is_available', return_value=True), \
+         patch('app.transcribe.engine.detect_language', return_value="it") as mock_detect, \
+         patch('app.transcribe.run_transcription') as mock_run, \
+         patch('app.transcribe.log'):
+        
+        transcribe("test_audio.mp3", "auto")
+    
+    audio_path = os.path.join(media_dir, "test_audio.mp3")
+    mock_detect.assert_called_once_with(audio_path)
+    mock_store_language.assert_called_once_with(audio_path, "it")
+    assert mock_key.call_args[0][2] == "it"
+    assert mock_run.call_args[0][1] == "it"
+    assert "Detected language: it" in capsys.readouterr().out
+
+def test_transcribe_auto_language_cached(temp_dir):
+    """Test that a language detected earlier for the same audio is reused"""
+    with patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
+         patch('app.transcribe.cache.detected_language', return_value="de"), \
+         patch('app.transcribe.cache.cache_key', return_value=None), \
+         patch('app.transcribe.engine.detect_language') as mock_detect, \
+         patch('app.transcribe.run_transcription') as mock_run, \
+         patch('app.transcribe.log'):
+        
+        transcribe("test_audio.mp3", "auto")
+    
+    mock_detect.assert_not_called()
+    assert mock_run.call_args[0][1] == "de"
+
+def test_transcribe_auto_language_cli_fallback(mock_subprocess, temp_dir, mock_media_dir):
+    """Test that without the in-process engine the CLI detects the language itself"""
+    with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
+         patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
+         patch('app.transcribe.cache.detected_language', return_value=None), \
+         patch('app.transcribe.log'):
+        
+        transcribe("test_audio.mp3", "auto")
+        
+        call_args = mock_subprocess['Popen'].call_args[0][0]
+        assert "--language" not in call_args
+        assert "auto" not in call_args
+
+def test_transcribe_restores_from_cache(mock_subprocess, temp_dir, mock_media_dir):
+    """Test that a cache hit skips decoding entirely"""
+    with patch('app.transcribe.MEDIA_DIR', os.path.join(temp_dir, "media")), \
+         patch('app.transcribe.cache.cache_key', return_value="key"), \
+         patch('app.transcribe.cache.restore', return_value=True), \
+         patch('app.transcribe.run_transcription') as mock_run, \
+         patch('app.transcribe.log') as mock_log:
+        
+        transcribe("renamed_audio.mp3")
+        
+        mock_run.assert_not_called()
+        mock_log.assert_any_call("Restored cached transcription for renamed_audio.mp3")
+
+def test_transcribe_stores_in_cache(temp_dir):
+    """Test that a fresh transcription is added to the cache"""
+    media_dir = os.path.join(temp_dir, "media")
+    with patch('app.transcribe.MEDIA_DIR', media_dir), \
+         patch('app.transcribe.cache.cache_key', return_value="key"), \
+         patch('app.transcribe.cache.restore', return_value=False), \
+         patch('app.transcribe.cache.store') as mock_store, \
+         patch('app.transcribe.run_transcription') as mock_run, \
+         patch('app.transcribe.log'):
+        
+        transcribe("test_audio.mp3")
+        
+        mock_run.assert_called_once()
+        mock_store.assert_any_call("key", os.path.join(media_dir, "test_audio.txt"))
+        mock_store.assert_any_call("key", os.path.join(media_dir, "test_audio.segments.json"), suffix=".segments.json")
+
+def test_transcribe_subprocess_streams_segments(mock_subprocess, temp_dir, capsys):
+    """Test that streamed segments are printed and saved while decoding"""
+    media_dir = os.path.join(temp_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    saved = []
+    
+    with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
+         patch('app.transcribe.MEDIA_DIR', media_dir), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
+         patch('app.transcribe.log') as mock_log:
+        
+        mock_subprocess['Popen'].return_value.stdout.readline.side_effect = [
+            "[00:00.000 --> 00:02.000]  Bonjour\n",
+            "[00:02.000 --> 00:04.000]  tout le monde\n",
+            ""
+        ]
+        
+        def fake_process_wait():
+            # The partial transcript already holds both segments before the CLI exits
+            with open(os.path.join(media_dir, "test_audio.partial.txt"), encoding='utf-8') as f:
+                saved.append(f.read())
+            return 0
+        mock_subprocess['Popen'].return_value.wait.side_effect = fake_process_wait
+        
+        transcribe("test_audio.mp3", stream=True)
+    
+    assert saved == ["Bonjour\ntout le monde\n"]
+    output = capsys.readouterr().out
+    assert "  Bonjour" in output
+    assert "  tout le monde" in output
+    # The partial transcript is removed once the full transcript is written
+    assert not os.path.exists(os.path.join(media_dir, "test_audio.partial.txt"))
+
+def test_transcript_stream_kept_on_failure(temp_dir):
+    """Test that completed segments survive a failed transcription"""
+    with patch('app.transcribe.MEDIA_DIR', temp_dir):
+        stream = TranscriptStream("talk.mp3")
+        stream.add_segment(0.0, 1.5, " Premier segment")
+        stream.close(completed=False)
+    
+    with open(os.path.join(temp_dir, "talk.partial.txt"), encoding='utf-8') as f:
+        assert f.read() == "Premier segment\n"
+
+def test_transcribe_checkpoints_segments_until_complete(mock_subprocess, temp_dir, mock_media_dir):
+    """Test that segments are checkpointed while decoding and cleared on success"""
+    media_dir = os.path.join(temp_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    checkpoint_file = os.path.join(media_dir, "test_audio.checkpoint.jsonl")
+    seen = []
+    
+    with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
+         patch('app.transcribe.MEDIA_DIR', media_dir), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
+         patch('app.transcribe.log'):
+        
+        mock_subprocess['Popen'].return_value.stdout.readline.side_effect = [
+            "[00:00.000 --> 00:02.000]  Bonjour\n",
+            ""
+        ]
+        mock_subprocess['Popen'].return_value.wait.side_effect = lambda: seen.append(os.path.exists(checkpoint_file)) or 0
+        
+        transcribe("test_audio.mp3")
+    
+    assert seen == [True]
+    assert not os.path.exists(checkpoint_file)
+
+def write_french_checkpoint(media_dir):
+    """Leave the checkpoint of an interrupted French transcription of test_audio.mp3"""
+    audio_path = os.path.join(media_dir, "test_audio.mp3")
+    with open(audio_path, 'w') as f:
+        f.write("fake audio content")
+    key = transcript_key(audio_path, "turbo", "fr", False)
+    with open(os.path.join(media_dir, "test_audio.checkpoint.jsonl"), 'w', encoding='utf-8') as f:
+        f.write(f'{{"key": "{key}"}}\n')
+        f.write('{"start": 0.0, "end": 2.5, "text": " Bonjour"}\n')
+
+def test_transcribe_resumes_from_checkpoint(mock_subprocess, temp_dir, mock_media_dir):
+    """Test that an interrupted transcription resumes after the last checkpointed segment"""
+    media_dir = os.path.join(temp_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    write_french_checkpoint(media_dir)
+    with open(os.path.join(media_dir, "test_audio.checkpoint.jsonl"), 'a', encoding='utf-8') as f:
+        f.write('{"start": 2.5, "end": 4.0, "te')  # Half-written by the crash
+    
+    with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
+         patch('app.transcribe.MEDIA_DIR', media_dir), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
+         patch('app.transcribe.log') as mock_log:
+        
+        mock_subprocess['Popen'].return_value.stdout.readline.side_effect = [
+            "[00:02.500 --> 00:05.000]  tout le monde\n",
+            ""
+        ]
+        
+        transcribe("test_audio.mp3")
+        
+        call_args = mock_subprocess['Popen'].call_args[0][0]
+        assert call_args[call_args.index("--clip_timestamps") + 1] == "2.500"
+        mock_log.assert_any_call("Resuming transcription of test_audio.mp3 from 2.50s")
+    
+    with open(os.path.join(media_dir, "test_audio.txt"), encoding='utf-8') as f:
+        assert f.read() == "Bonjour\ntout le monde\n"
+
+def test_transcribe_ignores_checkpoint_of_other_language(mock_subprocess, temp_dir, mock_media_dir):
+    """Test that a checkpoint of a French run is not resumed by an English run"""
+    media_dir = os.path.join(temp_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    write_french_checkpoint(media_dir)
+    
+    with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
+         patch('app.transcribe.MEDIA_DIR', media_dir), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
+         patch('app.transcribe.log'), \
+         patch('app.checkpoint.log'):
+        
+        mock_subprocess['Popen'].return_value.stdout.readline.side_effect = [
+            "[00:00.000 --> 00:02.000]  Hello everyone\n",
+            ""
+        ]
+        
+        transcribe("test_audio.mp3", language="en", model="turbo")
+        
+        assert "--clip_timestamps" not in mock_subprocess['Popen'].call_args[0][0]
+    
+    with open(os.path.join(media_dir, "test_audio.txt"), encoding='utf-8') as f:
+        assert f.read() == "Hello everyone\n"
+
+def test_transcribe_subprocess_writes_txt_and_segments_from_json(mock_subprocess, temp_dir, mock_media_dir):
+    """Test the CLI's JSON output becomes the .txt and a compact segment file"""
+    import json
+    decoded = {"language": "fr", "segments": [
+        {"start": 0.0, "end": 1.5, "text": " Bonjour.", "words": [{"word": " Bonjour.", "start": 0.1, "end": 1.2, "probability": 0.9}]},
+        {"start": 1.5, "end": 3.0, "text": " Ça va ?", "words": []},
+    ]}
+    json_path = os.path.join(mock_media_dir, "test_audio.json")
+
+    def fake_popen(command, **kwargs):
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(decoded, f)
+        return mock_subprocess['Popen'].return_value
+
+    mock_subprocess['Popen'].side_effect = fake_popen
+    mock_subprocess['Popen'].return_value.wait.return_value = 0
+    with patch('app.transcribe.VENV_DIR', os.path.join(temp_dir, "venv")), \
+         patch('app.transcribe.MEDIA_DIR', mock_media_dir), \
+         patch('app.transcribe.engine.is_available', return_value=False), \
+         patch('app.transcribe.log'):
+        transcribe("test_audio.mp3")
+
+    assert not os.path.exists(json_path)
+    with open(os.path.join(mock_media_dir, "test_audio.txt"), encoding='utf-8') as f:
+        assert f.read() == "Bonjour.\nÇa va ?\n"
+    with open(os.path.join(mock_media_dir, "test_audio.segments.json"), encoding='utf-8') as f:
+        segments = json.load(f)["segments"]
+    assert segments[0]["words"] == [[" Bonjour.", 0.1, 1.2, 0.9]]
+    assert "words" not in segments[1]
+
+def test_transcript_key_separates_batched_results(temp_dir):
+    """Test batched clip results never share a cache key with a full transcription"""
+    audio_path = os.path.join(temp_dir, "note.m4a")
+    with open(audio_path, 'wb') as f:
+        f.write(b"audio")
+    
+    with patch('app.transcribe.load_precision', return_value="fp32"):
+        full = transcript_key(audio_path, "turbo", "fr", True)
+        batched = transcript_key(audio_path, "turbo", "fr", True, batched=True)
+    
+    assert full != batched
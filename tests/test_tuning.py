@@ -0,0 +1,121 @@
+"""
+Tests for tuning module
+"""
+import pytest
+import json
+import os
+from unittest.mock import Mock, mock_open, patch
+from app import tuning
+from app.tuning import (
+    core_sets, core_slots, take_cores, apply_threads, thread_env, thread_candidates, pick_threads,
+    autotune, ensure_tuned, available_memory
+)
+
+def test_thread_candidates():
+    """Test thread counts double up to the number of cores"""
+    assert thread_candidates(1) == [1]
+    assert thread_candidates(6) == [1, 2, 4, 6]
+    assert thread_candidates(8) == [1, 2, 4, 8]
+
+def test_pick_threads_prefers_fewer_threads():
+    """Test the fewest threads close to the fastest time win"""
+    assert pick_threads({1: 4.0, 2: 2.1, 4: 2.0, 8: 2.3}) == 2
+    assert pick_threads({1: 4.0, 2: 3.0, 4: 2.0}) == 4
+
+def test_available_memory_reads_meminfo():
+    """Test available memory comes from MemAvailable in /proc/meminfo"""
+    meminfo = "MemTotal:       16000000 kB\nMemFree:         1000000 kB\nMemAvailable:    8000000 kB\n"
+    with patch('builtins.open', mock_open(read_data=meminfo)):
+        assert available_memory() == 8000000 * 1024
+
+def test_core_sets():
+    """Test each worker gets its own cores"""
+    with patch('app.tuning.available_cpus', return_value=[0, 1, 2, 3, 4, 5]):
+        assert core_sets(3, 2) == [[0, 1], [2, 3], [4, 5]]
+        assert core_sets(2, 4) is None
+
+def test_core_slots_off_by_default():
+    """Test workers are not pinned unless cpu_affinity is set"""
+    with patch('app.tuning.load_thread_settings', return_value=(None, None, False)):
+        assert core_slots(2, 1) is None
+    assert take_cores(None) is None
+
+def test_core_slots_hand_out_core_sets():
+    """Test each worker takes a different core set"""
+    if not hasattr(os, "sched_setaffinity"):
+        pytest.skip("CPU affinity is not supported on this platform")
+    with patch('app.tuning.load_thread_settings', return_value=(None, None, True)), \
+         patch('app.tuning.available_cpus', return_value=[0, 1, 2, 3]):
+        slots = core_slots(2, 2)
+    assert sorted([take_cores(slots), take_cores(slots)]) == [[0, 1], [2, 3]]
+
+def test_apply_threads_sets_env_and_affinity():
+    """Test a worker's thread limit and cores are applied to the process"""
+    with patch.dict(os.environ, {}), \
+         patch('app.engine.is_available', return_value=False), \
+         patch('app.tuning.os.sched_setaffinity', create=True) as mock_affinity:
+        apply_threads(2, [4, 5])
+        assert os.environ["OMP_NUM_THREADS"] == "2"
+        assert os.environ["MKL_NUM_THREADS"] == "2"
+    mock_affinity.assert_called_once_with(0, [4, 5])
+
+def test_apply_threads_sets_torch_threads():
+    """Test the intra-op and inter-op settings reach torch"""
+    fake_torch = Mock()
+    fake_torch.get_num_interop_threads.return_value = 4
+    with patch.dict(os.environ, {}), \
+         patch.dict('sys.modules', {'torch': fake_torch}), \
+         patch('app.engine.is_available', return_value=True), \
+         patch('app.tuning.load_thread_settings', return_value=(3, 1, False)):
+        apply_threads(3)
+    fake_torch.set_num_threads.assert_called_once_with(3)
+    fake_torch.set_num_interop_threads.assert_called_once_with(1)
+
+def test_thread_env():
+    """Test the whisper CLI gets the configured thread limit unless the worker set its own"""
+    with patch('app.tuning.load_thread_settings', return_value=(3, 1, False)):
+        assert thread_env({})["OMP_NUM_THREADS"] == "3"
+        assert thread_env({"OMP_NUM_THREADS": "2"})["OMP_NUM_THREADS"] == "2"
+    with patch('app.tuning.load_thread_settings', return_value=(None, None, False)):
+        assert "OMP_NUM_THREADS" not in thread_env({})
+
+def test_autotune_saves_fastest_efficient_threads(temp_dir):
+    """Test autotune times each thread count and saves the result"""
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("whisper")
+    # Seconds per encoder pass at each thread count
+    cost = {1: 4.0, 2: 2.1, 4: 2.0}
+    clock = [0.0]
+
+    def embed_audio(mel):
+        clock[0] += cost[torch.get_num_threads()]
+
+    model = Mock()
+    model.dims.n_mels = 80
+    model.device = torch.device("cpu")
+    model.embed_audio.side_effect = embed_audio
+
+    settings_file = os.path.join(temp_dir, "settings.json")
+    with patch('app.config.SETTINGS_FILE', settings_file), \
+         patch('app.engine.load_model', return_value=model), \
+         patch('app.tuning.available_cpus', return_value=[0, 1, 2, 3]), \
+         patch('app.tuning.time.perf_counter', side_effect=lambda: clock[0]), \
+         patch('app.tuning.log'):
+        assert autotune("tiny") == 2
+
+    with open(settings_file) as f:
+        assert json.load(f) == {"intra_op_threads": 2, "inter_op_threads": 1}
+
+def test_ensure_tuned_only_once():
+    """Test tuning is skipped once settings exist, and failures are not fatal"""
+    with patch('app.tuning.load_setting', return_value=4), \
+         patch('app.tuning.autotune') as mock_autotune:
+        ensure_tuned("tiny")
+    mock_autotune.assert_not_called()
+
+    with patch('app.tuning.load_setting', return_value=None), \
+         patch('app.engine.is_available', return_value=True), \
+         patch('app.tuning.autotune', side_effect=RuntimeError("no model")), \
+         patch('app.tuning.log') as mock_log:
+        ensure_tuned("tiny")
+    mock_log.assert_called_once()
@@ -4,7 +4,10 @@ Tests for UI module
 import pytest
 import os
 from unittest.mock import patch, Mock
-from app.ui import list_audio_files, print_menu, get_choice, get_url_input, change_language
+from datetime import date
+from app.ui import (
+    list_audio_files, print_menu, get_choice, pick_choice, choice_file, new_view, get_url_input, change_language
+)
 
 def test_list_audio_files_empty(mock_media_dir):
     """Test listing audio files when directory is empty"""
@@ -56,11 +59,25 @@ def test_list_audio_files_case_insensitive(mock_media_dir):
         expected = ["audio1.MP3", "audio2.WAV", "audio3.M4A", "audio4.FLAC"]
         assert sorted(files) == sorted(expected)
 
+def test_list_audio_files_native_formats(mock_media_dir):
+    """Test that native download formats are listed but PCM sidecars and partial downloads are not"""
+    with patch('app.ui.MEDIA_DIR', mock_media_dir):
+        for filename in ["talk.opus", "talk.pcm", "song.webm", "song.ogg", ".next.m4a.part"]:
+            with open(os.path.join(mock_media_dir, filename), 'w') as f:
+                f.write("test content")
+        
+        assert sorted(list_audio_files()) == ["song.ogg", "song.webm", "talk.opus"]
+
+def write_audio(media_dir, *names):
+    for name in names:
+        with open(os.path.join(media_dir, name), 'w') as f:
+            f.write("test content")
+
 def test_print_menu(capsys):
     """Test menu printing"""
-    files = ["audio1.mp3", "audio2.wav"]
+    entries = [(1, "audio1.mp3", False, 0), (2, "audio2.wav", True, 0)]
     
-    print_menu(files)
+    print_menu(entries)
     
     captured = capsys.readouterr()
     output = captured.out
@@ -70,13 +87,13 @@ def test_print_menu(capsys):
     assert "2. Change language (currently '" in output
     assert "3. audio1.mp3" in output
     assert "4. audio2.wav" in output
+    assert "transcribed]" in output
     assert "0. Exit" in output
+    assert "next/previous page" not in output
 
 def test_print_menu_empty(capsys):
     """Test menu printing with no files"""
-    files = []
-    
-    print_menu(files)
+    print_menu([])
     
     captured = capsys.readouterr()
     output = captured.out
@@ -88,24 +105,38 @@ def test_print_menu_empty(capsys):
     # Should not have any file options (files start at 3)
     assert "3." not in output
 
+def test_print_menu_page_with_filters(capsys):
+    """Test a later page shows its range, the filters and the commands"""
+    view = new_view()
+    view.update(page=1, text="talk", status="untranscribed")
+    
+    print_menu([(45, "talk45.mp3", False, 0)], total=21, view=view)
+    
+    output = capsys.readouterr().out
+    assert "Files 21-21 of 21 (name contains 'talk', untranscribed):" in output
+    assert "47. talk45.mp3" in output
+    assert "next/previous page" in output
+
 @patch('builtins.input')
-def test_get_choice_valid(mock_input):
+def test_get_choice_valid(mock_input, mock_media_dir):
     """Test getting valid user choice"""
-    files = ["audio1.mp3", "audio2.wav"]
+    write_audio(mock_media_dir, "audio1.mp3", "audio2.wav")
     mock_input.return_value = "3"  # Changed from 2 to 3 due to language option
     
-    choice = get_choice(files)
+    with patch('app.ui.MEDIA_DIR', mock_media_dir):
+        choice = get_choice()
     
     assert choice == 3
     mock_input.assert_called_once_with("Enter your choice: ")
 
 @patch('builtins.input')
-def test_get_choice_invalid_then_valid(mock_input):
+def test_get_choice_invalid_then_valid(mock_input, mock_media_dir):
     """Test getting choice with invalid input first"""
-    files = ["audio1.mp3"]
+    write_audio(mock_media_dir, "audio1.mp3")
     mock_input.side_effect = ["invalid", "5", "3"]  # Changed from 2 to 3
     
-    choice = get_choice(files)
+    with patch('app.ui.MEDIA_DIR', mock_media_dir):
+        choice = get_choice(new_view())
     
     assert choice == 3
     assert mock_input.call_count == 3
@@ -113,13 +144,73 @@ def test_get_choice_invalid_then_valid(mock_input):
 @patch('builtins.input')
 def test_get_choice_zero(mock_input):
     """Test getting choice zero (exit)"""
-    files = ["audio1.mp3"]
     mock_input.return_value = "0"
     
-    choice = get_choice(files)
+    choice = get_choice()
     
     assert choice == 0
 
+@patch('builtins.input')
+def test_get_choice_applies_commands(mock_input):
+    """Test paging and filter commands update the view and ask for the menu again"""
+    view = new_view()
+    for command, total in [("n", 50), ("N", 50), ("n", 50), ("p", 50)]:
+        mock_input.return_value = command
+        assert get_choice(view, total) is None
+    assert view["page"] == 1
+    
+    mock_input.return_value = "/ Talk"
+    assert get_choice(view, 50) is None
+    assert view == {"page": 0, "text": "Talk", "status": None, "since": None, "until": None}
+    
+    mock_input.return_value = "u"
+    assert get_choice(view, 50) is None
+    mock_input.return_value = "d 2026-01-01 2026-01-31"
+    assert get_choice(view, 50) is None
+    assert view["status"] == "untranscribed"
+    assert (view["since"], view["until"]) == (date(2026, 1, 1), date(2026, 1, 31))
+    
+    mock_input.side_effect = ["d 2026-13-01", "d", "0"]
+    assert get_choice(view, 50) is None
+    assert view["since"] is None
+    assert get_choice(view, 50) == 0
+
+def test_pick_choice_ids_are_stable(mock_media_dir, capsys):
+    """Test files keep their numbers when files are added, and filters only hide the others"""
+    write_audio(mock_media_dir, "b.mp3", "c.mp3")
+    with patch('app.ui.MEDIA_DIR', mock_media_dir), \
+         patch('builtins.input', return_value="0"):
+        pick_choice()
+        first = capsys.readouterr().out
+        write_audio(mock_media_dir, "a.mp3")
+        with open(os.path.join(mock_media_dir, "c.txt"), 'w') as f:
+            f.write("transcript")
+        pick_choice()
+        second = capsys.readouterr().out
+        with patch('builtins.input', side_effect=["t", "5"]):
+            # Numbers of files hidden by a filter are still accepted
+            assert pick_choice() == 5
+        filtered = capsys.readouterr().out.split("Select an option:")[2]
+        assert choice_file(5) == "a.mp3"
+    
+    assert "3. b.mp3" in first and "4. c.mp3" in first
+    assert "5. a.mp3" in second and "3. b.mp3" in second and "4. c.mp3" in second
+    assert second.index("a.mp3") < second.index("b.mp3")
+    assert "4. c.mp3" in filtered and "b.mp3" not in filtered
+
+def test_pick_choice_pages(mock_media_dir, capsys):
+    """Test only one page of a large directory is printed"""
+    write_audio(mock_media_dir, *[f"talk{i:03d}.mp3" for i in range(45)])
+    with patch('app.ui.MEDIA_DIR', mock_media_dir), \
+         patch('builtins.input', side_effect=["n", "n", "n", "0"]):
+        pick_choice()
+    
+    pages = capsys.readouterr().out.split("Select an option:")[1:]
+    assert "Files 1-20 of 45:" in pages[0] and "talk019.mp3" in pages[0] and "talk020.mp3" not in pages[0]
+    assert "Files 21-40 of 45:" in pages[1]
+    assert "Files 41-45 of 45:" in pages[2] and "talk044.mp3" in pages[2]
+    assert pages[3] == pages[2]
+
 @patch('builtins.input')
 def test_get_url_input_valid(mock_input):
     """Test getting valid URL input"""
@@ -190,12 +281,27 @@ def test_change_language_save_failure(mock_input, mock_save_language, mock_load_
     mock_save_language.assert_called_once_with("en")
 
 @patch('app.ui.load_language')
+@patch('app.ui.save_language')
 @patch('builtins.input')
-def test_change_language_invalid_input_then_valid(mock_input, mock_load_language):
+def test_change_language_invalid_input_then_valid(mock_input, mock_save_language, mock_load_language):
     """Test language change with invalid input first"""
     mock_load_language.return_value = "fr"
-    mock_input.side_effect = ["invalid", "5", "2"]  # Invalid, out of range, then valid
+    mock_input.side_effect = ["invalid", "6", "2"]  # Invalid, out of range, then valid
+    
+    change_language()
+    
+    assert mock_input.call_count == 3
+
+@patch('app.ui.load_language')
+@patch('app.ui.save_language')
+@patch('builtins.input')
+def test_change_language_auto(mock_input, mock_save_language, mock_load_language, capsys):
+    """Test the automatic language detection option is offered last"""
+    mock_load_language.return_value = "fr"
+    mock_save_language.return_value = True
+    mock_input.return_value = "5"
     
     change_language()
     
-    assert mock_input.call_count == 3 
\ No newline at end of file
+    mock_save_language.assert_called_once_with("auto")
+    assert "5. auto (detect for each file)" in capsys.readouterr().out 
\ No newline at end of file
@@ -4,7 +4,15 @@ Tests for utils module
 import pytest
 import tempfile
 import os
-from app.utils import log, clean_transcript
+import multiprocessing
+from unittest.mock import patch
+from app.utils import log, log_output, flush_log, worker_log_queue, log_to_queue, clean_transcript, find_existing_transcript, pick_transcripts
+
+def log_from_worker(records, worker):
+    """Log a few lines from a worker process, as batch workers do"""
+    log_to_queue(records)
+    for i in range(50):
+        log(f"worker {worker} line {i}")
 
 def test_log_creates_file(temp_dir):
     """Test that log function creates log file"""
@@ -13,6 +21,7 @@ def test_log_creates_file(temp_dir):
     with pytest.MonkeyPatch().context() as m:
         m.setattr('app.utils.LOG_FILE', log_file)
         log("Test message")
+        flush_log()
     
     assert os.path.exists(log_file)
     
@@ -21,6 +30,50 @@ def test_log_creates_file(temp_dir):
         assert "Test message" in content
         assert "[20" in content  # Timestamp format
 
+def test_log_output_is_written_as_is(temp_dir):
+    """Test subprocess output lines keep their content and order, without timestamps"""
+    log_file = os.path.join(temp_dir, "test.log")
+    with patch('app.utils.LOG_FILE', log_file):
+        for i in range(1000):
+            log_output(f"[00:{i:04d}] segment {i}")
+        flush_log()
+    
+    with open(log_file, 'r', encoding='utf-8') as f:
+        assert f.read().splitlines() == [f"[00:{i:04d}] segment {i}" for i in range(1000)]
+
+def test_log_rotates_by_size(temp_dir):
+    """Test the log file is rotated instead of growing without bound"""
+    log_file = os.path.join(temp_dir, "test.log")
+    with patch('app.utils.LOG_FILE', log_file), \
+         patch('app.utils.LOG_MAX_BYTES', 1000), \
+         patch('app.utils.LOG_BACKUP_COUNT', 2):
+        for i in range(100):
+            log_output(f"line {i:03d} " + "x" * 40)
+        flush_log()
+    
+    assert sorted(os.listdir(temp_dir)) == ["test.log", "test.log.1", "test.log.2"]
+    assert all(os.path.getsize(os.path.join(temp_dir, name)) <= 1000 for name in os.listdir(temp_dir))
+    with open(log_file, 'r', encoding='utf-8') as f:
+        assert f.read().splitlines()[-1].startswith("line 099 ")
+
+def test_worker_processes_log_through_the_parent(temp_dir):
+    """Test concurrent worker processes write whole lines to the parent's log file"""
+    log_file = os.path.join(temp_dir, "test.log")
+    with patch('app.utils.LOG_FILE', log_file):
+        records = worker_log_queue()
+        workers = [multiprocessing.Process(target=log_from_worker, args=(records, n)) for n in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+        flush_log()
+    
+    with open(log_file, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 150
+    for n in range(3):
+        assert [line.split("] ", 1)[1] for line in lines if f"worker {n} " in line] == [f"worker {n} line {i}" for i in range(50)]
+
 def test_clean_transcript_single_line():
     """Test transcript cleaning with single line"""
     input_text = "This is a test transcript."
@@ -67,4 +120,20 @@ def test_clean_transcript_with_connecting_words():
     """Test transcript cleaning joins lines with connecting words"""
     input_text = "This is a sentence.\nqui continue.\navec des mots de liaison."
     expected = "This is a sentence. qui continue.\navec des mots de liaison."
-    assert clean_transcript(input_text) == expected 
\ No newline at end of file
+    assert clean_transcript(input_text) == expected 
+def test_find_existing_transcript_prefers_noformat(mock_media_dir):
+    """Test that .noformat.txt takes priority over .txt"""
+    for name in ["talk.txt", "talk.noformat.txt"]:
+        with open(os.path.join(mock_media_dir, name), 'w') as f:
+            f.write("transcript")
+    
+    with pytest.MonkeyPatch().context() as m:
+        m.setattr('app.utils.MEDIA_DIR', mock_media_dir)
+        assert find_existing_transcript("talk.mp3") == os.path.join(mock_media_dir, "talk.noformat.txt")
+        assert find_existing_transcript("other.mp3") is None
+
+def test_pick_transcripts():
+    """Test each recording gets one transcript, with the same priority as find_existing_transcript"""
+    names = ["talk.txt", "talk.noformat.txt", "intro.txt", "draft.partial.txt", "talk.mp3", "notes.md"]
+    assert pick_transcripts(names) == {"talk": "talk.noformat.txt", "intro": "intro.txt"}
+    assert pick_transcripts(reversed(names)) == {"talk": "talk.noformat.txt", "intro": "intro.txt"}